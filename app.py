@@ -1,388 +1,79 @@
+from functools import partial
+from math import isnan
+from pathlib import Path
+
 import streamlit as st
 import pandas as pd
-import base64
-import requests
-import json
-from io import BytesIO
-
-# reportlab 已移除
-
-# --- 1. 配置與中英對照表 ---
-PROCESS_TRANSLATIONS = {
-    "校車": "Calibration",
-    "車床": "Lathe",
-    "手工清洗": "Remove oil by hydrocarbon",
-    "清洗": "Remove oil by hydrocarbon",
-    "去油": "Remove oil by hydrocarbon",
-    "自動清洗": "Remove oil by hydrocarbon",
-    "修內徑加工": "Inner Diameter Processing",
-    "包裝": "Packing",
-    "熱處理": "Heat Treatment",
-    "風切防鏽": "Anti-Rust",
-    "清點數量": "Counting",
-    "高週波": "High Frequency",
-    "染黑": "Black Oxide",
-    "巡牙": "Thread Inspection",
-    "研磨": "Grinding",
-    "拋光": "Polishing",
-    "陽極": "Anodizing",
-    "電鍍": "Plating",
-    "噴砂": "Sandblasting",
-    "刻字": "Laser Marking",
-    "CNC加工": "CNC Machining",
-    "CNC車床": "CNC Lathe",
-    "CNC銑床": "CNC Milling",
-    "CNC放電": "CNC EDM",
-    "CNC線切割": "CNC Wire Cutting",
-    "CNC磨床": "CNC Grinding",
-    "CNC火花機": "CNC Spark Machine",
-    }
-
-# 翻譯快取（避免重複翻譯）
-translation_cache = {}
-
-# 成本項目的中英翻譯
-COST_ITEM_TRANSLATIONS = {
-    "總投入數量": "Total Input Quantity",
-    "良品數量": "Good Product Quantity",
-    "廢品數量": "Defective Quantity",
-    "投入成本": "Input Cost",
-    "加工成本": "Processing Cost",
-    "外包成本": "Outsourcing Cost",
-    "總成本": "Total Cost",
-    "單顆成本": "Unit Cost",
-    "目前售價": "Current Selling Price",
-    "建議售價 (毛利潤20%)": "Suggested Selling Price (20% Profit Margin)",
-    "建議售價(毛利潤20%)": "Suggested Selling Price (20% Profit Margin)"
-}
-
-def clean_process_name(name):
-    if not isinstance(name, str): return "-"
-    # 移除排除詞
-    for word in ["廠內", "廠外", "託外", "外包", "委外"]:
-        name = name.replace(word, "")
-    # 移除數字後綴(如 風切防鏽3 -> 風切防鏽)
-    import re
-    clean_name = re.sub(r'\d+$', '', name).strip()
-    # 移除所有空格
-    clean_name = clean_name.replace(" ", "").replace("　", "")
-    
-    # 特殊匹配：包含「校車」的都識別為 Calibration
-    if "校車" in clean_name:
-        eng_name = "Calibration"
-        clean_name = clean_name  # 保留原始名稱如「校車A」
-    # 先查預設字典
-    elif clean_name in PROCESS_TRANSLATIONS:
-        eng_name = PROCESS_TRANSLATIONS[clean_name]
-    else:
-        # 如果不在字典裡，自動翻譯
-        eng_name = auto_translate(clean_name)
-    
-    # 如果是清洗類工序，統一改成「碳氫去油處理」
-    if eng_name == "Remove oil by hydrocarbon" or clean_name in ["手工清洗", "清洗", "去油", "自動清洗"]:
-        clean_name = "碳氫去油處理"
-        eng_name = "Remove oil by hydrocarbon"
-    
-    return f"{clean_name} | {eng_name}"
 
-def auto_translate(text):
-    """自動翻譯中文為英文（使用免費 API）"""
-    if not text or not isinstance(text, str):
-        return text
-    
-    # 檢查快取
-    if text in translation_cache:
-        return translation_cache[text]
-    
-    try:
-        # 使用 MyMemory 免費翻譯 API（無需認證）
-        url = "https://api.mymemory.translated.net/get"
-        params = {
-            "q": text,
-            "langpair": "zh-CN|en"
-        }
-        response = requests.get(url, params=params, timeout=5)
-        result = response.json()
-        
-        if result.get("responseStatus") == 200:
-            translated = result.get("responseData", {}).get("translatedText", text)
-            # 避免重複翻譯標記
-            if translated != "[object Object]" and translated != text:
-                translation_cache[text] = translated
-                return translated
-    except Exception as e:
-        pass
-    
-    # 如果翻譯失敗，回傳原文
-    translation_cache[text] = text
-    return text
-
-def get_cost_item_label(item_name):
-    """取得成本項目的中英標籤"""
-    if not isinstance(item_name, str):
-        return "-"
-    eng_name = COST_ITEM_TRANSLATIONS.get(item_name, item_name)
-    return f"{item_name} | {eng_name}"
-
-# --- 2. 數值擷取邏輯 ---
-def get_val(df, row_label, col_idx, rate=1.0):
-    """
-    從 DataFrame 中提取特定值
-    基於 CSV 結構：
-    - 現況（左側）: 第 0-12 欄
-    - 評估（右側）: 第 13-25 欄
+from cost_analysis import (
+    get_rate,
+    apply_rates,
+    currency_rates,
+    generate_html,
+    generate_multi_html,
+    expand_uploads,
+    build_zip,
+    render_pdf,
+    PdfEngineUnavailable,
+    check_pdf_engine,
+    append_reports,
+    content_key,
+    submit_job,
+    QueueFull,
+    convert_file,
+    convert_batch,
+    compare_versions,
+    format_price,
+    STAGES,
+    STAGE_LABELS,
+)
+from cost_analysis import metrics
+
+# 量測日誌與 /metrics（依 COST_ANALYSIS_LOG_LEVEL / COST_ANALYSIS_METRICS_PORT，每個程序只啟動一次）
+metrics.setup_logging()
+metrics.start_server()
+
+# 背景工作狀態的更新間隔（秒）
+JOB_POLL_INTERVAL = 0.2
+
+@st.cache_data(show_spinner="產生 PDF 中...", max_entries=64)
+def cached_pdf(report):
+    # 同一份報表數據只轉換一次，切換頁面或重新整理時不必重新產生
+    return render_pdf(report)
+
+def stage_lines(job):
+    """單一檔案各階段的狀態（已完成 / 進行中 / 未開始）"""
+    current = STAGES.index(job.stage) if job.stage in STAGES else -1
+    return "\n".join(
+        f"- {'✅' if i < current else '⏳' if i == current else '▫️'} {STAGE_LABELS[stage]}"
+        for i, stage in enumerate(STAGES)
+    )
+
+def follow_job(job, show_stages=False, preview_area=None):
     """
-    try:
-        # 在整個 DataFrame 中搜尋該標籤
-        for row_num in range(len(df)):
-            found_positions = []
-            
-            # 先找出所有符合該標籤的位置
-            for col_num in range(min(26, len(df.columns))):
-                cell_val = str(df.iloc[row_num, col_num]) if pd.notna(df.iloc[row_num, col_num]) else ""
-                if row_label in cell_val:
-                    found_positions.append(col_num)
-            
-            # 根據 col_idx 選擇適合的位置
-            if col_idx == "current":
-                # 現況在左側 (0-12 欄) - 優先選擇左邊的標籤
-                search_positions = [p for p in found_positions if p <= 12]
-                if not search_positions and found_positions:
-                    search_positions = [found_positions[0]]
-            else:
-                # 評估在右側 (13-25 欄) - 優先選擇右邊的標籤
-                search_positions = [p for p in found_positions if p >= 13]
-                if not search_positions and found_positions:
-                    search_positions = [found_positions[-1]]
-            
-            # 從選中的位置開始往右搜尋數值
-            for col_num in search_positions:
-                for offset in range(1, 5):
-                    if col_num + offset < len(df.columns):
-                        val_str = str(df.iloc[row_num, col_num + offset]) if pd.notna(df.iloc[row_num, col_num + offset]) else ""
-                        if is_number(val_str):
-                            num = float(val_str.replace(',', '').replace('，', ''))
-                            return num / rate  # 返回未格式化的數值
-        
-        return "-"
-    except Exception as e:
-        return "-"
-
-def is_number(val):
-    """判斷字串是否為數字"""
-    try:
-        if isinstance(val, str):
-            val = val.strip().replace(',', '').replace('，', '')
-            if not val or val == '-' or val == '—':
-                return False
-            float(val)
-            return True
-        elif isinstance(val, (int, float)):
-            return not pd.isna(val)
-        return False
-    except:
-        return False
-
-def format_quantity(value):
-    """格式化數量為整數（無小數點）"""
-    if value == "-" or isinstance(value, str):
-        return value
-    try:
-        return str(int(round(float(value))))
-    except:
-        return "-"
-
-def format_price(value):
-    """格式化金額為2位小數"""
-    if value == "-" or isinstance(value, str):
-        return value
-    try:
-        return f"{float(value):.2f}"
-    except:
-        return "-"
-
-
-# PDF 函數已移除
-
-# --- 3. HTML 模板生成 ---
-def generate_html(data):
-    html_template = """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <style>
-            body { 
-                font-family: Arial, Helvetica, sans-serif; 
-                margin: 20px; 
-                line-height: 1.6;
-                color: #333;
-            }
-            h1 { 
-                text-align: center;
-                color: #000;
-                border-bottom: 2px solid #333;
-                padding-bottom: 10px;
-            }
-            .container { 
-                display: flex; 
-                gap: 30px; 
-                margin: 20px 0;
-            }
-            .section { 
-                flex: 1;
-                padding: 15px;
-                border: 1px solid #ddd;
-                background: #fafafa;
-            }
-            .section h2 {
-                font-size: 1.1em;
-                color: #333;
-                margin: 0 0 15px 0;
-            }
-            table { 
-                width: 100%; 
-                border-collapse: collapse;
-                background: white;
-            }
-            th, td { 
-                border: 1px solid #ccc; 
-                padding: 8px;
-                text-align: center;
-            }
-            th { 
-                background-color: #e0e0e0;
-                font-weight: bold;
-            }
-            .highlight { 
-                background-color: #e3f2fd;
-                font-weight: bold;
-            }
-            .process-section {
-                margin-top: 30px;
-                padding: 15px;
-                border: 1px solid #ddd;
-                background: #fafafa;
-            }
-            .process-section h2 {
-                font-size: 1.1em;
-                color: #333;
-                margin: 0 0 15px 0;
-            }
-            .footer {
-                text-align: center;
-                color: #999;
-                font-size: 0.9em;
-                margin-top: 30px;
-                padding-top: 20px;
-                border-top: 1px solid #ddd;
-            }
-            .print-button {
-                position: fixed;
-                top: 20px;
-                right: 180px;
-                background-color: #4CAF50;
-                color: white;
-                padding: 12px 24px;
-                border: none;
-                border-radius: 4px;
-                cursor: pointer;
-                font-size: 16px;
-                box-shadow: 0 2px 5px rgba(0,0,0,0.2);
-                z-index: 1000;
-                text-decoration: none;
-                display: inline-block;
-            }
-            .print-button:hover {
-                background-color: #45a049;
-            }
-            .download-button {
-                position: fixed;
-                top: 20px;
-                right: 20px;
-                background-color: #2196F3;
-                color: white;
-                padding: 12px 24px;
-                border: none;
-                border-radius: 4px;
-                cursor: pointer;
-                font-size: 16px;
-                box-shadow: 0 2px 5px rgba(0,0,0,0.2);
-                z-index: 1000;
-                text-decoration: none;
-                display: inline-block;
-            }
-            .download-button:hover {
-                background-color: #0b7dda;
-            }
-            @media print {
-                .print-button, .download-button {
-                    display: none;
-                }
-            }
-        </style>
-    </head>
-    <body>
-        <button class="print-button" onclick="window.print()">🖨️ 列印報表</button>
-        <a class="download-button" download="Analysis_""" + str(data['part_no']) + """.html" href="#" onclick="downloadHTML(); return false;">📄 下載 HTML</a>
-        <script>
-        function downloadHTML() {
-            var element = document.documentElement.cloneNode(true);
-            element.querySelector('.print-button').remove();
-            element.querySelector('.download-button').remove();
-            var htmlContent = element.outerHTML;
-            var blob = new Blob([htmlContent], {type: 'text/html'});
-            var url = URL.createObjectURL(blob);
-            var a = document.createElement('a');
-            a.href = url;
-            a.download = 'Analysis_""" + str(data['part_no']) + """.html';
-            a.click();
-            URL.revokeObjectURL(url);
-        }
-        </script>
-        <h1>成本分析 | Cost Analysis | """ + str(data['part_no']) + """</h1>
-        <div class="container">
-            <div class="section">
-                <h2>現況：成本分析 | Current Situation: Cost Analysis</h2>
-                <table>
-                    <tr><th>項目 | Item</th><th>數量 | Quantity</th><th>百分比 | Percentage</th><th>成本 (""" + str(data['currency']) + """) | Cost (""" + str(data['currency']) + """)</th></tr>
-                    <tr><td>總投入數量 | Total Input Quantity</td><td>""" + str(data['c_total_qty']) + """</td><td>-</td><td>""" + str(data['c_total_input_cost']) + """</td></tr>
-                    <tr><td>良品數量 | Good Product Quantity</td><td>""" + str(data['c_good_qty']) + """</td><td>""" + str(data['c_good_rate']) + """%</td><td>-</td></tr>
-                    <tr><td>廢品數量 | Defective Quantity</td><td>""" + str(data['c_def_qty']) + """</td><td>""" + str(data['c_def_rate']) + """%</td><td>-</td></tr>
-                    <tr><td>加工成本 | Processing Cost</td><td>-</td><td>""" + str(data.get('c_proc_pct', '-')) + """%</td><td>""" + str(data['c_proc_cost']) + """</td></tr>
-                    <tr><td>總成本 | Total Cost</td><td>-</td><td>-</td><td>""" + str(data['c_total_cost']) + """</td></tr>
-                    <tr class="highlight"><td>單顆成本 | Unit Cost</td><td>-</td><td>-</td><td>""" + str(data['c_unit_cost']) + """</td></tr>
-                    <tr><td>目前售價 | Current Selling Price</td><td>-</td><td>-</td><td>""" + str(data['c_price']) + """ (""" + str(data.get('c_margin', '-')) + """%)</td></tr>
-                </table>
-            </div>
-            <div class="section">
-                <h2>評估：報價 | Evaluation: Quotation</h2>
-                <table>
-                    <tr><th>項目 | Item</th><th>數量 | Quantity</th><th>百分比 | Percentage</th><th>成本 (""" + str(data['currency']) + """) | Cost (""" + str(data['currency']) + """)</th></tr>
-                    <tr><td>總投入數量 | Total Input Quantity</td><td>""" + str(data['e_total_qty']) + """</td><td>-</td><td>""" + str(data['e_total_input_cost']) + """</td></tr>
-                    <tr><td>良品數量 | Good Product Quantity</td><td>""" + str(data['e_good_qty']) + """</td><td>""" + str(data['e_good_rate']) + """%</td><td>-</td></tr>
-                    <tr><td>廢品數量 | Defective Quantity</td><td>""" + str(data['e_def_qty']) + """</td><td>""" + str(data['e_def_rate']) + """%</td><td>-</td></tr>
-                    <tr><td>加工成本 | Processing Cost</td><td>-</td><td>""" + str(data.get('e_proc_pct', '-')) + """%</td><td>""" + str(data['e_proc_cost']) + """</td></tr>
-                    <tr><td>總成本 | Total Cost</td><td>-</td><td>-</td><td>""" + str(data['e_total_cost']) + """</td></tr>
-                    <tr class="highlight"><td>單顆成本 | Unit Cost</td><td>-</td><td>-</td><td>""" + str(data['e_unit_cost']) + """</td></tr>
-                    <tr><td>建議售價 (毛利潤20%) | Suggested Selling Price (20% Profit Margin)</td><td>-</td><td>-</td><td>""" + str(data['e_suggest_price']) + """</td></tr>
-                </table>
-            </div>
-        </div>
-        <div class="process-section">
-            <h2>工序比較 | Process Comparison</h2>
-            <table>
-                <tr><th>工序名稱 | Process Name</th><th>現況 (""" + str(data['currency']) + """) | Current Situation (""" + str(data['currency']) + """)</th><th>評估 (""" + str(data['currency']) + """) | Evaluation (""" + str(data['currency']) + """)</th></tr>
-                """ + str(data['process_rows']) + """
-            </table>
-        </div>
-        <div class="footer">
-            Generated by 成本分析轉換工具
-        </div>
-    </body>
-    </html>
+    等待背景工作完成並即時顯示進度；preview_area 不為 None 時，工作提供預覽報表後先行顯示
+    工作在背景執行，頁面重新整理或輸入改變時不會中斷，也不會重複送出
     """
-    return html_template
+    if job.finished():
+        return
+    with st.status(f"{job.label}...", expanded=True) as status:
+        bar = st.progress(job.fraction)
+        lines = st.empty()
+        previewed = False
+        while not job.wait(JOB_POLL_INTERVAL):
+            status.update(label=f"{job.label}...")
+            bar.progress(job.fraction)
+            if show_stages:
+                lines.markdown(stage_lines(job))
+            if preview_area is not None and job.preview is not None and not previewed:
+                # 數值已擷取完成：先顯示表頭與摘要（工序名稱翻譯完成後更新）
+                with preview_area.container():
+                    st.caption("⏳ 工序名稱翻譯中，以下為預覽")
+                    st.components.v1.html(generate_html(job.preview), height=600, scrolling=True)
+                previewed = True
+        status.update(label="轉換失敗" if job.error else "轉換完成", state="error" if job.error else "complete", expanded=False)
+    if preview_area is not None:
+        preview_area.empty()
 
 # --- 4. Streamlit 介面 ---
 st.set_page_config(page_title="成本分析轉換工具", page_icon="💼", layout="wide")
@@ -401,29 +92,47 @@ st.markdown("---")
 st.markdown("### 📋 成本分析轉換工具")
 st.markdown("上傳 Excel 檔案，智能解析成本數據並生成成本分析報表")
 
+mode = st.radio(
+    "🗂️ 模式",
+    ["單一檔案", "批次轉換", "版本比較"],
+    horizontal=True,
+    help="批次轉換可一次上傳多個檔案或 zip 壓縮檔；版本比較並列同一料號的多個版本（例: 原版與調整版）",
+)
+batch_mode = mode == "批次轉換"
+compare_mode = mode == "版本比較"
+multi_mode = batch_mode or compare_mode
+
 # 使用 4 欄分別放置不同的輸入項目
 col1, col2, col3, col4 = st.columns([2, 1.5, 1.5, 1])
 
 with col1:
-    uploaded_file = st.file_uploader("📁 上傳 Excel 檔案", type=["xlsx", "csv"])
+    if multi_mode:
+        label = "📁 上傳同一料號的各版本（可多選或 zip）" if compare_mode else "📁 上傳 Excel 檔案（可多選或 zip）"
+        uploaded_files = st.file_uploader(label, type=["xlsx", "csv", "zip"], accept_multiple_files=True)
+        uploaded_file = None
+    else:
+        uploaded_file = st.file_uploader("📁 上傳 Excel 檔案", type=["xlsx", "csv"])
+        uploaded_files = []
 
 with col2:
-    product_model = st.text_input("🏷️ 產品編號 *", placeholder="必填", help="例: 3-041004-032PN-0")
+    if multi_mode:
+        product_model = ""
+        st.text_input("🏷️ 產品編號", value="以檔名作為料號", disabled=True, help="例: 3-041004-032PN-0.xlsx → 3-041004-032PN-0")
+    else:
+        product_model = st.text_input("🏷️ 產品編號 *", placeholder="必填", help="例: 3-041004-032PN-0")
 
 with col3:
     currency = st.selectbox("💱 幣別 *", ["-- 請選擇 --", "台幣 (NTD)", "美金 (USD)", "歐元 (EUR)", "澳幣 (AUD)", "英鎊 (GBP)"])
 
+# 提取幣別代碼
+if currency and currency != "-- 請選擇 --":
+    currency_code = currency.split("(")[1].rstrip(")")
+else:
+    currency_code = None
+
 with col4:
-    # 根據選擇的幣別設定預設匯率
-    rate_defaults = {
-        "台幣 (NTD)": 1.0,
-        "美金 (USD)": 32.5,
-        "歐元 (EUR)": 35.5,
-        "澳幣 (AUD)": 21.5,
-        "英鎊 (GBP)": 41.0
-    }
-    
-    default_rate = rate_defaults.get(currency, 1.0) if currency != "-- 請選擇 --" else 1.0
+    # 根據選擇的幣別帶入今天的匯率（匯率表 / 匯率 API / 預設匯率，見 cost_analysis/rates.py）
+    default_rate = get_rate(currency_code) if currency_code else 1.0
     
     rate = st.number_input(
         "📊 匯率 *",
@@ -432,16 +141,10 @@ with col4:
         help="1 外幣 = ? 台幣"
     )
 
-# 提取幣別代碼
-if currency and currency != "-- 請選擇 --":
-    currency_code = currency.split("(")[1].rstrip(")")
-else:
-    currency_code = None
-
 # 驗證必填欄位
-if uploaded_file:
+if uploaded_file or uploaded_files:
     errors = []
-    if not product_model.strip():
+    if not multi_mode and not product_model.strip():
         errors.append("⚠️ 產品編號為必填項目")
     if not currency or currency == "-- 請選擇 --":
         errors.append("⚠️ 幣別為必填項目，請選擇")
@@ -454,177 +157,188 @@ if uploaded_file:
         st.stop()
 
 if uploaded_file and product_model.strip() and currency and currency != "-- 請選擇 --" and rate > 0:
-    # 讀取檔案
-    df = pd.read_csv(uploaded_file) if uploaded_file.name.endswith('.csv') else pd.read_excel(uploaded_file)
-    
-    # 提取零件編號 (如果沒手動輸入的話)
-    auto_part_no = str(df.iloc[1, 2]) if not df.empty else "Unknown"
-    part_no = product_model if product_model else auto_part_no
-    
-    # 提取數據 (現況 vs 評估) - 先初始化所有鍵
-    results = {
-        "part_no": part_no,
-        "currency": currency_code,
-        "c_total_qty": get_val(df, "總投入數量", "current"),
-        "c_good_qty": get_val(df, "良品數量", "current"),
-        "c_def_qty": "-",
-        "c_good_rate": "-",
-        "c_def_rate": "-",
-        "c_proc_pct": "-",
-        "c_total_input_cost": get_val(df, "投入成本", "current", rate),
-        "c_proc_cost": get_val(df, "加工成本", "current", rate),
-        "c_total_cost": get_val(df, "總成本", "current", rate),
-        "c_unit_cost": get_val(df, "單顆成本", "current", rate),
-        "c_price": get_val(df, "目前售價", "current", rate),
-        "c_margin": "-",
-        
-        "e_total_qty": get_val(df, "總投入數量", "eval"),
-        "e_good_qty": get_val(df, "良品數量", "eval"),
-        "e_def_qty": "-",
-        "e_good_rate": "-",
-        "e_def_rate": "-",
-        "e_proc_pct": "-",
-        "e_total_input_cost": get_val(df, "投入成本", "eval", rate),
-        "e_proc_cost": get_val(df, "加工成本", "eval", rate),
-        "e_total_cost": get_val(df, "總成本", "eval", rate),
-        "e_unit_cost": get_val(df, "單顆成本", "eval", rate),
-        "e_suggest_price": get_val(df, "建議售價", "eval", rate),
-        "process_rows": "",
-    }
-
-    # 計算百分比 (設定預設值)
-    results["c_def_qty"] = "-"
-    results["c_good_rate"] = "-"
-    results["c_def_rate"] = "-"
-    results["c_margin"] = "-"
-    results["e_def_qty"] = "-"
-    results["e_good_rate"] = "-"
-    results["e_def_rate"] = "-"
-    
-    try:
-        if isinstance(results["c_total_qty"], (int, float)) and isinstance(results["c_good_qty"], (int, float)):
-            results["c_def_qty"] = results["c_total_qty"] - results["c_good_qty"]
-            results["c_good_rate"] = round((results["c_good_qty"] / results["c_total_qty"]) * 100, 2)
-            results["c_def_rate"] = round(100 - results["c_good_rate"], 2)
-        
-        if isinstance(results["c_price"], (int, float)) and isinstance(results["c_unit_cost"], (int, float)) and results["c_unit_cost"] != 0:
-            results["c_margin"] = round(((results["c_price"] - results["c_unit_cost"]) / results["c_unit_cost"]) * 100, 1)
-        
-        if isinstance(results["e_total_qty"], (int, float)) and isinstance(results["e_good_qty"], (int, float)):
-            results["e_def_qty"] = results["e_total_qty"] - results["e_good_qty"]
-            results["e_good_rate"] = round((results["e_good_qty"] / results["e_total_qty"]) * 100, 2)
-            results["e_def_rate"] = round(100 - results["e_good_rate"], 2)
-    except:
-        pass
-
-    # 處理工序列表 - 動態尋找所有工序
-    process_html = ""
-    
-    # 尋找「製程」或「工序」標籤行
-    proc_start_row = -1
-    for i in range(len(df)):
-        row_str = ' '.join([str(cell) for cell in df.iloc[i, :5]])
-        if '製程' in row_str or '工序' in row_str:
-            proc_start_row = i + 1
-            break
-    
-    # 如果找不到標籤，從第 16 列開始
-    if proc_start_row == -1:
-        proc_start_row = 16
-    
-    # 從找到的位置開始提取所有工序
-    for i in range(proc_start_row, len(df)):
+    # 讀檔 → 擷取 → 翻譯 → 產生報表在背景執行（以檔案內容快取，改變料號 / 幣別 / 匯率時不必重新解析）
+    data = uploaded_file.getvalue()
+    job_key = ("file", content_key(data, uploaded_file.name), product_model, currency_code, rate)
+    job = st.session_state.get("job")
+    if job is None or job.key != job_key:
         try:
-            # 嘗試從第 1 列和第 2 列讀取工序名稱
-            p_name = None
-            for col_idx in [1, 2, 14, 15]:  # 檢查多個可能的欄位
-                if col_idx < len(df.columns):
-                    val = df.iloc[i, col_idx]
-                    if pd.notna(val) and isinstance(val, str) and val.strip() and val not in ['製程', '工序', '']:
-                        p_name = val.strip()
-                        break
-            
-            if not p_name:
-                # 如果沒找到名稱就停止
-                if i > proc_start_row + 20:  # 至少往下看 20 列
-                    break
-                continue
-            
-            # 嘗試從不同欄位提取成本
-            c_val = "-"
-            e_val = "-"
-            
-            try:
-                # 現況成本 - 嘗試第 7, 8, 9 欄
-                for col_idx in [7, 8, 9]:
-                    if col_idx < len(df.columns):
-                        val = df.iloc[i, col_idx]
-                        if pd.notna(val) and str(val).replace('.', '').replace('-', '').replace('e', '').replace('E', '').isdigit():
-                            c_val = round(float(val) / rate, 2)
-                            break
-                
-                # 評估成本 - 嘗試第 20, 21, 22 欄
-                for col_idx in [20, 21, 22]:
-                    if col_idx < len(df.columns):
-                        val = df.iloc[i, col_idx]
-                        if pd.notna(val) and str(val).replace('.', '').replace('-', '').replace('e', '').replace('E', '').isdigit():
-                            e_val = round(float(val) / rate, 2)
-                            break
-            except:
-                pass
-            
-            # 只有當至少有一個成本值時才加入
-            if c_val != "-" or e_val != "-":
-                c_val_formatted = format_price(c_val)
-                e_val_formatted = format_price(e_val)
-                process_html += f"<tr><td>{clean_process_name(p_name)}</td><td>{c_val_formatted}</td><td>{e_val_formatted}</td></tr>"
-        
-        except Exception as e:
-            # 靜默跳過異常行
-            continue
-    
-    results["process_rows"] = process_html
-
-    # 格式化數據用於顯示
-    display_data = {
-        "part_no": results["part_no"],
-        "currency": results["currency"],
-        # 現況數量 - 整數
-        "c_total_qty": format_quantity(results["c_total_qty"]),
-        "c_good_qty": format_quantity(results["c_good_qty"]),
-        "c_def_qty": format_quantity(results["c_def_qty"]),
-        # 現況金額 - 3位小數
-        "c_total_input_cost": format_price(results["c_total_input_cost"]),
-        "c_proc_cost": format_price(results["c_proc_cost"]),
-        "c_total_cost": format_price(results["c_total_cost"]),
-        "c_unit_cost": format_price(results["c_unit_cost"]),
-        "c_price": format_price(results["c_price"]),
-        # 現況百分比
-        "c_good_rate": results["c_good_rate"],
-        "c_def_rate": results["c_def_rate"],
-        "c_proc_pct": results.get("c_proc_pct", "-"),
-        "c_margin": results["c_margin"],
-        # 評估數量 - 整數
-        "e_total_qty": format_quantity(results["e_total_qty"]),
-        "e_good_qty": format_quantity(results["e_good_qty"]),
-        "e_def_qty": format_quantity(results["e_def_qty"]),
-        # 評估金額 - 3位小數
-        "e_total_input_cost": format_price(results["e_total_input_cost"]),
-        "e_proc_cost": format_price(results["e_proc_cost"]),
-        "e_total_cost": format_price(results["e_total_cost"]),
-        "e_unit_cost": format_price(results["e_unit_cost"]),
-        "e_suggest_price": format_price(results["e_suggest_price"]),
-        # 評估百分比
-        "e_good_rate": results["e_good_rate"],
-        "e_def_rate": results["e_def_rate"],
-        "e_proc_pct": results.get("e_proc_pct", "-"),
-        "process_rows": results["process_rows"]
-    }
-
-    # 生成 HTML
-    final_html = generate_html(display_data)
-    
+            job = submit_job(job_key, convert_file, data, uploaded_file.name, product_model, currency_code, rate)
+        except QueueFull as e:
+            st.warning(f"⏳ 伺服器忙碌中：{e}")
+            st.stop()
+        st.session_state["job"] = job
+    follow_job(job, show_stages=True, preview_area=st.empty())
+    if job.error:
+        st.error(f"❌ 轉換失敗：{job.error}")
+        st.stop()
+
+    # 原始數據、依幣別 / 匯率換算的報表 (現況 vs 評估) 與 HTML（顯示格式在此才套用），每個成本分析工作表一份
+    sheets = job.result
+    sheet_index = 0
+    if len(sheets) > 1:
+        sheet_index = st.selectbox(
+            "📑 工作表",
+            range(len(sheets)),
+            format_func=lambda i: f"{sheets[i][0]['sheet']}（{sheets[i][1].part_no}）",
+            help="活頁簿中有多個成本分析表，每個工作表以自動偵測的料號各自產生報表",
+        )
+    raw, report, final_html = sheets[sheet_index]
+    part_no = report.part_no
+
     st.success(f"解析完成！料號：{part_no}")
     
+    # 伺服器端產生 PDF（不需從瀏覽器列印）：按下下載時才產生，先確認引擎可用
+    try:
+        check_pdf_engine()
+    except PdfEngineUnavailable as e:
+        st.warning(f"⚠️ {e}")
+    else:
+        st.download_button(
+            "📕 下載 PDF",
+            data=partial(cached_pdf, report),
+            file_name=f"Analysis_{part_no}_{currency_code}.pdf",
+            mime="application/pdf",
+        )
+
+    # 所有幣別合併為單一 HTML（沿用同一份原始數據，頁面上可切換幣別）
+    st.download_button(
+        "🌐 下載多幣別 HTML",
+        data=generate_multi_html(apply_rates(raw, part_no, currency_rates(currency_code, rate))),
+        file_name=f"Analysis_{part_no}_ALL.html",
+        mime="text/html",
+        help="所選幣別與其他預設幣別的報表合併為一份，可在頁面上切換",
+    )
+
+    # 換算結果附加到分析資料集（按下時才寫入，重新整理不會重複寫入）
+    if st.button("📊 寫入分析資料集", help="將數量、良率、成本與工序金額存入 Parquet 資料集，供跨料號查詢"):
+        append_reports([report], sources=[uploaded_file.name])
+        st.success("📊 已寫入分析資料集")
+
     # 提供預覽（按鈕已在HTML中）
     st.components.v1.html(final_html, height=600, scrolling=True)
+
+if batch_mode and uploaded_files and currency and currency != "-- 請選擇 --" and rate > 0:
+    entries = expand_uploads([(f.name, f.getvalue()) for f in uploaded_files])
+    st.info(f"共 {len(entries)} 個檔案待轉換")
+
+    # 以檔案內容與幣別匯率作為批次識別，避免每次重新整理都重跑
+    with_pdf = st.checkbox("📕 同時產生 PDF", value=False, help="每份報表額外輸出 PDF，一併打包於 zip 中")
+    formats = ("html", "pdf") if with_pdf else ("html",)
+    all_currencies = st.checkbox("🌐 所有幣別", value=False, help="每個檔案只解析一次，所選幣別與其他預設幣別合併為一份可切換幣別的 HTML")
+    to_dataset = st.checkbox("📊 寫入分析資料集", value=False, help="轉換成功的報表一併存入 Parquet 資料集，供跨料號查詢")
+    rates = currency_rates(currency_code, rate) if all_currencies else {currency_code: rate}
+    batch_key = (
+        "batch", tuple(content_key(data, name) for name, data in entries), tuple(rates.items()), formats, to_dataset
+    )
+
+    # 批次在背景執行：轉換中按鈕停用，重新整理會接續顯示進度而不會重複送出
+    batch_job = st.session_state.get("batch_job")
+    if batch_job is not None and batch_job.key != batch_key:
+        batch_job = None
+    running = batch_job is not None and not batch_job.finished()
+    if st.button("🚀 開始批次轉換", disabled=not entries or running):
+        try:
+            batch_job = submit_job(batch_key, convert_batch, entries, rates, formats, all_currencies, to_dataset)
+            st.session_state["batch_job"] = batch_job
+        except QueueFull as e:
+            st.warning(f"⏳ 伺服器忙碌中：{e}")
+
+    if batch_job is not None:
+        follow_job(batch_job)
+    if batch_job is not None and batch_job.error:
+        st.error(f"❌ 批次轉換失敗：{batch_job.error}")
+    elif batch_job is not None:
+        batch_results = batch_job.result
+        ok_count = sum(1 for r in batch_results if r["ok"])
+        st.success(f"批次轉換完成！成功 {ok_count} / {len(batch_results)}")
+
+        # 每個檔案的成功 / 失敗狀態
+        st.dataframe(
+            pd.DataFrame([
+                {"檔案": r["file"], "工作表": r["sheet"], "料號": r["part_no"], "幣別": r["currency"], "狀態": "✅ 成功" if r["ok"] else "❌ 失敗", "錯誤訊息": r["error"]}
+                for r in batch_results
+            ]),
+            use_container_width=True,
+            hide_index=True,
+        )
+
+        if ok_count:
+            # 以函式傳入：按下下載時才打包 zip / 讀取 PDF 檔，重新整理頁面時不會把整批報表讀進記憶體
+            st.download_button(
+                "📦 下載全部報表 (zip)",
+                data=partial(build_zip, batch_results),
+                file_name=f"Analysis_{'ALL' if all_currencies else currency_code}.zip",
+                mime="application/zip",
+            )
+            with st.expander("📄 個別報表"):
+                for i, r in enumerate(batch_results):
+                    if not r["ok"]:
+                        continue
+                    html_col, pdf_col = st.columns(2)
+                    if r["html"] is not None:
+                        with html_col:
+                            st.download_button(
+                                f"⬇️ {r['part_no']} ({r['currency']})",
+                                data=r["html"],
+                                file_name=f"{r['part_no']}_{r['currency']}.html",
+                                mime="text/html",
+                                key=f"batch_download_{i}",
+                            )
+                    if r["pdf"] is not None:
+                        with pdf_col:
+                            st.download_button(
+                                f"📕 {r['part_no']} ({r['currency']}, PDF)",
+                                data=Path(r["pdf"]).read_bytes,
+                                file_name=f"{r['part_no']}_{r['currency']}.pdf",
+                                mime="application/pdf",
+                                key=f"batch_pdf_{i}",
+                            )
+
+if compare_mode and uploaded_files and currency and currency != "-- 請選擇 --" and rate > 0:
+    entries = expand_uploads([(f.name, f.getvalue()) for f in uploaded_files])
+    if len(entries) < 2:
+        st.info("請上傳至少兩個版本的檔案")
+        st.stop()
+
+    # 基準版本排在第一個，其餘依上傳順序
+    base_index = st.selectbox("📌 基準版本", range(len(entries)), format_func=lambda i: entries[i][0])
+    entries = [entries[base_index]] + entries[:base_index] + entries[base_index + 1:]
+
+    # 已解析過的版本沿用結果快取，新增版本或改變匯率時只需解析新的檔案
+    compare_key = ("compare", tuple(content_key(data, name) for name, data in entries), currency_code, rate)
+    compare_job = st.session_state.get("compare_job")
+    if compare_job is None or compare_job.key != compare_key:
+        try:
+            compare_job = submit_job(compare_key, compare_versions, entries, currency_code, rate)
+        except QueueFull as e:
+            st.warning(f"⏳ 伺服器忙碌中：{e}")
+            st.stop()
+        st.session_state["compare_job"] = compare_job
+    follow_job(compare_job)
+    if compare_job.error:
+        st.error(f"❌ 版本比較失敗：{compare_job.error}")
+        st.stop()
+
+    comparison, compare_html = compare_job.result
+
+    # 各版本評估單顆成本與基準版本的差異（成本增加為紅色）
+    unit_cost = comparison.summary_row("evaluation", "unit_cost")
+    for i, (metric_col, version) in enumerate(zip(st.columns(len(comparison.versions)), comparison.versions)):
+        with metric_col:
+            st.metric(
+                version,
+                f"{format_price(unit_cost.values[i])} {currency_code}",
+                # 基準版本或任一版本沒有資料（NaN）時不顯示差異
+                None if i == 0 or isnan(unit_cost.deltas[i]) else f"{unit_cost.deltas[i]:+.2f}",
+                delta_color="inverse",
+                help="評估單顆成本（與基準版本的差異）",
+            )
+
+    st.download_button(
+        "🌐 下載比較報表 HTML",
+        data=compare_html,
+        file_name=f"Compare_{comparison.versions[0]}_{currency_code}.html",
+        mime="text/html",
+    )
+    st.components.v1.html(compare_html, height=800, scrolling=True)
@@ -0,0 +1,130 @@
+"""
+轉換流程各階段效能量測：讀檔 → 標籤數值 → 工序區塊 → 工序翻譯 → HTML 生成
+
+使用：
+    python benchmarks/bench_pipeline.py                      # 範例檔 × 1 / 10 / 100 / 1000 倍工序列
+    python benchmarks/bench_pipeline.py --scales 1 10 -n 3   # 指定放大倍數與重複次數
+    python benchmarks/bench_pipeline.py --translate-latency 50   # 以本機模擬翻譯 API（每次查詢 50ms）量測未快取的翻譯
+    python benchmarks/bench_pipeline.py --translate-latency 50 --fuzzy-threshold 1.1   # 停用近似比對，未知名稱全部查詢 API
+    python benchmarks/bench_pipeline.py --cold-layout        # 每次都清空版面快取，量測完整搜尋標籤的耗時
+
+放大版工作表以 fixtures.scale_workbook 產生（工序區塊重複 N 次）；
+每個階段取 n 次的中位數，並確認放大後的數值與工序列表與原檔一致。
+預設保留版面快取（同一範本第二次起依擷取計畫直接讀取標籤數值），--cold-layout 時每次都重新搜尋。
+量測完成後執行 golden.py 的回歸檢查，擷取結果與快照 / 範例報表不符時結束代碼為 1
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from contextlib import nullcontext
+
+from fixtures import read_file, reset_translation_cache, sample_workbooks, scale_workbook, translation_api
+from golden import run_checks
+
+from cost_analysis import translate  # noqa: E402
+from cost_analysis.core import (  # noqa: E402
+    apply_rate,
+    detect_part_no,
+    extract_raw,
+    find_processes,
+    generate_html,
+    layout_cache,
+    read_table,
+    sheet_values,
+    translate_processes,
+)
+from cost_analysis.readers import default_engine  # noqa: E402
+
+STAGES = ["read", "labels", "processes", "translate", "render"]
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+def render(raw):
+    return generate_html(apply_rate(raw, "BENCH", "USD", 32.5))
+
+def run_stages(data, filename, engine, cold_translation, cold_layout):
+    """執行一次完整流程，回傳 ({階段: 秒數}, 原始數據)"""
+    timings = {}
+    if cold_layout:
+        layout_cache.clear()
+    timings["read"], df = timed(read_table, data, filename, engine)
+    timings["labels"], (values, start) = timed(sheet_values, df)
+    timings["processes"], items = timed(find_processes, df, start)
+    if cold_translation:
+        reset_translation_cache()
+    timings["translate"], processes = timed(translate_processes, items)
+    raw = {"auto_part_no": detect_part_no(df), "values": values, "processes": processes}
+    timings["render"], _ = timed(render, raw)
+    return timings, raw
+
+def check_scaled(base, scaled, factor):
+    """放大版的數值應與原檔相同，工序列表為原檔重複 factor 次（名稱加上後綴）"""
+    if scaled["values"] != base["values"]:
+        return "數值與原檔不同"
+    amounts = [(c_val, e_val) for _, c_val, e_val in base["processes"]]
+    if [(c_val, e_val) for _, c_val, e_val in scaled["processes"]] != amounts * factor:
+        return f"工序數 {len(scaled['processes'])}，預期 {len(amounts) * factor}"
+    return ""
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="轉換流程各階段效能量測")
+    parser.add_argument("files", nargs="*", help="xlsx 檔案（預設為專案內的範例檔）")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100, 1000], help="工序區塊放大倍數")
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="每個檔案重複次數")
+    parser.add_argument("--engine", default=None, help="讀取引擎（預設同 COST_ANALYSIS_READER）")
+    parser.add_argument("--translate-latency", type=float, default=None, metavar="MS",
+                        help="以本機模擬翻譯 API 量測未快取的翻譯（每次查詢延遲毫秒數），預設只量測字典 / 快取")
+    parser.add_argument("--fuzzy-threshold", type=float, default=None,
+                        help="近似比對門檻（預設同 COST_ANALYSIS_FUZZY_THRESHOLD，大於 1 時停用近似比對）")
+    parser.add_argument("--cold-layout", action="store_true", help="每次都清空版面快取（量測完整搜尋標籤）")
+    parser.add_argument("--no-check", action="store_true", help="不執行回歸檢查")
+    args = parser.parse_args(argv)
+    if args.fuzzy_threshold is not None:
+        translate.FUZZY_THRESHOLD = args.fuzzy_threshold
+
+    engine = args.engine or default_engine()
+    files = args.files or sample_workbooks()
+    cold_translation = args.translate_latency is not None
+
+    print(f"讀取引擎：{engine}，重複 {args.repeat} 次取中位數（ms）")
+    header = f"{'檔案':<36} {'倍數':>5} {'工序數':>6} " + " ".join(f"{stage:>10}" for stage in STAGES) + f" {'total':>10}"
+    print(header)
+
+    ok = True
+    with translation_api(args.translate_latency / 1000) if cold_translation else nullcontext() as stub:
+        for path in files:
+            name = os.path.basename(path)
+            data = read_file(path)
+            # openpyxl 寫檔時數值只保留 15 位有效數字，放大版以同樣寫出的 1 倍工作表作為比對基準
+            base = {1: extract_raw(read_table(data, name))}
+            for factor in args.scales:
+                scaled_data = data if factor == 1 else scale_workbook(data, factor)
+                if factor != 1 and "copy" not in base:
+                    base["copy"] = extract_raw(read_table(scale_workbook(data, 1), name))
+                runs = [run_stages(scaled_data, name, engine, cold_translation, args.cold_layout) for _ in range(args.repeat)]
+                medians = {stage: statistics.median(t[stage] for t, _ in runs) * 1000 for stage in STAGES}
+                raw = runs[-1][1]
+                problem = check_scaled(base[1 if factor == 1 else "copy"], raw, factor)
+                if problem:
+                    ok = False
+                print(
+                    f"{name[:36]:<36} {factor:>4}x {len(raw['processes']):>6} "
+                    + " ".join(f"{medians[stage]:>10.1f}" for stage in STAGES)
+                    + f" {sum(medians.values()):>10.1f}"
+                    + (f"  ❌ {problem}" if problem else "")
+                )
+    if stub:
+        print(f"（模擬翻譯 API 共收到 {sum(stub.requests.values())} 次查詢）")
+
+    if not args.no_check:
+        print()
+        ok = run_checks() and ok
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
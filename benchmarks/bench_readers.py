@@ -0,0 +1,57 @@
+"""
+Excel 讀取引擎效能比較：pandas（原本的 pd.read_excel）vs openpyxl 串流 vs calamine
+
+使用：
+    python benchmarks/bench_readers.py                 # 使用專案內的範例 xlsx
+    python benchmarks/bench_readers.py a.xlsx b.xlsx -n 20
+
+每個引擎讀取同一檔案 n 次，列出中位數耗時，並確認擷取結果與 pandas 完全相同
+"""
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# 只比較讀檔與擷取，不連網翻譯
+os.environ.setdefault("COST_ANALYSIS_OFFLINE", "1")
+
+from cost_analysis.core import read_table, extract_raw  # noqa: E402
+from cost_analysis.readers import EXCEL_ENGINES, has_calamine  # noqa: E402
+
+def bench(data, filename, engine, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = read_table(data, filename, engine=engine)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), df
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Excel 讀取引擎效能比較")
+    parser.add_argument("files", nargs="*", help="xlsx 檔案（預設為專案內的範例檔）")
+    parser.add_argument("-n", "--repeat", type=int, default=10, help="每個引擎重複次數")
+    args = parser.parse_args(argv)
+
+    files = args.files or sorted(glob.glob(os.path.join(ROOT, "*.xlsx")))
+    engines = [e for e in EXCEL_ENGINES if e != "calamine" or has_calamine()]
+    if not has_calamine():
+        print("（未安裝 python-calamine，略過 calamine 引擎）")
+
+    print(f"{'檔案':<40} {'引擎':<10} {'中位數(ms)':>10} {'倍數':>6} {'列數':>6} 結果一致")
+    for path in files:
+        with open(path, "rb") as f:
+            data = f.read()
+        name = os.path.basename(path)
+        baseline, reference = bench(data, name, "pandas", args.repeat)
+        expected = extract_raw(reference)
+        for engine in engines:
+            elapsed, df = (baseline, reference) if engine == "pandas" else bench(data, name, engine, args.repeat)
+            same = extract_raw(df) == expected
+            print(f"{name:<40} {engine:<10} {elapsed * 1000:>10.1f} {baseline / elapsed:>5.1f}x {len(df):>6} {'✅' if same else '❌'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+基準測試與回歸檢查共用的工具：範例檔、放大版工作表、翻譯環境隔離與本機翻譯 API 模擬（與測試共用 tests/stubs.py）
+
+匯入本模組時會：
+- 將專案根目錄加入 sys.path
+- 改用暫存的翻譯快取（只含預設字典），結果不受本機 cache/ 內容影響
+- 預設離線，不呼叫外部翻譯 API
+因此必須在匯入 cost_analysis 之前匯入
+"""
+import atexit
+import glob
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+from io import BytesIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TMP_DIR = tempfile.mkdtemp(prefix="cost-analysis-bench-")
+atexit.register(shutil.rmtree, TMP_DIR, ignore_errors=True)
+os.environ["COST_ANALYSIS_TRANSLATION_DB"] = os.path.join(TMP_DIR, "translations.sqlite3")
+os.environ.setdefault("COST_ANALYSIS_OFFLINE", "1")
+
+from cost_analysis import translate  # noqa: E402
+from cost_analysis.core import ProcessBlockEnd, is_process_name, PROCESS_NAME_COLUMNS  # noqa: E402
+from cost_analysis.readers import iter_rows_openpyxl  # noqa: E402
+from tests.stubs import StubTranslator  # noqa: E402
+
+def sample_workbooks():
+    """專案內附的範例 xlsx"""
+    return sorted(glob.glob(os.path.join(ROOT, "*.xlsx")))
+
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def has_process_name(row):
+    return any(is_process_name(row[col_idx]) for col_idx in PROCESS_NAME_COLUMNS if col_idx < len(row))
+
+def process_block(rows):
+    """回傳工序區塊（連續有工序名稱的列）在 rows 中的 (起始, 結束) 位置，rows[0] 為標題列"""
+    block_end = ProcessBlockEnd()
+    for row_number, row in enumerate(rows[1:], start=1):
+        block_end(row_number - 1, row)
+        if block_end.start is not None:
+            break
+    start = (block_end.start if block_end.start is not None else 16) + 1
+    while start < len(rows) and not has_process_name(rows[start]):
+        start += 1
+    end = start
+    while end < len(rows) and has_process_name(rows[end]):
+        end += 1
+    return start, end
+
+def suffix(copy):
+    """第 n 份複製的工序名稱後綴（英文字母，不會被當成數字後綴移除）"""
+    return "" if copy == 0 else chr(ord("A") + (copy - 1) % 26)
+
+def scale_workbook(data, factor):
+    """
+    產生工序區塊重複 factor 次的工作表（只保留儲存格數值），回傳 xlsx bytes
+    複製出的工序名稱加上英文字母後綴，成為字典中沒有的名稱（最多 26 種後綴）；
+    這些名稱通常可由近似比對在本機解析，要量測翻譯 API 時以 --fuzzy-threshold 提高門檻
+    """
+    from openpyxl import Workbook
+
+    rows = list(iter_rows_openpyxl(data, max_columns=None))
+    start, end = process_block(rows)
+    block = rows[start:end]
+    scaled = rows[:end]
+    for copy in range(1, factor):
+        for row in block:
+            row = list(row)
+            for col_idx in PROCESS_NAME_COLUMNS:
+                if col_idx < len(row) and is_process_name(row[col_idx]):
+                    row[col_idx] = row[col_idx].strip() + suffix(copy)
+                    break
+            scaled.append(row)
+    scaled.extend(rows[end:])
+
+    book = Workbook(write_only=True)
+    sheet = book.create_sheet()
+    for row in scaled:
+        # iter_rows_openpyxl 以 "" 表示空白、NaN 表示錯誤值，寫回時都還原為空白儲存格
+        sheet.append([None if value == "" or value != value else value for value in row])
+    buffer = BytesIO()
+    book.save(buffer)
+    return buffer.getvalue()
+
+_db_counter = itertools.count()
+
+def reset_translation_cache():
+    """清空程序內翻譯快取並改用新的暫存資料庫（只含預設字典），用於量測未快取時的翻譯耗時"""
+    translate.TRANSLATION_DB = os.path.join(TMP_DIR, f"translations-{next(_db_counter)}.sqlite3")
+    translate.reset_caches()
+
+@contextmanager
+def translation_api(latency=0.02):
+    """
+    使用與測試相同的本機翻譯 API（tests/stubs.py，譯文為 "EN:原文"），每次查詢延遲 latency 秒
+    使用期間會切換為連網模式，並將翻譯 API 指向本機
+    """
+    stub = StubTranslator()
+    stub.delay = latency
+    saved = (translate.TRANSLATE_URL, translate.OFFLINE, os.environ.get("COST_ANALYSIS_OFFLINE"))
+    translate.TRANSLATE_URL = stub.url
+    translate.set_offline(False)
+    try:
+        yield stub
+    finally:
+        stub.close()
+        translate.TRANSLATE_URL, offline, env = saved
+        translate.set_offline(offline)
+        if env is not None:
+            os.environ["COST_ANALYSIS_OFFLINE"] = env
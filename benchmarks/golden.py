@@ -0,0 +1,212 @@
+"""
+回歸檢查：確認範例檔的擷取結果沒有改變
+
+1. 快照比對（golden/*.json）：每個範例 xlsx 以所有可用的讀取引擎擷取原始數據（台幣金額、數量、工序列表），
+   必須與快照完全相同（浮點數逐位比對）。修改 get_val / 工序迴圈等效能相關程式後執行，
+   確認報表金額沒有悄悄改變；確定結果「應該」改變時再以 --update 更新快照
+2. 範例報表比對（專案內附的 HTML）：以當時使用的幣別 / 匯率重新產生報表，
+   逐列比對數量與金額欄位（依範例報表顯示的小數位數，容許最後一位的誤差）
+
+使用：
+    python benchmarks/golden.py            # 檢查，有差異時結束代碼為 1
+    python benchmarks/golden.py --update   # 重新產生快照
+"""
+import argparse
+import html
+import json
+import os
+import re
+import sys
+
+from fixtures import ROOT, read_file, sample_workbooks
+
+from cost_analysis.core import apply_rate, extract_raw, generate_html, read_table  # noqa: E402
+from cost_analysis.readers import EXCEL_ENGINES, has_calamine  # noqa: E402
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+
+# 專案內附的範例報表：對應的 xlsx、產生時使用的幣別 / 匯率，以及已知不同的欄位（列, 欄）與原因
+# 3-001044-002TS-1-廠內製程.html 是舊版版面（含外包成本列、合併工序），無法逐列比對，不列入
+GOLDEN_REPORTS = [
+    {
+        "workbook": "3-041011-001AS-1-調整.xlsx",
+        "report": "3-041011-001AS-1.html",
+        "currency": "EUR",
+        "rate": 30.5,
+        "known_differences": {
+            ("Packing 1", "評估"): "xlsx 調整後評估包裝成本由 866 改為 866.39（28.39 -> 28.41）",
+        },
+    },
+    {
+        "workbook": "3-044027-001SN-0-調整.xlsx",
+        "report": "3-044027-001SN-0.html",
+        "currency": "USD",
+        "rate": 28.92,
+    },
+]
+
+# 匯率只記錄到小數 2 位，額外容許的相對誤差
+RATE_TOLERANCE = 5e-5
+
+def snapshot_path(workbook):
+    return os.path.join(GOLDEN_DIR, os.path.splitext(os.path.basename(workbook))[0] + ".json")
+
+def available_engines():
+    return [engine for engine in EXCEL_ENGINES if engine != "calamine" or has_calamine()]
+
+def snapshot(data, filename, engine):
+    """擷取原始數據，轉為與 JSON 快照相同的格式"""
+    raw = extract_raw(read_table(data, filename, engine=engine))
+    return json.loads(json.dumps(raw, ensure_ascii=False))
+
+def update_snapshots():
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    for path in sample_workbooks():
+        raw = snapshot(read_file(path), os.path.basename(path), "pandas")
+        with open(snapshot_path(path), "w", encoding="utf-8") as f:
+            json.dump(raw, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"已更新 {os.path.relpath(snapshot_path(path), ROOT)}")
+
+def diff_raw(expected, actual):
+    """列出兩份原始數據的差異"""
+    problems = []
+    if expected["auto_part_no"] != actual["auto_part_no"]:
+        problems.append(f"料號 {expected['auto_part_no']!r} -> {actual['auto_part_no']!r}")
+    for key, value in expected["values"].items():
+        if actual["values"].get(key) != value:
+            problems.append(f"{key}: {value!r} -> {actual['values'].get(key)!r}")
+    if len(expected["processes"]) != len(actual["processes"]):
+        problems.append(f"工序數 {len(expected['processes'])} -> {len(actual['processes'])}")
+    for i, (want, got) in enumerate(zip(expected["processes"], actual["processes"])):
+        if want != got:
+            problems.append(f"工序 {i}: {want!r} -> {got!r}")
+    return problems
+
+def check_snapshots(engines=None):
+    """回傳 [(檔案, 引擎, 差異列表)]，只列出有差異的項目"""
+    failures = []
+    for path in sample_workbooks():
+        name = os.path.basename(path)
+        if not os.path.exists(snapshot_path(path)):
+            failures.append((name, "-", ["沒有快照，請先執行 --update"]))
+            continue
+        with open(snapshot_path(path), encoding="utf-8") as f:
+            expected = json.load(f)
+        data = read_file(path)
+        for engine in engines or available_engines():
+            problems = diff_raw(expected, snapshot(data, name, engine))
+            if problems:
+                failures.append((name, engine, problems))
+    return failures
+
+def report_tables(text):
+    """解析報表 HTML，回傳 [[[儲存格文字, ...], ...], ...]（每個表格的每一列）"""
+    tables = []
+    for table in re.findall(r"<table[^>]*>(.*?)</table>", text, re.S):
+        rows = []
+        for row in re.findall(r"<tr[^>]*>(.*?)</tr>", table, re.S):
+            cells = re.findall(r"<t[dh][^>]*>(.*?)</t[dh]>", row, re.S)
+            rows.append([html.unescape(re.sub(r"<[^>]+>", "", cell)).strip() for cell in cells])
+        tables.append(rows)
+    return tables
+
+def parse_amount(text):
+    """取出儲存格開頭的數字，回傳 (數值, 小數位數)；不是數字回傳 None"""
+    match = re.match(r"^(-?[\d,]+(?:\.(\d+))?)", text)
+    if not match:
+        return None
+    return float(match.group(1).replace(",", "")), len(match.group(2) or "")
+
+def row_key(label):
+    """以英文項目名稱對應列（新舊版本的中文 / 括號附註不同），例: 建議售價 | Suggested Selling Price(20%) -> Suggested Selling Price"""
+    parts = [part.strip() for part in label.split("|")]
+    return (parts[1] if len(parts) > 1 else parts[0]).split("(")[0].strip()
+
+def compare_report(spec):
+    """重新產生報表並與範例報表比對，回傳差異列表"""
+    data = read_file(os.path.join(ROOT, spec["workbook"]))
+    raw = extract_raw(read_table(data, spec["workbook"]))
+    actual = report_tables(generate_html(apply_rate(raw, "-", spec["currency"], spec["rate"])))
+    with open(os.path.join(ROOT, spec["report"]), encoding="utf-8") as f:
+        expected = report_tables(f.read())
+
+    known = spec.get("known_differences", {})
+    problems = []
+    if len(expected) != len(actual):
+        return [f"表格數 {len(expected)} -> {len(actual)}"]
+
+    # 前兩個表格為現況 / 評估（比對數量與金額欄），第三個為工序比較（依順序比對現況與評估欄）
+    sections = [("現況", [1, 3]), ("評估", [1, 3]), ("工序", [1, 2])]
+    for (section, columns), want_rows, got_rows in zip(sections, expected, actual):
+        if section == "工序" and len(want_rows) != len(got_rows):
+            problems.append(f"工序數 {len(want_rows) - 1} -> {len(got_rows) - 1}")
+        got_by_key = {row_key(row[0]): row for row in got_rows[1:]}
+        for i, want in enumerate(want_rows[1:], start=1):
+            if section == "工序":
+                got = got_rows[i] if i < len(got_rows) else None
+            else:
+                got = got_by_key.get(row_key(want[0]))
+            if got is None:
+                problems.append(f"{section} {want[0]}: 找不到對應列")
+                continue
+            for col_idx in columns:
+                want_amount = parse_amount(want[col_idx])
+                got_amount = parse_amount(got[col_idx])
+                if want_amount is None and got_amount is None:
+                    continue
+                column = ["", "現況", "評估"][col_idx] if section == "工序" else ["", "數量", "", "金額"][col_idx]
+                if (row_key(want[0]), column) in known:
+                    continue
+                if want_amount is None or got_amount is None:
+                    problems.append(f"{section} {want[0]} {column}: {want[col_idx]!r} -> {got[col_idx]!r}")
+                    continue
+                value, decimals = want_amount
+                tolerance = 10 ** -decimals + abs(value) * RATE_TOLERANCE
+                if abs(value - got_amount[0]) > tolerance:
+                    problems.append(f"{section} {want[0]} {column}: {want[col_idx]} -> {got[col_idx]}")
+    return problems
+
+def check_reports():
+    """回傳 [(範例報表, 差異列表)]，只列出有差異的項目"""
+    failures = []
+    for spec in GOLDEN_REPORTS:
+        problems = compare_report(spec)
+        if problems:
+            failures.append((spec["report"], problems))
+    return failures
+
+def run_checks():
+    """執行所有回歸檢查並輸出結果，全部通過回傳 True"""
+    ok = True
+    engines = available_engines()
+    snapshot_failures = check_snapshots(engines)
+    for name, engine, problems in snapshot_failures:
+        ok = False
+        print(f"❌ 快照 {name} [{engine}]")
+        for problem in problems:
+            print(f"    {problem}")
+    if not snapshot_failures:
+        print(f"✅ 快照比對：{len(sample_workbooks())} 個範例檔 × {', '.join(engines)} 全部一致")
+
+    report_failures = check_reports()
+    for report, problems in report_failures:
+        ok = False
+        print(f"❌ 範例報表 {report}")
+        for problem in problems:
+            print(f"    {problem}")
+    if not report_failures:
+        print(f"✅ 範例報表比對：{len(GOLDEN_REPORTS)} 份報表的數量與金額一致")
+    return ok
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="範例檔擷取結果回歸檢查")
+    parser.add_argument("--update", action="store_true", help="以目前的擷取結果重新產生快照")
+    args = parser.parse_args(argv)
+    if args.update:
+        update_snapshots()
+        return 0
+    return 0 if run_checks() else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""成本分析轉換工具核心套件"""
+from .core import (
+    PROCESS_TRANSLATIONS,
+    COST_ITEM_TRANSLATIONS,
+    DEFAULT_RATES,
+    LabelIndex,
+    clean_process_name,
+    auto_translate,
+    get_val,
+    format_quantity,
+    format_price,
+    generate_html,
+    generate_multi_html,
+    read_table,
+    read_sheets,
+    detect_part_no,
+    extract_raw,
+    extract_workbook,
+    extract_sheets,
+    translate_workbook,
+    sheet_part_nos,
+    apply_rate,
+    apply_rates,
+    extract_results,
+    parse_file,
+    parse_workbook,
+    build_display_data,
+    build_report,
+    build_reports,
+    build_sheet_reports,
+    convert,
+)
+from .model import CostReport, CostSide, ProcessStep, reports_frame, processes_frame
+from .cache import ResultCache, ResultStore, content_key, get_result_store, result_cache
+from .translate import (
+    TranslationStore,
+    clean_process_names,
+    get_store,
+    normalize_process_names,
+    set_offline,
+    translate_many,
+)
+from .pdf import PdfEngineUnavailable, check_pdf_engine, render_pdf
+from .dataset import append_reports, read_dataset
+from .rates import RateProvider, RateTable, currency_rates, get_rate, get_rate_provider, resolve_rates
+from .batch import expand_uploads, convert_one, convert_currencies, run_batch, dataset_reports, build_zip
+from .compare import Comparison, compare_files, compare_reports, generate_compare_html
+from .jobs import STAGES, STAGE_LABELS, Job, QueueFull, compare_versions, convert_batch, convert_file, submit_job
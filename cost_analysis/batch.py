@@ -0,0 +1,226 @@
+"""
+批次轉換：多個 xlsx / csv（或 zip 壓縮檔）平行解析，
+每個檔案依每個幣別輸出一份 HTML（及 / 或 PDF）報表，並可打包成單一 zip 下載
+多個幣別時每個檔案只解析一次，也可合併為單一可切換幣別的 HTML
+活頁簿中有多個成本分析表時，每個工作表各自輸出報表（料號為各工作表自動偵測的料號）
+指定 pdf_dir 時 PDF 直接串流寫入檔案，結果只帶檔案路徑，打包 zip 時再逐一讀入，整批 PDF 不必同時留在記憶體
+"""
+import os
+import tempfile
+import threading
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from . import metrics
+from .core import build_sheet_reports, generate_html, generate_multi_html
+from .pdf import render_pdf
+
+SUPPORTED_EXTENSIONS = (".xlsx", ".csv")
+
+# 輸出格式
+REPORT_FORMATS = ("html", "pdf")
+
+# 多幣別合併 HTML 的幣別欄位 / 檔名標示
+COMBINED_CURRENCY = "ALL"
+
+# 批次轉換的子程序數上限（同一程序中所有批次共用一個 process pool，預設為 CPU 核心數）
+BATCH_WORKERS = int(os.environ.get("COST_ANALYSIS_BATCH_WORKERS", 0)) or os.cpu_count() or 1
+
+def expand_uploads(files):
+    """
+    將上傳檔案展開為 (檔名, 內容) 列表
+    files: [(檔名, bytes 或檔案路徑), ...]，zip 檔會展開其中的 xlsx / csv（展開後為 bytes），其餘原樣保留
+    """
+    entries = []
+    for name, data in files:
+        if name.lower().endswith(".zip"):
+            with zipfile.ZipFile(BytesIO(data) if isinstance(data, bytes) else data) as archive:
+                for info in archive.infolist():
+                    base = os.path.basename(info.filename)
+                    # 略過資料夾與 macOS 產生的隱藏檔（__MACOSX/._xxx）
+                    if info.is_dir() or base.startswith(".") or "__MACOSX" in info.filename:
+                        continue
+                    if base.lower().endswith(SUPPORTED_EXTENSIONS):
+                        entries.append((base, archive.read(info)))
+        elif name.lower().endswith(SUPPORTED_EXTENSIONS):
+            entries.append((name, data))
+    return entries
+
+def part_no_from_filename(filename):
+    """批次模式以檔名（不含副檔名）作為料號，例: 3-041004-032PN-0.xlsx -> 3-041004-032PN-0"""
+    return os.path.splitext(os.path.basename(filename))[0]
+
+def write_pdf(report, pdf_dir=None):
+    """產生報表 PDF：指定 pdf_dir 時串流寫入該資料夾中的新檔案並回傳路徑，否則回傳 PDF bytes"""
+    if pdf_dir is None:
+        return render_pdf(report)
+    path = os.path.join(pdf_dir, f"{uuid.uuid4().hex}.pdf")
+    with open(path, "xb") as f:
+        render_pdf(report, f)
+    return path
+
+def convert_currencies(filename, data, rates, part_no=None, formats=("html",), combined=False, pdf_dir=None):
+    """
+    單一檔案轉換為多個幣別（只解析一次，可在子程序中執行），失敗時回傳錯誤訊息而不拋出例外
+    rates: {幣別: 匯率}；回傳每個工作表、每個幣別一筆結果（"currency" 為幣別，"sheet" 為工作表名稱），失敗時只回傳一筆
+    part_no: 只有一個成本分析表時使用（預設為檔名）；多個工作表時為各自偵測的料號，見 core.sheet_part_nos
+    formats: 要產生的格式（"html" / "pdf"），未產生的格式在結果中為 None
+    combined: HTML 合併為單一可切換幣別的報表（幣別為 COMBINED_CURRENCY），PDF 仍為每個幣別一份
+    pdf_dir: PDF 寫入此資料夾，結果的 "pdf" 為檔案路徑（見 write_pdf）；為 None 時為 PDF bytes
+    結果的 "report" 為換算後的 CostReport，可用於跨檔案統計（model.reports_frame）；
+    合併時只有合併 HTML 那一筆帶有 report（第一個幣別），避免同一份報表重複計入
+    """
+    part_no = part_no or part_no_from_filename(filename)
+
+    def result(currency_code, **values):
+        return {"file": filename, "sheet": "", "part_no": part_no, "currency": currency_code, "ok": False,
+                "report": None, "html": None, "pdf": None, "error": "", **values}
+
+    try:
+        results = []
+        for sheet, sheet_part_no, reports in build_sheet_reports(data, filename, part_no, rates):
+            if combined:
+                results.append(result(COMBINED_CURRENCY, sheet=sheet, part_no=sheet_part_no, ok=True,
+                                      report=reports[0], html=generate_multi_html(reports)))
+                if "pdf" in formats:
+                    results += [
+                        result(report.currency, sheet=sheet, part_no=sheet_part_no, ok=True, pdf=write_pdf(report, pdf_dir))
+                        for report in reports
+                    ]
+                continue
+            results += [
+                result(
+                    report.currency,
+                    sheet=sheet,
+                    part_no=sheet_part_no,
+                    ok=True,
+                    report=report,
+                    html=generate_html(report) if "html" in formats else None,
+                    pdf=write_pdf(report, pdf_dir) if "pdf" in formats else None,
+                )
+                for report in reports
+            ]
+        return results
+    except Exception as e:
+        return [result(COMBINED_CURRENCY if combined or len(rates) > 1 else next(iter(rates)), error=str(e))]
+
+def convert_one(filename, data, currency_code, rate, part_no=None, formats=("html",)):
+    """單一檔案、單一幣別轉換，見 convert_currencies（多個成本分析表時回傳第一個）"""
+    return convert_currencies(filename, data, {currency_code: rate}, part_no, formats)[0]
+
+def _convert_measured(*args):
+    """在子程序中執行 convert_currencies，連同這次的量測結果一起回傳（見 run_batch）"""
+    metrics.registry.drain()
+    results = convert_currencies(*args)
+    return results, metrics.registry.drain()
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_process_pool():
+    """本程序共用的批次轉換 process pool（子程序數上限為 BATCH_WORKERS，每個程序建立一次）"""
+    global _pool, _pool_pid
+    if _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool_pid != os.getpid():
+                _pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS)
+                _pool_pid = os.getpid()
+    return _pool
+
+def _discard_process_pool(pool):
+    """子程序異常結束後 pool 無法再使用，下次重新建立"""
+    global _pool_pid
+    with _pool_lock:
+        if _pool is pool:
+            _pool_pid = None
+
+def spool_entries(entries, directory):
+    """記憶體中的檔案內容寫入資料夾，回傳 (檔名, 路徑或原本的路徑) 列表"""
+    spooled = []
+    for i, (name, data) in enumerate(entries):
+        if isinstance(data, bytes):
+            path = os.path.join(directory, f"{i}{os.path.splitext(name)[1]}")
+            with open(path, "wb") as f:
+                f.write(data)
+            data = path
+        spooled.append((name, data))
+    return spooled
+
+def run_batch(entries, rates, max_workers=None, on_done=None, formats=("html",), combined=False, pdf_dir=None):
+    """
+    以 process pool 平行轉換多個檔案（未指定 max_workers 時使用本程序共用的 pool，同時執行的批次不會各自建立子程序）
+    entries: [(檔名, bytes 或檔案路徑), ...]；bytes 先寫入暫存資料夾，子程序只接收路徑並直接由檔案讀取（csv 逐列串流）
+    rates: {幣別: 匯率}，每個檔案只解析一次並換算為每個幣別
+    on_done: 每完成一個檔案呼叫 on_done(已完成數, 總數)，可用於更新進度
+    formats / combined / pdf_dir: 見 convert_currencies（產生 PDF 時應指定 pdf_dir，子程序只回傳檔案路徑）
+    回傳結果列表（依 entries 順序，同一檔案的各幣別相鄰）；子程序的量測結果併入本程序的 metrics
+    """
+    if not entries:
+        return []
+    results = [None] * len(entries)
+    pool = get_process_pool() if max_workers is None else ProcessPoolExecutor(max_workers=max_workers)
+    futures = {}
+    upload_dir = tempfile.TemporaryDirectory(prefix="cost-analysis-batch-")
+    try:
+        for i, (name, path) in enumerate(spool_entries(entries, upload_dir.name)):
+            futures[pool.submit(_convert_measured, name, path, rates, None, formats, combined, pdf_dir)] = i
+        for done, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]], measured = future.result()
+            metrics.registry.merge(measured)
+            if on_done:
+                on_done(done, len(entries))
+    except BrokenProcessPool:
+        _discard_process_pool(pool)
+        raise
+    finally:
+        # 中途失敗時取消尚未開始的檔案，不佔用共用的 pool
+        for future in futures:
+            future.cancel()
+        if max_workers is not None:
+            pool.shutdown()
+        upload_dir.cleanup()
+    return [result for file_results in results for result in file_results]
+
+def dataset_reports(results, rates):
+    """
+    批次結果中要寫入分析資料集的報表，回傳 (報表列表, 來源檔名列表)
+    每個檔案的每個工作表只取第一個幣別：其他幣別為同一份數據換算，資料集的 currency / rate 欄位即可還原台幣
+    """
+    currency_code = next(iter(rates))
+    converted = [
+        result for result in results
+        if result["ok"] and result["report"] is not None and result["report"].currency == currency_code
+    ]
+    return [result["report"] for result in converted], [result["file"] for result in converted]
+
+def build_zip(results, target=None):
+    """
+    將成功的報表打包為 zip（檔名：料號_幣別.html / 料號_幣別.pdf）
+    PDF 為檔案路徑時逐一由檔案讀入（見 convert_currencies 的 pdf_dir）
+    target: 檔案路徑或可寫入的檔案物件（直接寫入）；為 None 時回傳 zip bytes
+    """
+    buffer = BytesIO() if target is None else target
+    used = set()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for result in results:
+            if not result["ok"]:
+                continue
+            base = f"{result['part_no']}_{result['currency']}"
+            # 同名檔案加上序號避免覆蓋（同一份報表的 HTML / PDF 使用相同序號）
+            counter = 2
+            while base in used:
+                base = f"{result['part_no']}_{result['currency']}_{counter}"
+                counter += 1
+            used.add(base)
+            if result.get("html") is not None:
+                archive.writestr(f"{base}.html", result["html"])
+            if isinstance(result.get("pdf"), str):
+                # PDF 已壓縮，不再重複壓縮
+                archive.write(result["pdf"], f"{base}.pdf", compress_type=zipfile.ZIP_STORED)
+            elif result.get("pdf") is not None:
+                archive.writestr(f"{base}.pdf", result["pdf"], compress_type=zipfile.ZIP_STORED)
+    return buffer.getvalue() if target is None else None
@@ -0,0 +1,203 @@
+"""
+解析結果快取：以檔案內容雜湊為鍵，保存與幣別無關、尚未翻譯工序名稱的原始數據（extract_sheets 的結果，每個工作表一份）
+重複上傳同一檔案，或只改變料號 / 幣別 / 匯率時，不必重新讀檔與掃描
+設定 COST_ANALYSIS_RESULT_DB 時另以 SQLite 保存（ResultStore），多個程序（多程序部署的各個 Streamlit 程序）共用解析結果
+"""
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import count
+
+RESULT_CACHE_SIZE = int(os.environ.get("COST_ANALYSIS_RESULT_CACHE_SIZE", 128))
+
+# 程序間共用的解析結果（未設定時只使用程序內快取）、保存時間與筆數上限
+RESULT_DB = os.environ.get("COST_ANALYSIS_RESULT_DB", "")
+RESULT_TTL = float(os.environ.get("COST_ANALYSIS_RESULT_TTL", 24 * 3600))
+RESULT_DB_SIZE = int(os.environ.get("COST_ANALYSIS_RESULT_DB_SIZE", 5000))
+# 每個程序每寫入幾筆結果清理一次過期與超過上限的結果（長時間執行的程序也不會讓資料庫無限成長）
+RESULT_PURGE_EVERY = int(os.environ.get("COST_ANALYSIS_RESULT_PURGE_EVERY", 100))
+
+# 快取內容的格式版本：原始數據的結構改變時遞增，ResultStore 中舊格式的結果不會再被讀到
+RESULT_FORMAT = 2
+
+def content_key(source, filename):
+    """
+    以檔案內容與檔案類型（csv / xlsx 解析方式不同）產生快取鍵
+    source 可為 bytes、路徑或二進位檔案物件：路徑與檔案物件分段讀取雜湊，不需整個讀入記憶體（檔案物件讀完後回到原位置）
+    """
+    kind = "csv" if filename.lower().endswith(".csv") else "xlsx"
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest = hashlib.sha256(source)
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            digest = hashlib.file_digest(f, "sha256")
+    else:
+        position = source.tell()
+        digest = hashlib.file_digest(source, "sha256")
+        source.seek(position)
+    return f"{kind}:v{RESULT_FORMAT}:{digest.hexdigest()}"
+
+class ResultStore:
+    """
+    SQLite 解析結果快取（同 TranslationStore：WAL 模式，多個程序可同時讀寫，每個執行緒各自持有連線）
+    值以 pickle 保存（只保存本程式產生的原始數據，資料庫應放在只有本服務可寫入的位置）
+    超過 ttl 秒的結果視為過期；超過 max_entries 筆時刪除最舊的結果（get_result_store 開啟時與每 purge_every 次寫入時清理）
+    """
+
+    def __init__(self, path, ttl=RESULT_TTL, max_entries=RESULT_DB_SIZE, purge_every=RESULT_PURGE_EVERY):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.purge_every = purge_every
+        self._puts = 0
+        self._puts_lock = threading.Lock()
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY,"
+                " value BLOB NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """回傳保存的結果，不存在或已過期回傳 None"""
+        row = self._connect().execute(
+            "SELECT value FROM results WHERE key = ? AND created_at > ?", (key, time.time() - self.ttl)
+        ).fetchone()
+        return None if row is None else pickle.loads(row[0])
+
+    def put(self, key, value):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, created_at) VALUES (?, ?, ?)",
+                (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), time.time()),
+            )
+        with self._puts_lock:
+            self._puts += 1
+            due = self._puts % self.purge_every == 0
+        if due:
+            self.purge()
+
+    def purge(self):
+        """刪除過期與超過筆數上限的結果"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM results WHERE created_at <= ?", (time.time() - self.ttl,))
+            conn.execute(
+                "DELETE FROM results WHERE key NOT IN (SELECT key FROM results ORDER BY created_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+def get_result_store():
+    """取得本程序的共用解析結果快取（未設定 COST_ANALYSIS_RESULT_DB 或無法開啟時回傳 None）"""
+    global _store, _store_pid
+    # fork 出來的子程序不可沿用父程序的 SQLite 連線
+    if _store_pid != os.getpid():
+        with _store_lock:
+            if _store_pid != os.getpid():
+                try:
+                    _store = ResultStore(RESULT_DB) if RESULT_DB else None
+                    if _store is not None:
+                        _store.purge()
+                except (sqlite3.Error, OSError):
+                    _store = None
+                _store_pid = os.getpid()
+    return _store
+
+class ResultCache:
+    """
+    執行緒安全的 LRU 快取，超過 max_entries 時淘汰最久未使用的項目
+    shared 時程序內沒有的結果再查詢共用的 ResultStore（get_result_store），新結果也寫入 ResultStore
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, shared=True):
+        self.max_entries = max_entries
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _store(self):
+        return get_result_store() if self.shared else None
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                count("cost_analysis_result_cache_total", result="hit")
+                return self._entries[key]
+        value = None
+        store = self._store()
+        if store is not None:
+            try:
+                value = store.get(key)
+            except (sqlite3.Error, pickle.UnpicklingError):
+                value = None
+        if value is None:
+            with self._lock:
+                self.misses += 1
+            count("cost_analysis_result_cache_total", result="miss")
+            return None
+        # 其他程序已解析過：放入程序內快取
+        self._remember(key, value)
+        with self._lock:
+            self.hits += 1
+        count("cost_analysis_result_cache_total", result="shared")
+        return value
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, key, value):
+        self._remember(key, value)
+        store = self._store()
+        if store is not None:
+            try:
+                store.put(key, value)
+            except sqlite3.Error:
+                pass  # 共用快取寫入失敗不影響轉換
+
+    def get_or_compute(self, key, compute):
+        """有快取直接回傳，否則呼叫 compute() 並存入快取（計算時不持有鎖）"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+# 本程序共用的解析結果快取
+result_cache = ResultCache()
@@ -0,0 +1,298 @@
+"""
+命令列入口（不啟動 Streamlit）
+
+使用：
+    python -m cost_analysis convert 3-041004-032PN-0.xlsx --currency USD
+    python -m cost_analysis convert *.xlsx 月結.zip --currency EUR --rate 35.2 -o reports/
+    python -m cost_analysis convert *.xlsx --currency USD --format both   # 同時輸出 HTML 與 PDF
+    python -m cost_analysis convert 月結/ --currency USD --dataset        # 同時寫入分析資料集（Parquet）
+    python -m cost_analysis convert *.xlsx --currency USD EUR GBP         # 一次輸出多個幣別（每個檔案只解析一次）
+    python -m cost_analysis convert *.xlsx --currency ALL --combined      # 所有幣別合併為單一可切換幣別的 HTML
+    python -m cost_analysis convert 月結/ --currency USD --date 2025-06-30  # 使用匯率表中該日的匯率
+    python -m cost_analysis convert 月結/ --currency USD --metrics metrics.prom  # 寫出各階段耗時與快取命中數
+    python -m cost_analysis compare 3-041011-001AS-1.xlsx 3-041011-001AS-1-調整.xlsx -c USD   # 版本比較（第一個為基準）
+    python -m cost_analysis rates import rates.csv                        # 匯入匯率表（currency,effective_date,rate[,source]）
+    python -m cost_analysis rates show --date 2025-06-30                  # 查看某日各幣別的匯率
+    python -m cost_analysis serve --port 8600                             # 啟動 HTTP 轉換服務（見 server.py）
+    python -m cost_analysis cluster --workers 4 --port 8501               # 多程序執行 Streamlit 介面（見 cluster.py）
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from contextlib import nullcontext
+from math import isnan
+
+from . import metrics
+from .batch import (
+    SUPPORTED_EXTENSIONS, REPORT_FORMATS, COMBINED_CURRENCY, expand_uploads, convert_currencies, run_batch, dataset_reports,
+)
+from .compare import compare_files, generate_compare_html
+from .core import DEFAULT_RATES, format_price
+from .rates import currency_rates, get_rate_table, resolve_rates, to_date
+from .settings import APP_WORKERS, SERVER_PORT, WORKER_PORT
+from .dataset import DATASET_DIR, append_reports
+from .pdf import PdfEngineUnavailable, check_pdf_engine
+from .translate import set_offline
+
+def collect_inputs(paths):
+    """
+    輸入路徑（檔案、zip 或資料夾）展開為 (檔名, 內容) 列表
+    檔案以路徑表示（轉換時直接由檔案讀取，不先讀入記憶體），zip 中的檔案為 bytes
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(
+                name for name in os.listdir(path)
+                if name.lower().endswith(SUPPORTED_EXTENSIONS + (".zip",)) and not name.startswith(".")
+            )
+            paths_in_dir = [os.path.join(path, name) for name in names]
+        else:
+            paths_in_dir = [path]
+        files.extend((os.path.basename(file_path), file_path) for file_path in paths_in_dir)
+    return expand_uploads(files)
+
+# --format 選項對應的輸出格式
+FORMAT_CHOICES = {"html": ("html",), "pdf": ("pdf",), "both": REPORT_FORMATS}
+
+def write_report(result, output_dir):
+    """寫出報表（HTML / PDF，檔名：料號_幣別），回傳檔案路徑列表"""
+    paths = []
+    base = os.path.join(output_dir, f"{result['part_no']}_{result['currency']}")
+    if result["html"] is not None:
+        with open(base + ".html", "w", encoding="utf-8") as f:
+            f.write(result["html"])
+        paths.append(base + ".html")
+    if result["pdf"] is not None:
+        # PDF 已由轉換程序串流寫入輸出資料夾中的暫存檔（見 cmd_convert），只需改名
+        os.replace(result["pdf"], base + ".pdf")
+        paths.append(base + ".pdf")
+    return paths
+
+def cmd_convert(args):
+    if args.offline:
+        set_offline(True)
+
+    # 未指定匯率時依日期由匯率表 / 匯率 API / 預設匯率自動取得（整批只查詢一次）
+    if args.rate is not None:
+        if COMBINED_CURRENCY in args.currency or len(set(args.currency)) > 1:
+            print("⚠️ --rate 只能用於單一幣別，多幣別時依日期自動取得匯率", file=sys.stderr)
+            return 2
+        rates = {args.currency[0]: args.rate}
+    elif COMBINED_CURRENCY in args.currency:
+        rates = currency_rates(on_date=args.date)
+    else:
+        rates = resolve_rates(args.currency, args.date)
+    if any(rate <= 0 for rate in rates.values()):
+        print("⚠️ 匯率必須大於 0", file=sys.stderr)
+        return 2
+    if not args.quiet and args.rate is None:
+        print(f"匯率（{args.date}）：" + "，".join(f"{code} {rate}" for code, rate in rates.items()))
+
+    entries = collect_inputs(args.inputs)
+    if not entries:
+        print("⚠️ 找不到可轉換的 xlsx / csv 檔案", file=sys.stderr)
+        return 2
+    if args.part_no and len(entries) > 1:
+        print("⚠️ --part-no 只能用於單一檔案，多檔時以檔名作為料號", file=sys.stderr)
+        return 2
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    formats = FORMAT_CHOICES[args.format]
+    if "pdf" in formats:
+        # 先確認 PDF 引擎可用，避免每個檔案都轉換失敗
+        try:
+            check_pdf_engine()
+        except PdfEngineUnavailable as e:
+            print(f"⚠️ {e}", file=sys.stderr)
+            return 2
+
+    # PDF 直接寫入輸出資料夾中的暫存資料夾（同一檔案系統，完成後改名即可，失敗時一併刪除）
+    pdf_tmp = tempfile.TemporaryDirectory(prefix=".pdf-", dir=args.output_dir) if "pdf" in formats else nullcontext()
+    with pdf_tmp as pdf_dir:
+        # 單檔或指定單一工作程序時直接轉換，省去建立 process pool 的成本
+        if len(entries) == 1 or args.workers == 1:
+            results = [
+                result
+                for name, data in entries
+                for result in convert_currencies(name, data, rates, args.part_no, formats, args.combined, pdf_dir)
+            ]
+        else:
+            results = run_batch(entries, rates, max_workers=args.workers, formats=formats, combined=args.combined,
+                                pdf_dir=pdf_dir)
+
+        failed = 0
+        for result in results:
+            if result["ok"]:
+                paths = write_report(result, args.output_dir)
+                if not args.quiet:
+                    print(f"✅ {result['file']} -> {', '.join(paths)}")
+            else:
+                failed += 1
+                print(f"❌ {result['file']}: {result['error']}", file=sys.stderr)
+
+    if args.dataset:
+        # 多幣別時每個檔案 / 工作表只寫入一份（見 batch.dataset_reports）
+        reports, sources = dataset_reports(results, rates)
+        count = append_reports(reports, args.dataset, sources=sources)
+        if not args.quiet:
+            print(f"📊 已寫入 {count} 份報表至分析資料集 {args.dataset}")
+
+    if args.metrics:
+        metrics.write_file(args.metrics)
+
+    if not args.quiet:
+        print(f"完成：成功 {len(results) - failed} / {len(results)}")
+    return 1 if failed else 0
+
+def cmd_compare(args):
+    if args.offline:
+        set_offline(True)
+    rate = args.rate if args.rate is not None else resolve_rates([args.currency], args.date)[args.currency]
+    if rate <= 0:
+        print("⚠️ 匯率必須大於 0", file=sys.stderr)
+        return 2
+
+    entries = collect_inputs(args.inputs)
+    try:
+        comparison = compare_files(entries, args.currency, rate)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    if args.json:
+        print(json.dumps(comparison.to_dict(), ensure_ascii=False, indent=2))
+    else:
+        output = args.output or f"{comparison.versions[0]}_compare_{args.currency}.html"
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(generate_compare_html(comparison))
+        if not args.quiet:
+            # 各版本評估單顆成本與基準版本的差異
+            unit_cost = comparison.summary_row("evaluation", "unit_cost")
+            for version, value, delta in zip(comparison.versions, unit_cost.values, unit_cost.deltas):
+                # 任一版本沒有資料時差異為 NaN，顯示為「—」（同比較報表）
+                print(f"{version}  {args.currency} {format_price(value)}  ({'—' if isnan(delta) else f'{delta:+.2f}'})")
+            print(f"✅ 比較報表：{output}")
+    return 0
+
+def cmd_rates_import(args):
+    table = get_rate_table()
+    if table is None:
+        print("⚠️ 無法開啟匯率表", file=sys.stderr)
+        return 2
+    for path in args.files:
+        try:
+            count = table.import_csv(path)
+        except (KeyError, ValueError) as e:
+            print(f"❌ {path}: {e}", file=sys.stderr)
+            return 1
+        print(f"✅ {path}：匯入 {count} 筆")
+    return 0
+
+def cmd_rates_show(args):
+    if args.offline:
+        set_offline(True)
+    if args.history:
+        table = get_rate_table()
+        for currency_code, effective_date, rate, source, _ in (table.history() if table is not None else []):
+            print(f"{currency_code}  {effective_date}  {rate:<10} {source}")
+        return 0
+    for currency_code, rate in resolve_rates(DEFAULT_RATES, args.date).items():
+        print(f"{currency_code}  {rate}")
+    return 0
+
+def cmd_serve(args):
+    if args.offline:
+        set_offline(True)
+    from .server import serve
+
+    try:
+        asyncio.run(serve(args.port, args.host))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+def cmd_cluster(args):
+    if args.offline:
+        set_offline(True)  # 同時設定環境變數，由各 worker 沿用
+    from .cluster import run_cluster
+
+    try:
+        asyncio.run(run_cluster(args.workers, args.port, args.host, args.worker_port, args.streamlit_args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cost-analysis", description="成本分析轉換工具（命令列版）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert = subparsers.add_parser("convert", help="將 xlsx / csv 轉換為 HTML / PDF 成本分析報表")
+    convert.add_argument("inputs", nargs="+", help="輸入檔案（xlsx / csv / zip）或資料夾")
+    convert.add_argument("-c", "--currency", required=True, nargs="+", type=str.upper,
+                         choices=list(DEFAULT_RATES) + [COMBINED_CURRENCY],
+                         help=f"幣別代碼，可指定多個（{COMBINED_CURRENCY} 為所有幣別），每個檔案只解析一次")
+    convert.add_argument("-r", "--rate", type=float, help="匯率（1 外幣 = ? 台幣，僅限單一幣別），預設依 --date 自動取得")
+    convert.add_argument("-d", "--date", type=to_date, default=to_date(None), help="匯率日期 YYYY-MM-DD（預設今天）")
+    convert.add_argument("--combined", action="store_true", help="多幣別合併為單一 HTML（頁面上可切換幣別，檔名為 料號_ALL.html）")
+    convert.add_argument("-p", "--part-no", help="料號（僅限單一檔案，預設使用檔名）")
+    convert.add_argument("-o", "--output-dir", default=".", help="輸出資料夾（預設為目前資料夾）")
+    convert.add_argument("-f", "--format", choices=list(FORMAT_CHOICES), default="html", help="輸出格式（預設 html）")
+    convert.add_argument("--dataset", nargs="?", const=DATASET_DIR, metavar="DIR",
+                         help=f"將換算結果附加到 Parquet 分析資料集（預設位置 {DATASET_DIR}）")
+    convert.add_argument("--metrics", default=metrics.METRICS_FILE or None, metavar="FILE",
+                         help="轉換完成後將量測結果（Prometheus 文字格式）寫入檔案，預設同 COST_ANALYSIS_METRICS_FILE")
+    convert.add_argument("-j", "--workers", type=int, help="平行處理的程序數（預設為 CPU 核心數）")
+    convert.add_argument("--offline", action="store_true", help="離線模式：不呼叫翻譯 API，只使用字典與翻譯快取")
+    convert.add_argument("-q", "--quiet", action="store_true", help="只輸出錯誤訊息")
+    convert.set_defaults(func=cmd_convert)
+
+    compare = subparsers.add_parser("compare", help="比較同一料號的多個版本（單顆成本、良率與各工序金額的差異）")
+    compare.add_argument("inputs", nargs="+", help="各版本的檔案（xlsx / csv / zip）或資料夾，第一個為基準版本")
+    compare.add_argument("-c", "--currency", required=True, type=str.upper, choices=list(DEFAULT_RATES), help="幣別代碼")
+    compare.add_argument("-r", "--rate", type=float, help="匯率（1 外幣 = ? 台幣），預設依 --date 自動取得")
+    compare.add_argument("-d", "--date", type=to_date, default=to_date(None), help="匯率日期 YYYY-MM-DD（預設今天）")
+    compare.add_argument("-o", "--output", help="輸出的 HTML 檔（預設：基準版本_compare_幣別.html）")
+    compare.add_argument("--json", action="store_true", help="以 JSON 輸出比較結果到標準輸出（不產生 HTML）")
+    compare.add_argument("--offline", action="store_true", help="離線模式：不呼叫翻譯 / 匯率 API")
+    compare.add_argument("-q", "--quiet", action="store_true", help="只輸出錯誤訊息")
+    compare.set_defaults(func=cmd_compare)
+
+    rates = subparsers.add_parser("rates", help="匯率表：匯入 / 查詢")
+    rates_commands = rates.add_subparsers(dest="rates_command", required=True)
+    rates_import = rates_commands.add_parser("import", help="由 CSV 匯入匯率（currency,effective_date,rate[,source]）")
+    rates_import.add_argument("files", nargs="+", help="CSV 檔案")
+    rates_import.set_defaults(func=cmd_rates_import)
+    rates_show = rates_commands.add_parser("show", help="查看某日各幣別的匯率")
+    rates_show.add_argument("-d", "--date", type=to_date, default=to_date(None), help="日期 YYYY-MM-DD（預設今天）")
+    rates_show.add_argument("--offline", action="store_true", help="離線模式：不呼叫匯率 API")
+    rates_show.add_argument("--history", action="store_true", help="列出匯率表中的所有紀錄")
+    rates_show.set_defaults(func=cmd_rates_show)
+
+    serve = subparsers.add_parser("serve", help="啟動 HTTP 轉換服務（POST /convert、POST /jobs，供其他系統呼叫）")
+    serve.add_argument("--port", type=int, default=SERVER_PORT, help=f"連接埠（預設 {SERVER_PORT}，可用 COST_ANALYSIS_SERVER_PORT 設定）")
+    serve.add_argument("--host", default="0.0.0.0", help="綁定位址（預設 0.0.0.0）")
+    serve.add_argument("--offline", action="store_true", help="離線模式：不呼叫翻譯 / 匯率 API")
+    serve.set_defaults(func=cmd_serve)
+
+    cluster = subparsers.add_parser("cluster", help="以多個程序執行 Streamlit 介面（前端轉送、共用快取、健康檢查）")
+    cluster.add_argument("-w", "--workers", type=int, default=APP_WORKERS,
+                         help=f"Streamlit 程序數（預設 {APP_WORKERS}，可用 COST_ANALYSIS_APP_WORKERS 設定）")
+    cluster.add_argument("--port", type=int, default=8501, help="對外連接埠（預設 8501）")
+    cluster.add_argument("--host", default="0.0.0.0", help="綁定位址（預設 0.0.0.0）")
+    cluster.add_argument("--worker-port", type=int, default=WORKER_PORT,
+                         help=f"第一個 worker 的連接埠（預設 {WORKER_PORT}，只綁定 127.0.0.1）")
+    cluster.add_argument("--offline", action="store_true", help="離線模式：不呼叫翻譯 / 匯率 API")
+    cluster.add_argument("streamlit_args", nargs="*", metavar="STREAMLIT_ARGS",
+                         help="傳給每個 streamlit run 的其他參數，例: -- --client.toolbarMode=viewer")
+    cluster.set_defaults(func=cmd_cluster)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    metrics.setup_logging()
+    return args.func(args)
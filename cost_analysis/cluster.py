@@ -0,0 +1,340 @@
+"""
+多程序部署：同時執行多個 Streamlit 程序，前面以 tornado 轉送請求，單一程序忙碌或當掉時不影響其他使用者
+
+    python -m cost_analysis cluster --workers 4 --port 8501
+
+- 每個 worker 是一個 `streamlit run app.py`，只綁定 127.0.0.1（連接埠由 COST_ANALYSIS_WORKER_PORT 起依序分配）
+- Streamlit 的工作階段（上傳的檔案、session_state、背景工作）只存在於建立它的程序中，
+  同一個瀏覽器必須一直連到同一個 worker：第一次請求時分配 worker 並以 cookie 記住，WebSocket 也依 cookie 轉送
+- 各 worker 共用：翻譯快取（cache/translations.sqlite3）、匯率表、解析結果快取（COST_ANALYSIS_RESULT_DB，
+  未設定時為 cache/results.sqlite3；快取鍵含格式版本，舊版程式的結果不會被讀到，之後依保存時間刪除）與 XSRF cookie 金鑰
+- 每 HEALTH_INTERVAL 秒檢查各 worker 的 /_stcore/health，已結束的 worker 自動重新啟動；
+  不健康的 worker 不再分配新的瀏覽器，原本連到它的瀏覽器改分配到其他 worker（需重新上傳檔案）
+- GET /health：任一 worker 健康時回應 200，否則 503（JSON 含各 worker 狀態）
+- 設定 COST_ANALYSIS_METRICS_PORT 時各 worker 的 /metrics 依序使用下一個連接埠（量測結果各自獨立）
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import time
+
+import tornado.web
+import tornado.websocket
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError, HTTPRequest
+from tornado.httputil import HTTPHeaders
+
+from .settings import APP_WORKERS, MAX_UPLOAD_BYTES, WORKER_PORT
+
+HEALTH_INTERVAL = float(os.environ.get("COST_ANALYSIS_HEALTH_INTERVAL", 5))
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULT_DB = os.path.join(APP_DIR, "cache", "results.sqlite3")
+
+# 記住瀏覽器所屬 worker 的 cookie
+WORKER_COOKIE = "cost_analysis_worker"
+
+# 不轉送的標頭（逐段連線用，由 tornado 自行處理）
+HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailer",
+    "transfer-encoding", "upgrade", "content-length",
+}
+# WebSocket 交握標頭由 websocket_connect 重新產生
+WEBSOCKET_HEADERS = {"sec-websocket-key", "sec-websocket-version", "sec-websocket-extensions", "sec-websocket-protocol"}
+
+# 轉送請求的逾時（秒）：上傳大檔時 Streamlit 需等整個檔案收完才回應
+REQUEST_TIMEOUT = 600
+
+logger = logging.getLogger("cost_analysis.cluster")
+
+class Worker:
+    """一個 Streamlit 程序"""
+
+    def __init__(self, index, port, env, streamlit_args=()):
+        self.index = index
+        self.port = port
+        self.env = env
+        self.streamlit_args = tuple(streamlit_args)
+        self.process = None
+        self.healthy = False
+        self.restarts = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        self.healthy = False
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", os.path.join(APP_DIR, "app.py"),
+             "--server.address", "127.0.0.1", "--server.port", str(self.port),
+             "--server.headless", "true", *self.streamlit_args],
+            cwd=APP_DIR,
+            env=self.env,
+        )
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self, timeout=10):
+        if not self.alive():
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def status(self):
+        return {
+            "worker": self.index,
+            "port": self.port,
+            "pid": self.process.pid if self.process else None,
+            "healthy": self.healthy,
+            "restarts": self.restarts,
+        }
+
+class Cluster:
+    """管理多個 worker：啟動、健康檢查、自動重新啟動與分配瀏覽器"""
+
+    def __init__(self, workers=APP_WORKERS, worker_port=WORKER_PORT, streamlit_args=()):
+        env = dict(os.environ)
+        # 各 worker 使用相同的 cookie 金鑰（XSRF token 在任一 worker 都有效），並共用解析結果快取
+        env.setdefault("STREAMLIT_SERVER_COOKIE_SECRET", secrets.token_hex(32))
+        env.setdefault("COST_ANALYSIS_RESULT_DB", RESULT_DB)
+        metrics_port = env.pop("COST_ANALYSIS_METRICS_PORT", "")
+        self.workers = []
+        for i in range(workers):
+            worker_env = dict(env)
+            if metrics_port:
+                worker_env["COST_ANALYSIS_METRICS_PORT"] = str(int(metrics_port) + i + 1)
+            self.workers.append(Worker(i, worker_port + i, worker_env, streamlit_args))
+        self._next = itertools.cycle(range(workers))
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+    def pick(self, cookie=None):
+        """cookie 指定的 worker 健康時沿用，否則依序分配下一個健康的 worker（沒有時回傳 None）"""
+        if cookie is not None and cookie.isdigit() and int(cookie) < len(self.workers):
+            worker = self.workers[int(cookie)]
+            if worker.healthy:
+                return worker
+        for _ in range(len(self.workers)):
+            worker = self.workers[next(self._next)]
+            if worker.healthy:
+                return worker
+        return None
+
+    async def check(self):
+        """檢查所有 worker，已結束的重新啟動"""
+        client = AsyncHTTPClient()
+        for worker in self.workers:
+            if not worker.alive():
+                if worker.process is not None:
+                    logger.warning("worker %d 已結束（exit %s），重新啟動", worker.index, worker.process.returncode)
+                    worker.restarts += 1
+                worker.start()
+                continue
+            try:
+                response = await client.fetch(f"{worker.url}/_stcore/health", request_timeout=HEALTH_INTERVAL,
+                                              raise_error=False)
+                status = response.code
+            except (OSError, HTTPClientError) as e:  # 尚未開始接受連線，或逾時未回應
+                status = e
+            if worker.healthy and status != 200:
+                logger.warning("worker %d 健康檢查失敗（%s）", worker.index, status)
+            worker.healthy = status == 200
+
+    async def monitor(self):
+        while True:
+            try:
+                await self.check()
+            except Exception:
+                logger.exception("健康檢查失敗")
+            await asyncio.sleep(HEALTH_INTERVAL)
+
+    def status(self):
+        return [worker.status() for worker in self.workers]
+
+def forward_headers(headers, skip=()):
+    """轉送給 worker 的請求標頭（保留 Host / Cookie / Origin，worker 依此檢查來源）"""
+    forwarded = HTTPHeaders()
+    for name, value in headers.get_all():
+        if name.lower() not in HOP_HEADERS and name.lower() not in skip:
+            forwarded.add(name, value)
+    return forwarded
+
+class ClusterHandler(tornado.web.RequestHandler):
+    def initialize(self, cluster):
+        self.cluster = cluster
+
+    def pick_worker(self):
+        worker = self.cluster.pick(self.get_cookie(WORKER_COOKIE))
+        if worker is not None and self.get_cookie(WORKER_COOKIE) != str(worker.index):
+            self.set_cookie(WORKER_COOKIE, str(worker.index), httponly=True)
+        return worker
+
+class HealthHandler(ClusterHandler):
+    def get(self):
+        status = self.cluster.status()
+        healthy = sum(worker["healthy"] for worker in status)
+        self.set_status(200 if healthy else 503)
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.finish(json.dumps({"status": "ok" if healthy else "unavailable", "workers": status}, ensure_ascii=False))
+
+class ProxyHandler(ClusterHandler):
+    """將 HTTP 請求原樣轉送給所屬的 worker"""
+
+    SUPPORTED_METHODS = ("GET", "HEAD", "POST", "PUT", "DELETE", "PATCH", "OPTIONS")
+
+    async def proxy(self, *args):
+        worker = self.pick_worker()
+        if worker is None:
+            self.send_error(503)
+            return
+        request = HTTPRequest(
+            worker.url + self.request.uri,
+            method=self.request.method,
+            headers=forward_headers(self.request.headers),
+            body=self.request.body if self.request.method in ("POST", "PUT", "PATCH") else None,
+            follow_redirects=False,
+            decompress_response=False,
+            allow_nonstandard_methods=True,
+            request_timeout=REQUEST_TIMEOUT,
+        )
+        try:
+            response = await AsyncHTTPClient().fetch(request, raise_error=False)
+        except (OSError, HTTPClientError) as e:  # 連不上或逾時（raise_error=False 時逾時仍會拋出）
+            response = None
+            error = e
+        else:
+            error = response.error if response.code == 599 else None
+        if error is not None:
+            logger.warning("worker %d 無回應：%s", worker.index, error)
+            self.send_error(502)
+            return
+        self.set_status(response.code, response.reason)
+        for name in ("Content-Type", "Server", "Date"):
+            self.clear_header(name)
+        for name, value in response.headers.get_all():
+            if name.lower() not in HOP_HEADERS or (name.lower() == "content-length" and self.request.method == "HEAD"):
+                self.add_header(name, value)
+        if response.body and response.code not in (204, 304) and self.request.method != "HEAD":
+            self.write(response.body)
+        self.finish()
+
+    get = head = post = put = delete = patch = options = proxy
+
+class StreamHandler(tornado.websocket.WebSocketHandler):
+    """轉送 Streamlit 的 WebSocket（/_stcore/stream）到所屬的 worker"""
+
+    def initialize(self, cluster):
+        self.cluster = cluster
+        self.subprotocols = []
+        self.upstream = None
+
+    def check_origin(self, origin):
+        # Origin 原樣轉送，由 worker 檢查
+        return True
+
+    def select_subprotocol(self, subprotocols):
+        # Streamlit 以子協定傳遞 XSRF token 與工作階段代碼，全部轉送給 worker
+        self.subprotocols = list(subprotocols)
+        return subprotocols[0] if subprotocols else None
+
+    async def open(self, *args):
+        cookie = self.get_cookie(WORKER_COOKIE)
+        worker = self.cluster.pick(cookie)
+        if worker is None:
+            self.close(1013, "no healthy worker")
+            return
+        if cookie != str(worker.index):
+            logger.info("WebSocket 改連到 worker %d", worker.index)
+        request = HTTPRequest(
+            f"ws://127.0.0.1:{worker.port}{self.request.uri}",
+            headers=forward_headers(self.request.headers, WEBSOCKET_HEADERS),
+            request_timeout=REQUEST_TIMEOUT,
+        )
+        try:
+            self.upstream = await tornado.websocket.websocket_connect(
+                request,
+                on_message_callback=self.relay,
+                subprotocols=self.subprotocols or None,
+                max_message_size=MAX_UPLOAD_BYTES,
+            )
+        except Exception as e:
+            logger.warning("無法連到 worker %d：%s", worker.index, e)
+            self.close(1011, "worker unavailable")
+
+    def relay(self, message):
+        """worker → 瀏覽器（None 表示 worker 已關閉連線）"""
+        if message is None:
+            self.close()
+            return
+        try:
+            self.write_message(message, binary=isinstance(message, bytes))
+        except tornado.websocket.WebSocketClosedError:
+            pass
+
+    async def on_message(self, message):
+        if self.upstream is not None:
+            try:
+                await self.upstream.write_message(message, binary=isinstance(message, bytes))
+            except tornado.websocket.WebSocketClosedError:
+                self.close()
+
+    def on_close(self):
+        if self.upstream is not None:
+            self.upstream.close()
+            self.upstream = None
+
+def make_app(cluster, **settings):
+    return tornado.web.Application(
+        [
+            (r"/health", HealthHandler, {"cluster": cluster}),
+            (r"/_stcore/stream", StreamHandler, {"cluster": cluster}),
+            (r".*", ProxyHandler, {"cluster": cluster}),
+        ],
+        websocket_max_message_size=MAX_UPLOAD_BYTES,
+        **settings,
+    )
+
+async def run_cluster(workers=APP_WORKERS, port=8501, host="0.0.0.0", worker_port=WORKER_PORT, streamlit_args=()):
+    """啟動 worker 與前端並持續執行（結束時停止所有 worker）"""
+    if workers < 1:
+        raise ValueError("worker 數至少為 1")
+    AsyncHTTPClient.configure(None, max_clients=100, max_body_size=MAX_UPLOAD_BYTES)
+    cluster = Cluster(workers, worker_port, streamlit_args)
+    cluster.start()
+    try:
+        # 等第一個 worker 可以回應再開始接受連線
+        started = time.monotonic()
+        while not any(worker.healthy for worker in cluster.workers):
+            await asyncio.sleep(0.5)
+            await cluster.check()
+        logger.info("worker 已就緒（%.1f 秒）", time.monotonic() - started)
+        monitor = asyncio.ensure_future(cluster.monitor())
+        # 同 server.serve：緩衝區上限需與請求內容上限一致
+        make_app(cluster).listen(port, host, max_body_size=MAX_UPLOAD_BYTES, max_buffer_size=MAX_UPLOAD_BYTES)
+        print(f"🚀 成本分析系統已啟動（{workers} 個程序）：http://{host}:{port}")
+        # kill / tmux kill-session 送出 SIGTERM 時也要停止 worker
+        stopped = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+        try:
+            await stopped.wait()
+        finally:
+            monitor.cancel()
+    finally:
+        cluster.stop()
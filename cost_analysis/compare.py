@@ -0,0 +1,217 @@
+"""
+版本比較：同一料號的多個版本（例: 3-041011-001AS-1 與 3-041011-001AS-1-調整）並列比較，列出與基準版本的差異
+
+- 每個檔案為一個版本（活頁簿中有多個成本分析表時每個工作表各為一個版本），第一個版本為基準
+- 解析沿用結果快取（依檔案內容雜湊）：已看過的版本不必重新解析，新增 / 更換版本或調整匯率時只需解析新的檔案，
+  比對本身只是數值相減
+- 工序依名稱對齊：取「中文 | English」的中文部分以 match_key 移除標點 / 空白，同名工序依出現順序配對；
+  只出現在部分版本的工序也會列出（排在該版本前一個工序之後），其他版本顯示為沒有此工序
+- 差異 = 版本數值 - 基準版本數值，任一方沒有資料時為 NaN
+"""
+from collections import Counter
+from math import isnan, nan
+from typing import NamedTuple, Tuple
+
+from .batch import part_no_from_filename
+from .cache import result_cache
+from .core import build_sheet_reports, format_percent, format_price, get_template
+from .matcher import match_key
+from .metrics import timed
+from .model import CostReport
+
+# 摘要比較的項目：(CostSide 欄位, 標籤, 數值越大越好, 格式)
+SUMMARY_FIELDS = (
+    ("unit_cost", "單顆成本 | Unit Cost", False, "price"),
+    ("good_rate", "良率 (%) | Yield (%)", True, "percent"),
+    ("total_cost", "總成本 | Total Cost", False, "price"),
+    ("proc_cost", "加工成本 | Processing Cost", False, "price"),
+    ("total_input_cost", "投入成本 | Input Cost", False, "price"),
+)
+SIDES = (("current", "現況 | Current Situation"), ("evaluation", "評估 | Evaluation"))
+
+class DeltaRow(NamedTuple):
+    """一個比較項目在各版本的數值（第一個為基準版本，沒有資料為 NaN）"""
+    label: str
+    values: Tuple[float, ...]
+    higher_is_better: bool = False
+    kind: str = "price"  # price：金額（2 位小數，另列變動百分比）；percent：百分比
+
+    @property
+    def deltas(self):
+        """各版本與基準版本的差（基準版本為 0，任一方沒有資料時為 NaN）"""
+        return tuple(value - self.values[0] for value in self.values)
+
+    @property
+    def changes(self):
+        """各版本相對基準版本的變動百分比（基準為 0 或沒有資料時為 NaN）"""
+        base = self.values[0]
+        return tuple(nan if not base or isnan(base) else delta / base * 100 for delta in self.deltas)
+
+class ProcessDelta(NamedTuple):
+    """對齊後的一個工序：各版本的現況 / 評估金額（版本沒有此工序時 present 為 False，金額為 NaN）"""
+    name: str
+    current: DeltaRow
+    evaluation: DeltaRow
+    present: Tuple[bool, ...]
+
+class Comparison(NamedTuple):
+    versions: Tuple[str, ...]
+    reports: Tuple[CostReport, ...]
+    summary: Tuple[Tuple[str, Tuple[DeltaRow, ...]], ...]  # ((一側的標籤, 比較項目), ...)，依 SIDES 順序
+    processes: Tuple[ProcessDelta, ...] = ()
+
+    @property
+    def currency(self):
+        return self.reports[0].currency
+
+    @property
+    def rate(self):
+        return self.reports[0].rate
+
+    def summary_row(self, side, field):
+        """摘要的一個比較項目，例: summary_row("evaluation", "unit_cost")"""
+        side_index = [name for name, _ in SIDES].index(side)
+        field_index = [name for name, *_ in SUMMARY_FIELDS].index(field)
+        return self.summary[side_index][1][field_index]
+
+    def to_dict(self):
+        """轉為可直接 json.dumps 的 dict（NaN 轉為 None）"""
+        return {
+            "versions": list(self.versions),
+            "currency": self.currency,
+            "rate": self.rate,
+            "summary": {
+                side: {row.label: _row_dict(row) for row in rows}
+                for (side, _), (_, rows) in zip(SIDES, self.summary)
+            },
+            "processes": [
+                {"name": process.name, "present": list(process.present),
+                 "current": _row_dict(process.current), "evaluation": _row_dict(process.evaluation)}
+                for process in self.processes
+            ],
+        }
+
+def _json_list(values):
+    return [None if isnan(value) else value for value in values]
+
+def _row_dict(row):
+    return {"values": _json_list(row.values), "deltas": _json_list(row.deltas)}
+
+def process_key(name):
+    """對齊用名稱：「中文 | English」取中文部分，移除標點 / 空白"""
+    chinese = name.split(" | ")[0]
+    return match_key(chinese) or chinese
+
+def align_processes(reports):
+    """依名稱對齊各版本的工序，回傳 [[各版本的 ProcessStep 或 None], ...]（依工序順序）"""
+    order = []
+    steps = {}
+    for i, report in enumerate(reports):
+        seen = Counter()
+        previous = None
+        for step in report.processes:
+            name = process_key(step.name)
+            seen[name] += 1
+            key = (name, seen[name])
+            if key not in steps:
+                steps[key] = [None] * len(reports)
+                order.insert(order.index(previous) + 1 if previous is not None else 0, key)
+            steps[key][i] = step
+            previous = key
+    return [steps[key] for key in order]
+
+@timed("compare")
+def compare_reports(reports, versions=None):
+    """
+    比較多個版本的 CostReport（第一個為基準），回傳 Comparison
+    versions: 各版本的名稱（預設為料號）；報表的幣別應相同
+    """
+    if len(reports) < 2:
+        raise ValueError("版本比較至少需要兩份報表")
+    if len({report.currency for report in reports}) > 1:
+        raise ValueError("版本比較的報表幣別必須相同")
+    versions = tuple(versions or (report.part_no for report in reports))
+    summary = tuple(
+        (side_label, tuple(
+            DeltaRow(label, tuple(getattr(getattr(report, side), field) for report in reports), better, kind)
+            for field, label, better, kind in SUMMARY_FIELDS
+        ))
+        for side, side_label in SIDES
+    )
+    processes = []
+    for steps in align_processes(reports):
+        name = next(step.name for step in steps if step is not None)
+        processes.append(ProcessDelta(
+            name,
+            DeltaRow(name, tuple(nan if step is None else step.current for step in steps)),
+            DeltaRow(name, tuple(nan if step is None else step.evaluation for step in steps)),
+            tuple(step is not None for step in steps),
+        ))
+    return Comparison(versions, tuple(reports), summary, tuple(processes))
+
+def compare_files(entries, currency_code, rate, cache=result_cache, on_done=None):
+    """
+    讀檔 → 擷取（沿用結果快取）→ 換算 → 比較，回傳 Comparison
+    entries: [(檔名, bytes), ...]，依順序為各版本（第一個為基準），版本名稱為檔名（不含副檔名）
+    on_done(已完成, 總數)：每個檔案解析完成後呼叫
+    """
+    versions, reports = [], []
+    for done, (filename, data) in enumerate(entries, 1):
+        label = part_no_from_filename(filename)
+        try:
+            sheets = build_sheet_reports(data, filename, label, {currency_code: rate}, cache)
+        except Exception as e:
+            raise ValueError(f"{filename}：{e}") from e
+        for sheet, _, (report,) in sheets:
+            versions.append(f"{label} / {sheet}" if len(sheets) > 1 else label)
+            reports.append(report)
+        if on_done is not None:
+            on_done(done, len(entries))
+    return compare_reports(reports, versions)
+
+def format_delta(row, i):
+    """差異的顯示字串與樣式（better / worse / same），基準版本或沒有資料時為空字串"""
+    delta = row.deltas[i]
+    if i == 0 or isnan(delta):
+        return "", ""
+    if round(delta, 2) == 0:
+        return "±0", "same"
+    text = f"{delta:+.2f}"
+    change = row.changes[i]
+    if row.kind == "price" and not isnan(change):
+        text += f" ({change:+.1f}%)"
+    return text, "better" if (delta > 0) == row.higher_is_better else "worse"
+
+def display_cells(row, present=None):
+    """一個比較項目各版本的顯示格：[(數值, 差異, 樣式), ...]，版本沒有此工序時數值為「—」"""
+    cells = []
+    for i, value in enumerate(row.values):
+        if present is not None and not present[i]:
+            cells.append(("—", "", "missing"))
+            continue
+        delta, css = format_delta(row, i)
+        cells.append((format_percent(value) if row.kind == "percent" else format_price(value), delta, css))
+    return cells
+
+def build_compare_display(comparison):
+    """將 Comparison 格式化為比較報表顯示用的資料"""
+    return {
+        "part_no": f"{comparison.versions[0]}_compare",
+        "currency": comparison.currency,
+        "rate": comparison.rate,
+        "versions": comparison.versions,
+        "summary": [
+            (side_label, [(row.label, display_cells(row)) for row in rows])
+            for side_label, rows in comparison.summary
+        ],
+        "process_rows": [
+            (process.name, display_cells(process.current, process.present),
+             display_cells(process.evaluation, process.present))
+            for process in comparison.processes
+        ],
+    }
+
+@timed("render")
+def generate_compare_html(comparison):
+    """產生版本比較報表 HTML（所有欄位皆自動跳脫）"""
+    return get_template("compare.html").render(data=build_compare_display(comparison))
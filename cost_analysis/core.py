@@ -0,0 +1,948 @@
+"""
+成本分析核心：檔案解析、數值擷取與 HTML 報表生成
+不依賴 Streamlit，可供介面、批次轉換與其他程式直接呼叫
+"""
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from math import isnan, nan
+
+import pandas as pd
+import numpy as np
+
+from .cache import content_key, result_cache
+from .metrics import count, log_event, observe, timed
+from .model import CostReport, CostSide, ProcessStep
+from .readers import (
+    ROW_READERS,
+    SHEET_READERS,
+    collect_rows,
+    default_engine,
+    iter_rows_csv,
+    read_csv,
+    read_excel,
+    read_excel_sheets,
+    rows_to_frame,
+)
+from .translate import (
+    PROCESS_TRANSLATIONS,
+    clean_process_name,
+    auto_translate,
+    normalize_process_name,
+    needs_translation,
+    translate_many,
+)
+
+# --- 1. 配置與中英對照表 ---
+# 幣別代碼與預設匯率（1 外幣 = ? 台幣），匯率表與匯率 API 都沒有資料時使用（見 rates.py）
+DEFAULT_RATES = {
+    "NTD": 1.0,
+    "USD": 32.5,
+    "EUR": 35.5,
+    "AUD": 21.5,
+    "GBP": 41.0,
+}
+
+# 成本項目的中英翻譯
+COST_ITEM_TRANSLATIONS = {
+    "總投入數量": "Total Input Quantity",
+    "良品數量": "Good Product Quantity",
+    "廢品數量": "Defective Quantity",
+    "投入成本": "Input Cost",
+    "加工成本": "Processing Cost",
+    "外包成本": "Outsourcing Cost",
+    "總成本": "Total Cost",
+    "單顆成本": "Unit Cost",
+    "目前售價": "Current Selling Price",
+    "建議售價 (毛利潤20%)": "Suggested Selling Price (20% Profit Margin)",
+    "建議售價(毛利潤20%)": "Suggested Selling Price (20% Profit Margin)"
+}
+
+def get_cost_item_label(item_name):
+    """取得成本項目的中英標籤"""
+    if not isinstance(item_name, str):
+        return "-"
+    eng_name = COST_ITEM_TRANSLATIONS.get(item_name, item_name)
+    return f"{item_name} | {eng_name}"
+
+# --- 2. 數值擷取邏輯 ---
+# 標籤搜尋範圍：前 26 欄（現況 0-12 欄、評估 13-25 欄），數值最多往右找 4 欄
+LABEL_COLUMNS = 26
+VALUE_OFFSET = 4
+
+# 報表會查詢的標籤，載入時預先建立索引
+INDEX_LABELS = ["總投入數量", "良品數量", "投入成本", "加工成本", "總成本", "單顆成本", "目前售價", "建議售價"]
+
+# 報表數值欄位對應的標籤與位置（現況 / 評估）
+VALUE_LABELS = {
+    "c_total_qty": ("總投入數量", "current"),
+    "c_good_qty": ("良品數量", "current"),
+    "c_total_input_cost": ("投入成本", "current"),
+    "c_proc_cost": ("加工成本", "current"),
+    "c_total_cost": ("總成本", "current"),
+    "c_unit_cost": ("單顆成本", "current"),
+    "c_price": ("目前售價", "current"),
+    "e_total_qty": ("總投入數量", "eval"),
+    "e_good_qty": ("良品數量", "eval"),
+    "e_total_input_cost": ("投入成本", "eval"),
+    "e_proc_cost": ("加工成本", "eval"),
+    "e_total_cost": ("總成本", "eval"),
+    "e_unit_cost": ("單顆成本", "eval"),
+    "e_suggest_price": ("建議售價", "eval"),
+}
+
+# 多工作表活頁簿：任一側找到總成本或單顆成本的工作表才視為成本分析表
+COST_SHEET_KEYS = ("c_total_cost", "c_unit_cost", "e_total_cost", "e_unit_cost")
+SHEET_WORKERS = int(os.environ.get("COST_ANALYSIS_SHEET_WORKERS", 4))
+
+# 自動偵測不到料號時 detect_part_no 的結果
+MISSING_PART_NOS = ("", "nan", "Unknown")
+
+# 工序區塊：標題關鍵字、名稱欄位與停止規則（找不到名稱時至少往下看 20 列）
+PROCESS_HEADER_WORDS = ['製程', '工序']
+PROCESS_HEADER_COLUMNS = 5
+PROCESS_NAME_COLUMNS = [1, 2, 14, 15]
+PROCESS_SCAN_ROWS = 20
+PROCESS_START_FALLBACK = 16
+# 工序金額：現況 / 評估依序嘗試的欄位
+PROCESS_COST_COLUMNS = {"current": [7, 8, 9], "eval": [20, 21, 22]}
+# 工序金額判斷：str(值) 去掉這些字元後全為數字即視為數字；浮點數 >= 1e16 時 str() 為科學記號（如 1e+16），不視為數字
+NUMBER_PUNCTUATION = str.maketrans("", "", ".-eE")
+MAX_PLAIN_FLOAT = 1e16
+
+def parse_number(val):
+    """將儲存格轉為數值（規則同 is_number），非數值回傳 None"""
+    val_str = str(val) if pd.notna(val) else ""
+    if is_number(val_str):
+        return float(val_str.replace(',', '').replace('，', ''))
+    return None
+
+class LabelIndex:
+    """
+    標籤索引：DataFrame 載入時只掃描一次
+    - 前 26 欄一次轉成字串，用向量化比對找出各標籤位置
+    - 每個儲存格預先算好「往右 4 欄內最近的數值」
+    之後每次查詢都是 O(1)，結果與逐格掃描相同
+    """
+
+    def __init__(self, df, labels=INDEX_LABELS):
+        n_rows = len(df)
+        label_block = df.iloc[:, :LABEL_COLUMNS]
+        self._strings = (
+            label_block.astype(str).where(label_block.notna(), "").to_numpy(dtype=object).ravel()
+        )
+        self._shape = (n_rows, label_block.shape[1])
+
+        # 數值只需要看到第 26 + 4 欄
+        value_block = df.iloc[:, :LABEL_COLUMNS + VALUE_OFFSET]
+        n_value_cols = value_block.shape[1]
+        values = np.full((n_rows, n_value_cols), np.nan)
+        is_num = np.zeros((n_rows, n_value_cols), dtype=bool)
+        for col_num in range(n_value_cols):
+            col = value_block.iloc[:, col_num]
+            if pd.api.types.is_float_dtype(col) or pd.api.types.is_integer_dtype(col):
+                is_num[:, col_num] = col.notna().to_numpy()
+                values[:, col_num] = col.to_numpy(dtype=float, na_value=np.nan)
+            else:
+                parsed = [parse_number(val) for val in col.to_numpy(dtype=object)]
+                mask = np.array([num is not None for num in parsed], dtype=bool)
+                is_num[:, col_num] = mask
+                values[mask, col_num] = [num for num in parsed if num is not None]
+
+        # 每格往右 1~4 欄最近的數值（由遠到近覆蓋）
+        self._next_value = np.full(self._shape, np.nan)
+        self._has_next = np.zeros(self._shape, dtype=bool)
+        for offset in range(VALUE_OFFSET, 0, -1):
+            width = min(self._shape[1], n_value_cols - offset)
+            if width <= 0:
+                continue
+            hit = is_num[:, offset:offset + width]
+            self._next_value[:, :width] = np.where(hit, values[:, offset:offset + width], self._next_value[:, :width])
+            self._has_next[:, :width] |= hit
+
+        self._values = {}
+        for label in labels:
+            self._index_label(label)
+
+    def _index_label(self, row_label):
+        """找出標籤在現況 / 評估兩側對應的數值"""
+        if self._strings.size:
+            found = pd.Series(self._strings).str.contains(row_label, regex=False).to_numpy().reshape(self._shape)
+        else:
+            found = np.zeros(self._shape, dtype=bool)
+
+        result = {"current": None, "eval": None}
+        for row_num in np.flatnonzero(found.any(axis=1)):
+            found_positions = np.flatnonzero(found[row_num])
+            for side in result:
+                if result[side] is not None:
+                    continue
+                if side == "current":
+                    # 現況在左側 (0-12 欄) - 優先選擇左邊的標籤
+                    search_positions = found_positions[found_positions <= 12]
+                    if not search_positions.size:
+                        search_positions = found_positions[:1]
+                else:
+                    # 評估在右側 (13-25 欄) - 優先選擇右邊的標籤
+                    search_positions = found_positions[found_positions >= 13]
+                    if not search_positions.size:
+                        search_positions = found_positions[-1:]
+                for col_num in search_positions:
+                    if self._has_next[row_num, col_num]:
+                        result[side] = float(self._next_value[row_num, col_num])
+                        break
+            if result["current"] is not None and result["eval"] is not None:
+                break
+
+        self._values[row_label] = result
+        return result
+
+    def lookup(self, row_label, col_idx):
+        """取得標籤對應的原始數值，找不到回傳 None"""
+        result = self._values.get(row_label)
+        if result is None:
+            result = self._index_label(row_label)
+        return result["current" if col_idx == "current" else "eval"]
+
+def get_val(df, row_label, col_idx, rate=1.0):
+    """
+    從 DataFrame（或已建立的 LabelIndex）中提取特定值
+    基於 CSV 結構：
+    - 現況（左側）: 第 0-12 欄
+    - 評估（右側）: 第 13-25 欄
+    """
+    try:
+        index = df if isinstance(df, LabelIndex) else LabelIndex(df, labels=[])
+        num = index.lookup(row_label, col_idx)
+        if num is None:
+            return "-"
+        return num / rate  # 返回未格式化的數值
+    except Exception as e:
+        return "-"
+
+def is_number(val):
+    """判斷字串是否為數字"""
+    try:
+        if isinstance(val, str):
+            val = val.strip().replace(',', '').replace('，', '')
+            if not val or val == '-' or val == '—':
+                return False
+            float(val)
+            return True
+        elif isinstance(val, (int, float)):
+            return not pd.isna(val)
+        return False
+    except:
+        return False
+
+def format_quantity(value):
+    """格式化數量為整數（無小數點），NaN 顯示為 "-"（沒有資料）"""
+    if value == "-" or isinstance(value, str):
+        return value
+    try:
+        return str(int(round(float(value))))
+    except:
+        return "-"
+
+def format_price(value):
+    """格式化金額為2位小數，NaN 顯示為 "-"（沒有資料）"""
+    if value == "-" or isinstance(value, str):
+        return value
+    try:
+        value = float(value)
+    except:
+        return "-"
+    return "-" if isnan(value) else f"{value:.2f}"
+
+
+# --- 3. HTML 模板生成 ---
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+@lru_cache(maxsize=None)
+def get_template(name="report.html"):
+    """載入並編譯 Jinja2 模板（每個程序只編譯一次，之後重複使用）"""
+    from jinja2 import Environment, FileSystemLoader
+
+    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=True, keep_trailing_newline=True)
+    return env.get_template(name)
+
+@timed("render")
+def generate_html(report):
+    """
+    以預先編譯的模板產生報表 HTML（CostReport 在此才格式化為顯示字串）
+    所有欄位皆自動跳脫
+    """
+    return get_template().render(data=build_display_data(report))
+
+@timed("render")
+def generate_multi_html(reports):
+    """同一份報表的多種幣別合併為單一 HTML（頁面上可切換幣別，預設顯示第一個）"""
+    views = [build_display_data(report) for report in reports]
+    return get_template("report_multi.html").render(data=views[0], views=views)
+
+# --- 4. 轉換流程 ---
+def read_bytes(source):
+    """將檔案物件、路徑或 bytes 統一讀為 bytes"""
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read()
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    return source.read()
+
+def source_size(source):
+    """檔案物件、路徑或 bytes 的大小（不讀入內容）"""
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    position = source.tell()
+    size = source.seek(0, os.SEEK_END)
+    source.seek(position)
+    return size
+
+@timed("read")
+def read_table(source, filename, engine=None):
+    """
+    讀取上傳檔案（xlsx / csv），source 可為檔案物件、路徑或 bytes
+    讀到工序區塊結束即停止；若此時仍有報表標籤未找到，再讀完剩餘的列（pandas 引擎完整讀取）
+    """
+    engine = engine or default_engine()
+    if filename.lower().endswith('.csv'):
+        return read_csv(source) if engine == "pandas" else frame_from_rows(iter_rows_csv(source))
+
+    data = read_bytes(source)
+    if engine == "pandas":
+        return read_excel(data, engine)
+    return frame_from_rows(ROW_READERS[engine](data))
+
+@timed("read")
+def read_sheets(source, filename, engine=None):
+    """
+    讀取所有工作表（活頁簿只開啟一次），回傳 [(工作表名稱, DataFrame), ...]
+    每個工作表同 read_table 讀到工序區塊結束即停止；csv 視為單一工作表（名稱為空字串）
+    """
+    engine = engine or default_engine()
+    if filename.lower().endswith('.csv'):
+        return [("", read_csv(source) if engine == "pandas" else frame_from_rows(iter_rows_csv(source)))]
+
+    data = read_bytes(source)
+    if engine == "pandas":
+        return read_excel_sheets(data)
+    return [(name, frame_from_rows(rows)) for name, rows in SHEET_READERS[engine](data)]
+
+def frame_from_rows(rows):
+    """將工作表的列資料轉為 DataFrame：讀到工序區塊結束即停止，若此時仍有報表標籤未找到，再讀完剩餘的列"""
+    try:
+        block_end = ProcessBlockEnd()
+        collected, stop_row = collect_rows(rows, stop=block_end)
+        if stop_row is not None and not block_end.labels_complete:
+            collected.append(stop_row)
+            collected.extend(rows)
+    finally:
+        rows.close()
+    return rows_to_frame(collected)
+
+def detect_part_no(df):
+    """從表格自動取得零件編號"""
+    return str(df.iloc[1, 2]) if df.shape[0] > 1 and df.shape[1] > 2 else "Unknown"
+
+def is_process_name(val):
+    """儲存格是否為工序名稱"""
+    return pd.notna(val) and isinstance(val, str) and bool(val.strip()) and val not in ['製程', '工序', '']
+
+class ProcessBlockEnd:
+    """
+    讀檔時逐列判斷工序區塊是否已結束（規則同 extract_raw 的工序迴圈）
+    回傳 True 的那一列起，之後的列都不會出現在工序列表中
+    同時逐列記下報表需要的標籤是否已找到數值（規則同 LabelIndex），讀到停止列時不需另外建立標籤索引
+    """
+
+    def __init__(self):
+        self.start = None
+        self._missing = set(VALUE_LABELS.values())
+
+    @property
+    def labels_complete(self):
+        """已讀過的列（不含停止列）中，報表需要的標籤是否都已找到數值"""
+        return not self._missing
+
+    def __call__(self, i, row):
+        if self._is_end(i, row):
+            return True
+        if self._missing:
+            self._find_labels(row)
+        return False
+
+    def _is_end(self, i, row):
+        if self.start is None:
+            row_str = ' '.join([str(cell) for cell in row[:PROCESS_HEADER_COLUMNS]])
+            if any(word in row_str for word in PROCESS_HEADER_WORDS):
+                self.start = i + 1
+            return False
+        if i <= self.start + PROCESS_SCAN_ROWS:
+            return False
+        return not any(is_process_name(row[col_idx]) for col_idx in PROCESS_NAME_COLUMNS if col_idx < len(row))
+
+    def _find_labels(self, row):
+        """記下這一列找到數值的標籤與位置（規則同 LabelIndex._index_label）"""
+        cells = [(col_num, val) for col_num, val in enumerate(row[:LABEL_COLUMNS]) if isinstance(val, str)]
+        for label, side in list(self._missing):
+            found_positions = [col_num for col_num, val in cells if label in val]
+            if not found_positions:
+                continue
+            if side == "current":
+                search_positions = [col_num for col_num in found_positions if col_num <= 12] or found_positions[:1]
+            else:
+                search_positions = [col_num for col_num in found_positions if col_num >= 13] or found_positions[-1:]
+            if any(row_number(val) is not None for col_num in search_positions for val in row[col_num + 1:col_num + 1 + VALUE_OFFSET]):
+                self._missing.discard((label, side))
+
+def row_number(val):
+    """列資料中單一儲存格的數值（規則同 rows_to_frame 後的 LabelIndex：NaN 不是數值），非數值回傳 None"""
+    num = parse_number(val)
+    return None if num is None or num != num else num
+
+def extract_values(labels):
+    """以標籤索引取得報表需要的數值（台幣金額與數量），找不到為 None"""
+    return {key: labels.lookup(label, side) for key, (label, side) in VALUE_LABELS.items()}
+
+def find_process_start(df):
+    """工序區塊起始列：前 5 欄出現「製程」或「工序」的下一列，找不到時為第 16 列"""
+    head = df.iloc[:, :PROCESS_HEADER_COLUMNS].astype(str).to_numpy(dtype=object)
+    found = pd.Series(head.ravel(), dtype=object).str.contains("|".join(PROCESS_HEADER_WORDS))
+    rows = found.to_numpy(dtype=bool).reshape(head.shape).any(axis=1)
+    return int(np.argmax(rows)) + 1 if rows.any() else PROCESS_START_FALLBACK
+
+# --- 版面快取 ---
+# 同一範本的檔案標籤位置相同：第一次以完整搜尋（LabelIndex / find_process_start）學到的擷取計畫，
+# 之後版面指紋相同的工作表直接讀取計畫中的儲存格，只看表頭區，與檔案列數無關
+# 保留的計畫數（不同範本數）上限，0 為停用
+LAYOUT_PLANS = int(os.environ.get("COST_ANALYSIS_LAYOUT_PLANS", 32))
+
+def cell_number(df, row, col):
+    """單一儲存格的數值（規則同 LabelIndex：數值欄位不為空即為數字，其餘以 parse_number 判斷），非數值回傳 None"""
+    val = df.iat[row, col]
+    dtype = df.dtypes.iat[col]
+    if pd.api.types.is_float_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return None if pd.isna(val) else float(val)
+    return parse_number(val)
+
+def next_number(df, row, col):
+    """標籤右側 1~4 欄內最近的數值（範圍同 LabelIndex），回傳 (數值, 欄位) 或 None"""
+    last_col = min(df.shape[1], LABEL_COLUMNS + VALUE_OFFSET) - 1
+    for value_col in range(col + 1, min(col + VALUE_OFFSET, last_col) + 1):
+        num = cell_number(df, row, value_col)
+        if num is not None:
+            return num, value_col
+    return None
+
+def layout_anchors(df, rows):
+    """
+    版面指紋：前 rows 列（表頭區）中每個標籤與工序標題文字出現的位置，回傳 ((列, 欄, 文字), ...)
+    標籤只看前 26 欄、工序標題只看前 5 欄（同 LabelIndex / find_process_start）
+    """
+    anchors = []
+    block = df.iloc[:rows, :LABEL_COLUMNS].to_numpy(dtype=object)
+    for row_num, row in enumerate(block):
+        for col_num, val in enumerate(row):
+            if not isinstance(val, str):
+                continue
+            anchors.extend((row_num, col_num, label) for label in INDEX_LABELS if label in val)
+            if col_num < PROCESS_HEADER_COLUMNS:
+                anchors.extend((row_num, col_num, word) for word in PROCESS_HEADER_WORDS if word in val)
+    return tuple(anchors)
+
+class LayoutPlan:
+    """
+    擷取計畫：工序區塊起始列、表頭區的版面指紋與每個數值欄位的儲存格 {欄位: (列, 欄)}
+    表頭區的標籤位置相同時，依 LabelIndex 的規則只需檢查標籤右側的幾個儲存格
+    """
+
+    def __init__(self, start, anchors):
+        self.start = start
+        self.anchors = anchors
+        self.cells = {}
+        # 標籤 -> {列: [欄, ...]}（依列、欄排序）
+        self._positions = {}
+        for row, col, word in anchors:
+            self._positions.setdefault(word, {}).setdefault(row, []).append(col)
+
+    @property
+    def key(self):
+        return self.start, self.anchors
+
+    def lookup(self, df, label, side):
+        """標籤在現況 / 評估側對應的數值（規則同 LabelIndex._index_label），回傳 (數值, (列, 欄)) 或 None"""
+        for row, cols in self._positions.get(label, {}).items():
+            if side == "current":
+                search_cols = [col for col in cols if col <= 12] or cols[:1]
+            else:
+                search_cols = [col for col in cols if col >= 13] or cols[-1:]
+            for col in search_cols:
+                found = next_number(df, row, col)
+                if found is not None:
+                    return found[0], (row, found[1])
+        return None
+
+    def learn(self, df, values):
+        """記下完整搜尋結果的儲存格，所有數值都在表頭區找到且相同時回傳 True"""
+        for key, (label, side) in VALUE_LABELS.items():
+            found = self.lookup(df, label, side)
+            if found is None or found[0] != values[key]:
+                return False
+            self.cells[key] = found[1]
+        return True
+
+    def extract(self, df):
+        """依計畫取得數值，任一數值不在計畫的儲存格時回傳 None（需完整搜尋）"""
+        values = {}
+        for key, (label, side) in VALUE_LABELS.items():
+            found = self.lookup(df, label, side)
+            if found is None or found[1] != self.cells[key]:
+                return None
+            values[key] = found[0]
+        return values
+
+class LayoutCache:
+    """版面指紋 -> 擷取計畫（最近使用的優先比對，超過上限時淘汰最久未使用的計畫；執行緒安全）"""
+
+    def __init__(self, max_plans=LAYOUT_PLANS):
+        self.max_plans = max_plans
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+
+    def match(self, df):
+        """找出版面指紋與工作表相同的計畫，沒有時回傳 None"""
+        with self._lock:
+            plans = list(reversed(self._plans.values()))
+        anchors = {}  # 同一起始列的計畫只需計算一次指紋
+        for plan in plans:
+            if plan.start not in anchors:
+                anchors[plan.start] = layout_anchors(df, plan.start)
+            if anchors[plan.start] == plan.anchors:
+                with self._lock:
+                    if plan.key in self._plans:
+                        self._plans.move_to_end(plan.key)
+                return plan
+        return None
+
+    def learn(self, df, values):
+        """
+        以完整搜尋的結果建立工作表的擷取計畫並保存，回傳計畫
+        沒有工序標題或有數值不在表頭區（可能在工序區塊之後）的版面不建立計畫，回傳 None
+        """
+        if not self.max_plans:
+            return None
+        start = find_process_start(df)
+        anchors = layout_anchors(df, start)
+        if not any(row == start - 1 and word in PROCESS_HEADER_WORDS for row, _, word in anchors):
+            return None
+        plan = LayoutPlan(start, anchors)
+        if not plan.learn(df, values):
+            return None
+        with self._lock:
+            self._plans[plan.key] = plan
+            self._plans.move_to_end(plan.key)
+            while len(self._plans) > self.max_plans:
+                self._plans.popitem(last=False)
+        return plan
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+# 本程序共用的版面快取
+layout_cache = LayoutCache()
+
+def sheet_values(df):
+    """
+    報表需要的數值與工序區塊起始列，回傳 (數值, 起始列)
+    版面指紋符合已知的計畫時直接讀取儲存格，否則完整搜尋並學習新的計畫（起始列為 None，由 find_process_start 決定）
+    """
+    plan = layout_cache.match(df)
+    values = plan.extract(df) if plan is not None else None
+    if values is not None:
+        count("cost_analysis_layout_total", result="hit")
+        return values, plan.start
+    count("cost_analysis_layout_total", result="miss")
+    values = extract_values(LabelIndex(df))
+    plan = layout_cache.learn(df, values)
+    return values, plan.start if plan is not None else None
+
+def first_in_row(mask):
+    """每列第一個 True 的欄位位置，回傳 (是否有 True, 位置)"""
+    if not mask.shape[1]:
+        return np.zeros(len(mask), dtype=bool), np.zeros(len(mask), dtype=int)
+    return mask.any(axis=1), np.argmax(mask, axis=1)
+
+def process_names(block):
+    """每列第一個有效的工序名稱（依 PROCESS_NAME_COLUMNS 順序，已去除前後空白），回傳陣列，沒有時為 NaN"""
+    columns = [col_idx for col_idx in PROCESS_NAME_COLUMNS if col_idx < block.shape[1]]
+    names = np.full(len(block), np.nan, dtype=object)
+    if not columns or not len(block):
+        return names
+    cells = block.iloc[:, columns].to_numpy(dtype=object)
+    flat = pd.Series(cells.ravel(), dtype=object)
+    try:
+        stripped = flat.str.strip()  # 非字串儲存格為 NaN
+    except AttributeError:
+        return names  # 全部都不是字串
+    valid = (stripped.notna() & stripped.ne("") & ~flat.isin(["製程", "工序"])).to_numpy(dtype=bool)
+    has_name, first = first_in_row(valid.reshape(cells.shape))
+    rows = np.flatnonzero(has_name)
+    names[rows] = stripped.to_numpy(dtype=object).reshape(cells.shape)[rows, first[rows]]
+    return names
+
+def number_cells(frame):
+    """
+    判斷每個儲存格是否為工序金額，回傳 (是否為數字, 數值) 兩個與 frame 同形狀的陣列
+    規則同原本逐格判斷：str(值) 去掉 . - e E 後全為數字；看似數字但無法轉換者數值為 NaN
+    """
+    looks = np.zeros(frame.shape, dtype=bool)
+    nums = np.full(frame.shape, np.nan)
+    object_columns = []
+    for col_num in range(frame.shape[1]):
+        col = frame.iloc[:, col_num]
+        if pd.api.types.is_bool_dtype(col):
+            continue
+        if pd.api.types.is_integer_dtype(col):
+            looks[:, col_num] = col.notna().to_numpy()
+            nums[:, col_num] = col.to_numpy(dtype=float, na_value=np.nan)
+        elif pd.api.types.is_float_dtype(col):
+            values = col.to_numpy(dtype=float, na_value=np.nan)
+            with np.errstate(invalid="ignore"):
+                looks[:, col_num] = np.isfinite(values) & (np.abs(values) < MAX_PLAIN_FLOAT)
+            nums[:, col_num] = values
+        elif pd.api.types.is_object_dtype(col):
+            object_columns.append(col_num)
+        # 其餘（日期 / 時間等）的字串含空白或冒號，不會是數字
+
+    if object_columns:
+        # 所有文字欄位合併為一個 Series，一次完成判斷與轉換
+        cells = frame.iloc[:, object_columns].to_numpy(dtype=object).ravel()
+        digits = pd.Series(cells, dtype=object).astype(str).str.translate(NUMBER_PUNCTUATION)
+        ok = pd.notna(cells) & digits.str.isdigit().to_numpy(dtype=bool)
+        values = np.full(len(cells), np.nan)
+        values[ok] = pd.to_numeric(cells[ok], errors="coerce")
+        # to_numeric 不支援的寫法（如全形數字）改用 float() 逐格確認
+        for i in np.flatnonzero(ok & np.isnan(values)):
+            try:
+                values[i] = float(cells[i])
+            except ValueError:
+                pass
+        shape = (frame.shape[0], len(object_columns))
+        looks[:, object_columns] = ok.reshape(shape)
+        nums[:, object_columns] = values.reshape(shape)
+    return looks, nums
+
+def first_number(looks, nums):
+    """
+    每列第一個是數字的儲存格，回傳 (數值, 轉換失敗)
+    找不到數字時數值為 NaN；第一個數字無法轉換時標記為失敗（不再往後找）
+    """
+    found, first = first_in_row(looks)
+    values = np.full(len(looks), np.nan)
+    values[found] = nums[found, first[found]]
+    return values, found & np.isnan(values)
+
+def process_table(df, start=None):
+    """
+    以欄為單位擷取工序區塊，回傳 DataFrame[name, current, eval]（金額為台幣原始數值，沒有時為 NaN）
+    規則同原本逐列掃描：
+    - 名稱依序取 PROCESS_NAME_COLUMNS 中第一個有效的字串
+    - 起始列往下超過 20 列後，遇到第一個沒有名稱的列即停止
+    - 金額依序取 PROCESS_COST_COLUMNS 中第一個數字；現況金額無法轉換時整列都視為沒有金額
+    - 至少有一個金額的列才保留
+    start: 已知的工序區塊起始列（版面快取），None 時以 find_process_start 尋找
+    """
+    if start is None:
+        start = find_process_start(df)
+    block = df.iloc[start:]
+    names = process_names(block)
+    has_name = pd.notna(names)
+
+    # 停止規則：超過起始列 20 列後第一個沒有名稱的列
+    stops = np.flatnonzero(~has_name & (np.arange(len(block)) > PROCESS_SCAN_ROWS))
+    end = stops[0] if stops.size else len(block)
+    rows = np.flatnonzero(has_name[:end])
+
+    # 只需判斷區塊內有名稱的列
+    sides = {}
+    for side, columns in PROCESS_COST_COLUMNS.items():
+        columns = [col_idx for col_idx in columns if col_idx < block.shape[1]]
+        looks, nums = number_cells(block.iloc[rows, columns])
+        sides[side] = first_number(looks, nums)
+    current, current_failed = sides["current"]
+    evaluation = np.where(current_failed, np.nan, sides["eval"][0])
+
+    keep = ~np.isnan(current) | ~np.isnan(evaluation)
+    return pd.DataFrame({
+        "name": pd.Series(names[rows][keep], dtype=object),
+        "current": current[keep],
+        "eval": evaluation[keep],
+    })
+
+@timed("processes")
+def find_processes(df, start=None):
+    """找出工序區塊，回傳未翻譯的 (工序名稱, 現況台幣金額, 評估台幣金額) 列表（沒有金額時為 "-"）"""
+    table = process_table(df, start)
+    return [
+        (name, "-" if pd.isna(c_val) else c_val, "-" if pd.isna(e_val) else e_val)
+        for name, c_val, e_val in zip(table["name"], table["current"].tolist(), table["eval"].tolist())
+    ]
+
+@timed("translate")
+def translate_processes(process_items):
+    """翻譯工序名稱（重複名稱只處理一次，未知名稱一次平行查詢）"""
+    unique_names = dict.fromkeys(p_name for p_name, _, _ in process_items)
+    names = [normalize_process_name(p_name) for p_name in unique_names]
+    translations = translate_many(name for name in names if needs_translation(name))
+
+    labels = {p_name: clean_process_name(p_name, translations) for p_name in unique_names}
+    return [(labels[p_name], c_val, e_val) for p_name, c_val, e_val in process_items]
+
+def extract_raw(df, on_stage=None):
+    """
+    擷取與幣別無關的原始數據：台幣金額、數量與已翻譯的工序列表
+    結果只取決於檔案內容，可依內容雜湊快取，改變幣別 / 匯率時只需重新套用 apply_rate
+    on_stage: 翻譯工序名稱前呼叫 on_stage("translate", 未翻譯的原始數據)，可先顯示數值與工序金額
+    """
+    raw = extract_sheet(df)
+    if on_stage is not None:
+        on_stage("translate", raw)
+    return dict(raw, processes=translate_processes(raw["processes"]))
+
+def extract_sheet(df):
+    """擷取單一工作表的數值與未翻譯的工序列表"""
+    # 已知版面直接讀取儲存格，否則建立標籤索引（只掃描一次，之後每次查詢 O(1)）
+    with timed("labels"):
+        values, start = sheet_values(df)
+    items = find_processes(df, start)
+    return {"auto_part_no": detect_part_no(df), "values": values, "processes": items}
+
+def is_cost_sheet(raw):
+    """工作表是否為成本分析表（見 COST_SHEET_KEYS）"""
+    return any(raw["values"][key] is not None for key in COST_SHEET_KEYS)
+
+def extract_workbook(sheets, on_stage=None):
+    """
+    擷取活頁簿中每個成本分析表的原始數據並翻譯工序名稱（見 extract_sheets / translate_workbook）
+    on_stage: 同 extract_raw，以第一份未翻譯的原始數據呼叫
+    """
+    raws = extract_sheets(sheets)
+    if on_stage is not None:
+        on_stage("translate", raws[0])
+    return translate_workbook(raws)
+
+def extract_sheets(sheets):
+    """
+    擷取活頁簿中每個成本分析表的數值與未翻譯的工序列表，回傳列表（依工作表順序，每份另含 "sheet" 工作表名稱）
+    - 各工作表以執行緒平行擷取數值與工序區塊
+    - 沒有任何成本分析表時以第一個工作表為準（與只讀第一個工作表時相同）；
+      其他工作表擷取失敗時略過，第一個工作表的錯誤只在沒有成本分析表時拋出
+    結果只取決於檔案內容（不含翻譯），可依內容雜湊快取
+    """
+    if not sheets:
+        raise ValueError("活頁簿中沒有工作表")
+    if len(sheets) == 1:
+        raws = [dict(extract_sheet(sheets[0][1]), sheet=sheets[0][0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(SHEET_WORKERS, len(sheets))) as pool:
+            futures = [pool.submit(extract_sheet, df) for _, df in sheets]
+        raws = [
+            dict(future.result(), sheet=name)
+            for (name, _), future in zip(sheets, futures) if future.exception() is None
+        ]
+        raws = [raw for raw in raws if is_cost_sheet(raw)]
+        if not raws:
+            raws = [dict(futures[0].result(), sheet=sheets[0][0])]
+    return raws
+
+def translate_workbook(raws):
+    """翻譯每份原始數據的工序名稱（所有工作表合併後只翻譯一次，重複名稱只查詢一次），回傳新的列表（不修改 raws）"""
+    labels = iter(translate_processes([item for raw in raws for item in raw["processes"]]))
+    return [dict(raw, processes=[next(labels) for _ in raw["processes"]]) for raw in raws]
+
+def sheet_part_nos(raws, part_no=None):
+    """
+    每份原始數據的料號：只有一份時為 part_no（未指定時為自動偵測的料號）
+    多個工作表時為各工作表自動偵測的料號；偵測不到或重複時加上工作表名稱，例: M512-25080601-調整
+    """
+    if len(raws) == 1:
+        return [part_no or raws[0]["auto_part_no"]]
+    counts = Counter(raw["auto_part_no"] for raw in raws)
+    part_nos = []
+    for raw in raws:
+        auto_part_no = raw["auto_part_no"]
+        if auto_part_no in MISSING_PART_NOS:
+            part_nos.append(f"{part_no}-{raw['sheet']}" if part_no else raw["sheet"])
+        elif counts[auto_part_no] > 1:
+            part_nos.append(f"{auto_part_no}-{raw['sheet']}")
+        else:
+            part_nos.append(auto_part_no)
+    return part_nos
+
+def raw_amount(raw, key, rate=1.0):
+    """取出原始數值並換算匯率，找不到（或匯率為 0）回傳 NaN"""
+    num = raw["values"][key]
+    if num is None or not rate:
+        return nan
+    return num / rate
+
+def add_yield(side):
+    """依總投入 / 良品數量計算廢品數量與良率、不良率（總投入為 0 時拋出 ZeroDivisionError）"""
+    if isnan(side["total_qty"]) or isnan(side["good_qty"]):
+        return
+    side["def_qty"] = side["total_qty"] - side["good_qty"]
+    side["good_rate"] = round((side["good_qty"] / side["total_qty"]) * 100, 2)
+    side["def_rate"] = round(100 - side["good_rate"], 2)
+
+def apply_rate(raw, part_no, currency_code, rate):
+    """依幣別 / 匯率換算原始數據，產生 CostReport（不修改 raw）"""
+    sides = {}
+    for side, p, price_key in (("current", "c_", "c_price"), ("eval", "e_", "e_suggest_price")):
+        sides[side] = {
+            "total_qty": raw_amount(raw, p + "total_qty"),
+            "good_qty": raw_amount(raw, p + "good_qty"),
+            "total_input_cost": raw_amount(raw, p + "total_input_cost", rate),
+            "proc_cost": raw_amount(raw, p + "proc_cost", rate),
+            "total_cost": raw_amount(raw, p + "total_cost", rate),
+            "unit_cost": raw_amount(raw, p + "unit_cost", rate),
+            "price": raw_amount(raw, price_key, rate),
+        }
+    current, evaluation = sides["current"], sides["eval"]
+
+    # 計算百分比：依序計算，任一步驟除以 0 時之後的欄位都保持空白
+    try:
+        add_yield(current)
+        if not isnan(current["price"]) and not isnan(current["unit_cost"]) and current["unit_cost"] != 0:
+            current["margin"] = round(((current["price"] - current["unit_cost"]) / current["unit_cost"]) * 100, 1)
+        add_yield(evaluation)
+    except ArithmeticError:
+        pass
+
+    # 工序金額換算匯率（小數 2 位）
+    def amount(val):
+        return nan if val == "-" or not rate else round(val / rate, 2)
+
+    processes = tuple(
+        ProcessStep(name, amount(c_val), amount(e_val)) for name, c_val, e_val in raw["processes"]
+    )
+    return CostReport(part_no, currency_code, rate, CostSide(**current), CostSide(**evaluation), processes)
+
+def apply_rates(raw, part_no, rates):
+    """
+    一次換算多種幣別：rates 為 {幣別: 匯率}，回傳 CostReport 列表（順序同 rates）
+    原始數據只需解析一次；每個幣別的結果與單獨呼叫 apply_rate 完全相同
+    """
+    return [apply_rate(raw, part_no, currency_code, rate) for currency_code, rate in rates.items()]
+
+def extract_results(df, part_no, currency_code, rate):
+    """擷取現況 / 評估數據與工序列表（金額已依匯率換算），回傳 CostReport"""
+    return apply_rate(extract_raw(df), part_no, currency_code, rate)
+
+def format_percent(value):
+    """百分比（已四捨五入）原樣顯示，NaN 顯示為 "-"（沒有資料）"""
+    return "-" if isnan(value) else str(value)
+
+def build_display_data(report):
+    """將 CostReport 格式化為報表顯示用的字串（數量為整數、金額 2 位小數、沒有資料為 "-"）"""
+    display_data = {"part_no": report.part_no, "currency": report.currency, "rate": report.rate}
+    for p, side in (("c_", report.current), ("e_", report.evaluation)):
+        display_data.update({
+            # 數量 - 整數
+            p + "total_qty": format_quantity(side.total_qty),
+            p + "good_qty": format_quantity(side.good_qty),
+            p + "def_qty": format_quantity(side.def_qty),
+            # 金額 - 2位小數
+            p + "total_input_cost": format_price(side.total_input_cost),
+            p + "proc_cost": format_price(side.proc_cost),
+            p + "total_cost": format_price(side.total_cost),
+            p + "unit_cost": format_price(side.unit_cost),
+            # 百分比
+            p + "good_rate": format_percent(side.good_rate),
+            p + "def_rate": format_percent(side.def_rate),
+            p + "proc_pct": "-",
+        })
+    display_data["c_price"] = format_price(report.current.price)
+    display_data["c_margin"] = format_percent(report.current.margin)
+    display_data["e_suggest_price"] = format_price(report.evaluation.price)
+    display_data["process_rows"] = [
+        (step.name, format_price(step.current), format_price(step.evaluation)) for step in report.processes
+    ]
+    return display_data
+
+def parse_workbook(source, filename, cache=result_cache, on_stage=None):
+    """
+    讀檔並擷取每個成本分析工作表的原始數據（見 extract_workbook），以檔案內容雜湊快取結果（cache=None 時不快取）
+    source 可為 bytes、路徑或檔案物件：雜湊分段讀取，csv 直接由 source 逐列串流讀取，不會先整個讀入記憶體
+    快取的是翻譯前的數據，工序名稱每次都重新翻譯（翻譯另有快取）：上次逾時或離線時以原文顯示的名稱，
+    翻譯完成或失敗結果過期後即可取得英文名稱，不會一直沿用快取中的原文
+    on_stage: 各階段開始時呼叫 on_stage(階段, 未翻譯的原始數據或 None)，階段依序為 read / extract / translate；
+    快取命中時只呼叫 translate
+    每次呼叫記錄一筆 parse 日誌（檔名、大小、工作表數、列數、是否命中快取、耗時）
+    """
+    start = time.perf_counter()
+    size = source_size(source)
+    info = {"cached": True, "rows": None}
+
+    def compute():
+        info["cached"] = False
+        if on_stage is not None:
+            on_stage("read", None)
+        sheets = read_sheets(source, filename)
+        info["rows"] = sum(len(df) for _, df in sheets)
+        observe("cost_analysis_file_bytes", size)
+        for _, df in sheets:
+            observe("cost_analysis_file_rows", len(df))
+        if on_stage is not None:
+            on_stage("extract", None)
+        return extract_sheets(sheets)
+
+    raws = compute() if cache is None else cache.get_or_compute(content_key(source, filename), compute)
+    if on_stage is not None:
+        on_stage("translate", raws[0])
+    raws = translate_workbook(raws)
+    log_event(
+        "parse", file=filename, bytes=size, sheets=len(raws), rows=info["rows"], cached=info["cached"],
+        processes=sum(len(raw["processes"]) for raw in raws), seconds=round(time.perf_counter() - start, 6),
+    )
+    return raws
+
+def parse_file(source, filename, cache=result_cache, on_stage=None):
+    """讀檔並擷取第一個成本分析工作表的原始數據（見 parse_workbook）"""
+    return parse_workbook(source, filename, cache, on_stage)[0]
+
+def build_report(source, filename, part_no, currency_code, rate, cache=result_cache):
+    """讀檔 → 擷取 → 換算，回傳 (料號, CostReport)，供 HTML / PDF 共用"""
+    raw = parse_file(source, filename, cache)
+    part_no = part_no or raw["auto_part_no"]
+    return part_no, apply_rate(raw, part_no, currency_code, rate)
+
+def build_reports(source, filename, part_no, rates, cache=result_cache):
+    """讀檔 → 擷取一次 → 換算 rates 中的每個幣別，回傳 (料號, CostReport 列表)"""
+    raw = parse_file(source, filename, cache)
+    part_no = part_no or raw["auto_part_no"]
+    return part_no, apply_rates(raw, part_no, rates)
+
+def build_sheet_reports(source, filename, part_no, rates, cache=result_cache):
+    """
+    讀檔 → 擷取每個成本分析工作表 → 換算 rates 中的每個幣別
+    回傳 [(工作表名稱, 料號, CostReport 列表), ...]；料號見 sheet_part_nos
+    """
+    raws = parse_workbook(source, filename, cache)
+    return [
+        (raw["sheet"], sheet_part_no, apply_rates(raw, sheet_part_no, rates))
+        for raw, sheet_part_no in zip(raws, sheet_part_nos(raws, part_no))
+    ]
+
+def convert(source, filename, part_no, currency_code, rate, cache=result_cache):
+    """完整轉換流程：讀檔 → 擷取 → 生成 HTML，回傳 (料號, HTML)"""
+    part_no, report = build_report(source, filename, part_no, currency_code, rate, cache)
+    return part_no, generate_html(report)
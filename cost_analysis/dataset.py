@@ -0,0 +1,93 @@
+"""
+分析資料集：將換算後的報表附加到以料號 / 日期分區的 Parquet 資料集，供跨料號查詢（DuckDB / pandas）
+
+資料集結構（hive 分區，日期為轉換當天）：
+    <root>/summary/part_no=<料號>/date=<YYYY-MM-DD>/*.parquet    每份報表一列（current_* / eval_* 欄位）
+    <root>/processes/part_no=<料號>/date=<YYYY-MM-DD>/*.parquet  每個工序一列
+兩個表以 report_id 對應；金額為報表幣別，乘以 rate 即為台幣
+每次寫入都新增檔案、不覆寫既有資料，多個程序同時寫入也不會衝突；批次轉換的報表一次寫入
+預設位置可用環境變數 COST_ANALYSIS_DATASET 指定
+"""
+import os
+import uuid
+from datetime import datetime
+from functools import lru_cache
+
+from .model import CostSide
+
+DATASET_DIR = os.environ.get(
+    "COST_ANALYSIS_DATASET",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "dataset"),
+)
+DATASET_TABLES = ("summary", "processes")
+PARTITION_COLUMNS = ["part_no", "date"]
+
+@lru_cache(maxsize=None)
+def dataset_schemas():
+    """兩個表的欄位定義（固定型別，NaN 欄位不會因檔案不同而變成 null 型別）"""
+    import pyarrow as pa
+
+    common = [
+        ("part_no", pa.string()),
+        ("date", pa.string()),
+        ("report_id", pa.string()),
+        ("converted_at", pa.timestamp("ms")),
+        ("source", pa.string()),
+        ("currency", pa.string()),
+        ("rate", pa.float64()),
+    ]
+    sides = [(f"{p}_{key}", pa.float64()) for p in ("current", "eval") for key in CostSide._fields]
+    steps = [("step", pa.int32()), ("name", pa.string()), ("current", pa.float64()), ("eval", pa.float64())]
+    return {"summary": pa.schema(common + sides), "processes": pa.schema(common + steps)}
+
+def report_tables(reports, sources=None, converted_at=None):
+    """將 CostReport 列表轉為 {"summary": Table, "processes": Table}（pyarrow）"""
+    import pyarrow as pa
+
+    converted_at = converted_at or datetime.now()
+    sources = sources or [""] * len(reports)
+    rows = {"summary": [], "processes": []}
+    for report, source in zip(reports, sources):
+        extra = {
+            "date": converted_at.date().isoformat(),
+            "report_id": uuid.uuid4().hex,
+            "converted_at": converted_at,
+            "source": source,
+        }
+        summary, processes = report.to_records()
+        rows["summary"].append({**summary, **extra})
+        rows["processes"].extend({**record, **extra} for record in processes)
+    schemas = dataset_schemas()
+    return {name: pa.Table.from_pylist(rows[name], schema=schemas[name]) for name in DATASET_TABLES}
+
+def append_reports(reports, root=None, sources=None, converted_at=None):
+    """
+    將報表附加到資料集，回傳寫入的報表數
+    sources: 每份報表的來源檔名（可省略）
+    """
+    import pyarrow.parquet as pq
+
+    reports = list(reports)
+    if not reports:
+        return 0
+    root = root or DATASET_DIR
+    for name, table in report_tables(reports, sources, converted_at).items():
+        if table.num_rows:
+            pq.write_to_dataset(table, os.path.join(root, name), partition_cols=PARTITION_COLUMNS)
+    return len(reports)
+
+def read_dataset(table="summary", root=None, filter=None):
+    """
+    讀取資料集為 DataFrame（含 part_no / date 分區欄位）
+    filter: pyarrow.dataset 篩選條件，例: pyarrow.dataset.field("part_no") == "3-041011-001AS-1"
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    schema = dataset_schemas()[table]
+    path = os.path.join(root or DATASET_DIR, table)
+    if not os.path.isdir(path):
+        return schema.empty_table().to_pandas()
+    partitioning = ds.partitioning(pa.schema([schema.field(name) for name in PARTITION_COLUMNS]), flavor="hive")
+    dataset = ds.dataset(path, schema=schema, format="parquet", partitioning=partitioning)
+    return dataset.to_table(filter=filter).to_pandas()
@@ -0,0 +1,191 @@
+"""
+背景轉換工作：轉換在背景執行緒中執行，介面輪詢工作狀態顯示各階段進度，頁面不會停住
+
+- 單一檔案依序經過 讀取檔案 → 擷取數值 → 翻譯工序 → 產生報表；數值擷取完成後即提供預覽報表
+  （工序名稱尚未翻譯），介面可先顯示表頭與摘要，不必等翻譯 API
+- 批次轉換與版本比較回報已完成的檔案數
+- 相同輸入的工作在完成前只執行一次：重複送出、重新整理或其他使用者送出相同內容時沿用執行中的工作
+- 同時執行的工作數上限為 COST_ANALYSIS_JOB_WORKERS（預設 4），其餘排隊，避免共用伺服器被大量轉換佔滿
+- 執行中與排隊中的工作合計超過 COST_ANALYSIS_JOB_QUEUE（預設 32）時拒絕新工作（QueueFull），由呼叫端稍後重試
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+from .batch import dataset_reports, run_batch
+from .compare import compare_files, generate_compare_html
+from .core import apply_rate, generate_html, parse_workbook, sheet_part_nos
+from .dataset import append_reports
+
+JOB_WORKERS = int(os.environ.get("COST_ANALYSIS_JOB_WORKERS", 4))
+JOB_QUEUE_LIMIT = int(os.environ.get("COST_ANALYSIS_JOB_QUEUE", 32))
+
+# 單一檔案的轉換階段
+STAGES = ("read", "extract", "translate", "render")
+STAGE_LABELS = {
+    "queued": "排隊中",
+    "read": "讀取檔案",
+    "extract": "擷取數值",
+    "translate": "翻譯工序",
+    "render": "產生報表",
+    "convert": "轉換檔案",
+    "compare": "比較版本",
+    "dataset": "寫入分析資料集",
+}
+
+class QueueFull(RuntimeError):
+    """執行中與排隊中的工作已達上限（COST_ANALYSIS_JOB_QUEUE）"""
+
+class Job:
+    """
+    一個背景工作的狀態（只由工作執行緒更新，介面只讀取）
+    id: 工作代碼；stage: 目前階段；done / total: 進度；preview: 完成前可先顯示的 CostReport
+    完成後 result 為工作函式的回傳值，失敗時 error 為錯誤訊息；finished_at 為完成時間（time.monotonic）；
+    future 可供 asyncio 等待（asyncio.wrap_future）
+    """
+
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.stage = "queued"
+        self.done = 0
+        self.total = 0
+        self.preview = None
+        self.result = None
+        self.error = None
+        self.finished_at = None
+        self.future = None
+        self._finished = threading.Event()
+
+    def advance(self, stage, preview=None):
+        """進入下一個階段（單一檔案的 STAGES），可同時提供預覽報表"""
+        if preview is not None:
+            self.preview = preview
+        self.stage = stage
+        self.total = len(STAGES)
+        self.done = STAGES.index(stage) if stage in STAGES else self.done
+
+    def set_progress(self, done, total):
+        """批次進度：已完成 done / 共 total 個檔案（可作為 run_batch 的 on_done）"""
+        self.done, self.total = done, total
+
+    @property
+    def fraction(self):
+        return self.done / self.total if self.total else 0.0
+
+    @property
+    def label(self):
+        label = STAGE_LABELS.get(self.stage, self.stage)
+        if self.stage in ("convert", "compare") and self.total:
+            label += f" {self.done}/{self.total}"
+        return label
+
+    def finished(self):
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """等待工作完成，回傳是否已完成"""
+        return self._finished.wait(timeout)
+
+    def run(self, func, *args):
+        try:
+            self.result = func(self, *args)
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+        finally:
+            metrics.flush()
+            self.finished_at = time.monotonic()
+            self._finished.set()
+            _forget(self)
+
+_executor = None
+_executor_pid = None
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+def get_executor():
+    """本程序共用的工作執行緒池（每個程序建立一次）"""
+    global _executor, _executor_pid
+    if _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="cost-analysis-job")
+        _executor_pid = os.getpid()
+    return _executor
+
+def submit_job(key, func, *args):
+    """
+    在背景執行 func(job, *args)，回傳 Job
+    key 相同且尚未完成的工作已存在時直接回傳該工作，不重複執行
+    未完成的工作數已達 JOB_QUEUE_LIMIT 時拋出 QueueFull
+    """
+    with _jobs_lock:
+        job = _jobs.get(key)
+        if job is not None and not job.finished():
+            return job
+        if len(_jobs) >= JOB_QUEUE_LIMIT:
+            metrics.count("cost_analysis_jobs_rejected_total")
+            raise QueueFull(f"目前有 {len(_jobs)} 個轉換工作進行中，請稍後再試")
+        job = Job(key)
+        _jobs[key] = job
+        job.future = get_executor().submit(job.run, func, *args)
+    return job
+
+def pending_jobs():
+    """執行中與排隊中的工作數"""
+    with _jobs_lock:
+        return len(_jobs)
+
+def _forget(job):
+    with _jobs_lock:
+        if _jobs.get(job.key) is job:
+            del _jobs[job.key]
+
+def convert_file(job, data, filename, part_no, currency_code, rate):
+    """
+    單一檔案轉換工作，回傳每個成本分析工作表一筆 (原始數據, CostReport, HTML)（料號見 core.sheet_part_nos）
+    擷取數值後提供第一個工作表未翻譯工序名稱的預覽
+    """
+
+    def on_stage(stage, raw):
+        preview = None
+        if raw is not None:
+            preview = apply_rate(raw, part_no or raw["auto_part_no"], currency_code, rate)
+        job.advance(stage, preview)
+
+    raws = parse_workbook(data, filename, on_stage=on_stage)
+    job.advance("render")
+    results = []
+    for raw, sheet_part_no in zip(raws, sheet_part_nos(raws, part_no)):
+        report = apply_rate(raw, sheet_part_no, currency_code, rate)
+        results.append((raw, report, generate_html(report)))
+    return results
+
+def convert_batch(job, entries, rates, formats=("html",), combined=False, to_dataset=False):
+    """
+    批次轉換工作（見 run_batch），to_dataset 時將成功的報表寫入分析資料集，回傳結果列表
+    PDF 寫入工作專屬的暫存資料夾（結果的 "pdf" 為檔案路徑），工作物件不再被引用時刪除
+    """
+    job.stage = "convert"
+    job.set_progress(0, len(entries))
+    pdf_dir = None
+    if "pdf" in formats:
+        pdf_dir = tempfile.mkdtemp(prefix="cost-analysis-pdf-")
+        weakref.finalize(job, shutil.rmtree, pdf_dir, ignore_errors=True)
+    results = run_batch(entries, rates, on_done=job.set_progress, formats=formats, combined=combined, pdf_dir=pdf_dir)
+    if to_dataset:
+        job.stage = "dataset"
+        reports, sources = dataset_reports(results, rates)
+        append_reports(reports, sources=sources)
+    return results
+
+def compare_versions(job, entries, currency_code, rate):
+    """版本比較工作（見 compare.compare_files），回傳 (Comparison, HTML)"""
+    job.stage = "compare"
+    job.set_progress(0, len(entries))
+    comparison = compare_files(entries, currency_code, rate, on_done=job.set_progress)
+    return comparison, generate_compare_html(comparison)
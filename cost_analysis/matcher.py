@@ -0,0 +1,88 @@
+"""
+工序名稱近似比對：以字典與別名檔建立字元 bigram 索引，在本機找出最接近的已知名稱
+
+- 比對前移除標點 / 括號並統一英文大小寫，例: 熱處理(外) -> 熱處理外
+- 分數（0-1）：完全相同為 1；已知名稱完整出現在名稱中時：
+  - 其餘文字只有「加工」「處理」「外」等修飾詞時為 0.6 + 0.4 × 覆蓋比例（例: CNC車床加工 含 CNC車床，5/7）
+  - 其餘文字另有意義（例: 手工清洗檢查 含 手工清洗，多了「檢查」）時只以覆蓋比例計分，已知名稱須佔名稱的大部分才會採用
+  其餘為 bigram 的 Dice 係數
+- 同分但英文不同時視為無法判斷，交由翻譯 API 處理
+索引只在建立時計算一次，查詢只需比對有共同 bigram 的候選名稱
+"""
+import re
+from collections import defaultdict
+from typing import NamedTuple
+
+# 比對用名稱：只保留文字與數字（移除標點、括號與空白）
+NON_WORD = re.compile(r"[\W_]+")
+
+# 不改變工序本身的修飾詞：已知名稱之外只有這些字時仍視為同一工序（例: CNC車床加工、熱處理(外)）
+QUALIFIERS = re.compile(r"(?:加工|處理|作業|外|內)*")
+
+class Match(NamedTuple):
+    english: str
+    key: str  # 對應到的已知名稱（比對用格式）
+    score: float
+
+def match_key(name):
+    """比對用名稱：移除標點 / 括號 / 空白，英文轉大寫"""
+    return NON_WORD.sub("", name).upper()
+
+def bigrams(text):
+    """字元 bigram 集合（單一字元的名稱以該字元表示）"""
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+class ProcessMatcher:
+    """已知工序名稱（中文 -> English）的近似比對索引"""
+
+    def __init__(self, entries=()):
+        self.names = {}  # 比對用名稱 -> English
+        self.grams = {}  # 比對用名稱 -> bigram 集合
+        self.index = defaultdict(set)  # bigram -> 比對用名稱
+        self.add(entries)
+
+    def add(self, entries):
+        """加入 {中文: English} 或 [(中文, English), ...]，同名時後加入的優先"""
+        items = entries.items() if isinstance(entries, dict) else entries
+        for name, english in items:
+            key = match_key(name)
+            if not key or not english:
+                continue
+            self.names[key] = english
+            self.grams[key] = bigrams(key)
+            for gram in self.grams[key]:
+                self.index[gram].add(key)
+
+    def score(self, query, key):
+        if query == key:
+            return 1.0
+        if key in query:
+            coverage = len(key) / len(query)
+            if all(QUALIFIERS.fullmatch(rest) for rest in query.split(key, 1)):
+                return 0.6 + 0.4 * coverage
+            return coverage
+        query_grams, key_grams = bigrams(query), self.grams[key]
+        return 2 * len(query_grams & key_grams) / (len(query_grams) + len(key_grams))
+
+    def candidates(self, name):
+        """[(分數, 已知名稱), ...]，依分數由高到低（只含有共同 bigram 的名稱）"""
+        query = match_key(name)
+        if not query:
+            return []
+        keys = set().union(*(self.index.get(gram, ()) for gram in bigrams(query)))
+        # 單一字元的已知名稱沒有 bigram，另外檢查是否包含在名稱中
+        keys.update(key for key in self.names if len(key) == 1 and key in query)
+        return sorted(((self.score(query, key), key) for key in keys), key=lambda item: (-item[0], item[1]))
+
+    def match(self, name, threshold=0.0):
+        """回傳最接近的 Match；低於 threshold 或同分但英文不同時回傳 None"""
+        candidates = self.candidates(name)
+        if not candidates or candidates[0][0] < threshold:
+            return None
+        best_score, best_key = candidates[0]
+        english = self.names[best_key]
+        if any(score == best_score and self.names[key] != english for score, key in candidates[1:]):
+            return None
+        return Match(english, best_key, best_score)
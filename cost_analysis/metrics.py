@@ -0,0 +1,221 @@
+"""
+效能量測：各階段耗時、計數器與檔案大小，輸出為 Prometheus 文字格式與結構化日誌（每行一筆 JSON）
+
+- timed(階段)：量測區塊耗時（可作為 with 或裝飾器），累計到 cost_analysis_stage_seconds{stage=...}
+- count(名稱, 數量, **標籤)：計數器，例: 翻譯快取命中 / 未命中、翻譯 API 失敗 / 逾時
+- observe(名稱, 值, **標籤)：累計數值的總和與次數，例: 檔案大小、列數
+- log_event(事件, **欄位)：記錄一筆 JSON 日誌（logger "cost_analysis.metrics"）
+輸出方式：
+- COST_ANALYSIS_METRICS_PORT：以 HTTP 提供 /metrics（Prometheus 文字格式）
+- COST_ANALYSIS_METRICS_FILE：每次轉換後寫入該檔（可給 node_exporter textfile collector 讀取）
+- COST_ANALYSIS_LOG_LEVEL：日誌等級（INFO 為每個檔案一筆，DEBUG 另含每個階段）
+數值只保存在程序內；批次轉換的子程序量測結果會併回主程序
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+METRICS_PORT = os.environ.get("COST_ANALYSIS_METRICS_PORT", "")
+METRICS_FILE = os.environ.get("COST_ANALYSIS_METRICS_FILE", "")
+LOG_LEVEL = os.environ.get("COST_ANALYSIS_LOG_LEVEL", "")
+
+logger = logging.getLogger("cost_analysis.metrics")
+
+# 指標說明（Prometheus HELP）
+METRIC_HELP = {
+    "cost_analysis_stage_seconds": "各階段耗時（秒）",
+    "cost_analysis_stage_failures_total": "各階段拋出例外的次數",
+    "cost_analysis_file_bytes": "轉換的檔案大小（bytes）",
+    "cost_analysis_file_rows": "讀入的工作表列數",
+    "cost_analysis_result_cache_total": "解析結果快取查詢次數（result=hit / shared：其他程序已解析 / miss）",
+    "cost_analysis_layout_total": "版面快取查詢次數（result=hit：依擷取計畫直接讀取 / miss：完整搜尋）",
+    "cost_analysis_translation_cache_total": "翻譯快取查詢次數（result=hit / miss）",
+    "cost_analysis_translation_requests_total": "翻譯 API 呼叫次數（result=ok / failed / timeout）",
+    "cost_analysis_translation_deadline_total": "超過等待時間、先以原文顯示的名稱數",
+    "cost_analysis_jobs_rejected_total": "工作數已達上限而拒絕的轉換工作數",
+}
+
+class Registry:
+    """執行緒安全的計數器 / 累計值，鍵為 (名稱, 標籤)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._summaries = defaultdict(lambda: [0.0, 0])
+
+    def inc(self, name, amount=1, labels=()):
+        with self._lock:
+            self._counters[name, labels] += amount
+
+    def observe(self, name, value, labels=()):
+        with self._lock:
+            summary = self._summaries[name, labels]
+            summary[0] += value
+            summary[1] += 1
+
+    def _copy(self):
+        return {
+            "counters": dict(self._counters),
+            "summaries": {key: tuple(value) for key, value in self._summaries.items()},
+        }
+
+    def snapshot(self):
+        """目前的數值（可 pickle，供子程序傳回主程序）"""
+        with self._lock:
+            return self._copy()
+
+    def drain(self):
+        """取出目前的數值並歸零"""
+        with self._lock:
+            snapshot = self._copy()
+            self._counters.clear()
+            self._summaries.clear()
+        return snapshot
+
+    def merge(self, snapshot):
+        """加入其他程序的數值（drain / snapshot 的結果）"""
+        with self._lock:
+            for key, value in snapshot["counters"].items():
+                self._counters[key] += value
+            for key, (total, count) in snapshot["summaries"].items():
+                summary = self._summaries[key]
+                summary[0] += total
+                summary[1] += count
+
+    def render(self):
+        """Prometheus 文字格式"""
+        snapshot = self.snapshot()
+        lines = []
+        for kind, values in (("counter", snapshot["counters"]), ("summary", snapshot["summaries"])):
+            by_name = defaultdict(list)
+            for (name, labels), value in values.items():
+                by_name[name].append((labels, value))
+            for name in sorted(by_name):
+                if name in METRIC_HELP:
+                    lines.append(f"# HELP {name} {METRIC_HELP[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(by_name[name]):
+                    if kind == "counter":
+                        lines.append(f"{name}{format_labels(labels)} {value:g}")
+                    else:
+                        lines.append(f"{name}_sum{format_labels(labels)} {value[0]:g}")
+                        lines.append(f"{name}_count{format_labels(labels)} {value[1]}")
+        return "\n".join(lines) + "\n"
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+# 本程序共用的量測結果
+registry = Registry()
+
+def count(name, amount=1, **labels):
+    registry.inc(name, amount, tuple(sorted(labels.items())))
+
+def observe(name, value, **labels):
+    registry.observe(name, value, tuple(sorted(labels.items())))
+
+def log_event(event, **fields):
+    """記錄一筆結構化日誌（JSON），未啟用 INFO 等級時不產生字串"""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"event": event, **fields}, ensure_ascii=False, default=str))
+
+@contextmanager
+def timed(stage):
+    """量測區塊耗時，累計到 cost_analysis_stage_seconds；拋出例外時另計失敗次數"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        count("cost_analysis_stage_failures_total", stage=stage)
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        observe("cost_analysis_stage_seconds", seconds, stage=stage)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps({"event": "stage", "stage": stage, "seconds": round(seconds, 6)}))
+
+def render():
+    return registry.render()
+
+def write_file(path=None):
+    """將目前的量測結果寫入檔案（先寫暫存檔再取代，讀取端不會讀到一半的內容）"""
+    path = path or METRICS_FILE
+    if not path:
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(temp_path, path)
+
+def flush():
+    """設定 COST_ANALYSIS_METRICS_FILE 時寫入量測結果（寫入失敗不影響轉換）"""
+    if METRICS_FILE:
+        try:
+            write_file()
+        except OSError as e:
+            logger.warning("無法寫入量測結果 %s：%s", METRICS_FILE, e)
+
+_server = None
+_server_failed = False
+_server_lock = threading.Lock()
+
+def start_server(port=None, host="0.0.0.0"):
+    """
+    在背景執行緒提供 GET /metrics（每個程序只啟動一次），回傳 HTTP server
+    未指定 port 且未設定 COST_ANALYSIS_METRICS_PORT 時不啟動，回傳 None
+    無法綁定連接埠（已被使用）時記錄警告並回傳 None，之後不再重試（Streamlit 每次重新執行都會呼叫）
+    """
+    global _server, _server_failed
+    port = port or METRICS_PORT
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None and not _server_failed:
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = render().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            try:
+                _server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+            except OSError as e:
+                _server_failed = True
+                logger.warning("無法啟動量測服務（連接埠 %s）：%s", port, e)
+                return None
+            threading.Thread(target=_server.serve_forever, name="cost-analysis-metrics", daemon=True).start()
+    return _server
+
+def setup_logging(level=None):
+    """依 COST_ANALYSIS_LOG_LEVEL 將量測日誌輸出到 stderr（每行一筆 JSON）；未設定時不輸出"""
+    level = level or LOG_LEVEL
+    if not level or logger.handlers:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(level.upper())
+    logger.propagate = False
@@ -0,0 +1,104 @@
+"""
+報表資料模型：一份成本分析報表以 CostReport（NamedTuple）表示
+
+- 數值一律為 float，沒有資料為 NaN（不再混用 "-" 字串）
+- 數量、百分比、毛利等衍生值在換算時算好，之後不需再做型別判斷
+- 格式化（整數、2 位小數、"-"）只在產生 HTML / PDF 時進行（core.build_display_data）
+- to_dict() / from_dict() 可轉為 JSON；to_records() 產生扁平的列，可直接建立 DataFrame / Arrow 表格
+
+採用 NamedTuple：報表建立後不再修改，不可變的物件可在快取（結果快取、st.cache_data）與多個執行緒間安全共用；
+pickle 後體積小（批次子程序回傳結果），並可用 _replace / _asdict 取得修改後的副本或 dict
+"""
+from math import isnan, nan
+from typing import NamedTuple, Tuple
+
+class CostSide(NamedTuple):
+    """現況或評估一側的數值（數量為個數，金額已換算為報表幣別）"""
+    total_qty: float = nan
+    good_qty: float = nan
+    def_qty: float = nan
+    good_rate: float = nan  # 良率（%，小數 2 位）
+    def_rate: float = nan  # 不良率（%，小數 2 位）
+    total_input_cost: float = nan
+    proc_cost: float = nan
+    total_cost: float = nan
+    unit_cost: float = nan
+    price: float = nan  # 現況：目前售價；評估：建議售價
+    margin: float = nan  # 現況售價相對單顆成本的毛利（%，小數 1 位），評估一側為 NaN
+
+class ProcessStep(NamedTuple):
+    """工序名稱（中文 | English）與現況 / 評估金額（已換算幣別，小數 2 位）"""
+    name: str
+    current: float = nan
+    evaluation: float = nan
+
+class CostReport(NamedTuple):
+    part_no: str
+    currency: str
+    rate: float
+    current: CostSide
+    evaluation: CostSide
+    processes: Tuple[ProcessStep, ...] = ()
+
+    def to_dict(self):
+        """轉為可直接 json.dumps 的 dict（NaN 轉為 None）"""
+        return {
+            "part_no": self.part_no,
+            "currency": self.currency,
+            "rate": self.rate,
+            "current": _json_values(self.current._asdict()),
+            "evaluation": _json_values(self.evaluation._asdict()),
+            "processes": [_json_values(step._asdict()) for step in self.processes],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """由 to_dict() 的結果還原（None 轉回 NaN）"""
+        return cls(
+            part_no=data["part_no"],
+            currency=data["currency"],
+            rate=data["rate"],
+            current=CostSide(**_nan_values(data["current"])),
+            evaluation=CostSide(**_nan_values(data["evaluation"])),
+            processes=tuple(ProcessStep(**_nan_values(step)) for step in data["processes"]),
+        )
+
+    def summary_record(self):
+        """報表摘要的扁平列：current_* / eval_* 欄位"""
+        record = {"part_no": self.part_no, "currency": self.currency, "rate": self.rate}
+        record.update((f"current_{key}", value) for key, value in zip(CostSide._fields, self.current))
+        record.update((f"eval_{key}", value) for key, value in zip(CostSide._fields, self.evaluation))
+        return record
+
+    def process_records(self):
+        """每個工序一列，step 為工序在報表中的順序（從 0 開始）"""
+        return [
+            {"part_no": self.part_no, "currency": self.currency, "rate": self.rate, "step": step,
+             "name": process.name, "current": process.current, "eval": process.evaluation}
+            for step, process in enumerate(self.processes)
+        ]
+
+    def to_records(self):
+        """回傳 (摘要列, 工序列列表)，可用 pd.DataFrame / pyarrow.Table.from_pylist 建表"""
+        return self.summary_record(), self.process_records()
+
+def _json_values(values):
+    return {key: None if isinstance(value, float) and isnan(value) else value for key, value in values.items()}
+
+def _nan_values(values):
+    return {key: nan if value is None else value for key, value in values.items()}
+
+def reports_frame(reports):
+    """多份報表的摘要表（每份一列），可直接做跨報表的向量化統計"""
+    import pandas as pd
+
+    return pd.DataFrame.from_records([report.summary_record() for report in reports])
+
+def processes_frame(reports):
+    """多份報表的工序表（每個工序一列）"""
+    import pandas as pd
+
+    return pd.DataFrame.from_records(
+        [record for report in reports for record in report.process_records()],
+        columns=["part_no", "currency", "rate", "step", "name", "current", "eval"],
+    )
@@ -0,0 +1,225 @@
+"""
+PDF 匯出：將報表直接在伺服器端轉為 PDF（不需開瀏覽器列印）
+
+- weasyprint：將 generate_html 的輸出排版為 PDF，版面與網頁報表一致（需系統安裝 Pango）
+- reportlab：不依賴系統函式庫的備援引擎，依報表顯示數據直接繪製表格
+
+字型、列印樣式與表格樣式每個程序只載入一次，之後重複使用；
+輸出直接寫入檔案路徑或檔案物件（串流），不需先在記憶體中組出整份 PDF
+預設引擎可用環境變數 COST_ANALYSIS_PDF_ENGINE 指定，中文字型檔可用 COST_ANALYSIS_PDF_FONT 指定
+"""
+import os
+from contextlib import redirect_stdout
+from functools import lru_cache
+from io import BytesIO, StringIO
+
+from .core import TEMPLATE_DIR, build_display_data, generate_html
+from .metrics import timed
+
+PDF_ENGINES = ("weasyprint", "reportlab")
+
+# 中文字型候選（依序嘗試，系統有安裝哪一個就用哪一個）
+CJK_FONT_FAMILIES = [
+    "Noto Sans CJK TC", "Noto Sans TC", "Microsoft JhengHei", "PingFang TC",
+    "Heiti TC", "WenQuanYi Zen Hei", "Arial Unicode MS",
+]
+
+# 列印版面：A4 橫向，隱藏網頁上的列印 / 下載按鈕
+PRINT_CSS = """
+@page { size: A4 landscape; margin: 12mm; }
+body { margin: 0; font-family: Arial, Helvetica, %(fonts)s, sans-serif; font-size: 10pt; }
+.print-button, .download-button { display: none; }
+.container { gap: 15px; }
+tr { page-break-inside: avoid; }
+"""
+
+class PdfEngineUnavailable(RuntimeError):
+    """沒有可用的 PDF 引擎"""
+
+@lru_cache(maxsize=None)
+def has_weasyprint():
+    # weasyprint 在缺少 Pango 等系統函式庫時匯入會拋出 OSError，並在 stdout 印出安裝說明
+    try:
+        with redirect_stdout(StringIO()):
+            import weasyprint  # noqa: F401
+    except (ImportError, OSError):
+        return False
+    return True
+
+@lru_cache(maxsize=None)
+def has_reportlab():
+    try:
+        import reportlab  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def default_pdf_engine():
+    """預設 PDF 引擎：環境變數指定 > weasyprint（可用時）> reportlab"""
+    engine = os.environ.get("COST_ANALYSIS_PDF_ENGINE")
+    if engine in PDF_ENGINES:
+        return engine
+    if has_weasyprint():
+        return "weasyprint"
+    if has_reportlab():
+        return "reportlab"
+    raise PdfEngineUnavailable("無法產生 PDF：請安裝 weasyprint（含 Pango）或 reportlab")
+
+def check_pdf_engine(engine=None):
+    """確認 PDF 引擎可以載入（不產生 PDF），回傳引擎名稱；無法使用時拋出 PdfEngineUnavailable"""
+    engine = engine or default_pdf_engine()
+    available = {"weasyprint": has_weasyprint, "reportlab": has_reportlab}
+    if engine not in available or not available[engine]():
+        raise PdfEngineUnavailable(f"無法產生 PDF：{engine} 無法載入")
+    return engine
+
+# --- weasyprint ---
+@lru_cache(maxsize=None)
+def weasyprint_resources():
+    """字型設定與列印樣式（每個程序只建立一次）"""
+    from weasyprint import CSS
+    from weasyprint.text.fonts import FontConfiguration
+
+    font_config = FontConfiguration()
+    families = list(CJK_FONT_FAMILIES)
+    font_face = ""
+    font_path = os.environ.get("COST_ANALYSIS_PDF_FONT")
+    if font_path:
+        families.insert(0, "ReportCJK")
+        font_face = '@font-face { font-family: "ReportCJK"; src: url("file://%s"); }\n' % os.path.abspath(font_path)
+    css = font_face + PRINT_CSS % {"fonts": ", ".join(f'"{name}"' for name in families)}
+    return font_config, CSS(string=css, font_config=font_config)
+
+def render_weasyprint(report, target):
+    from weasyprint import HTML
+
+    font_config, stylesheet = weasyprint_resources()
+    HTML(string=generate_html(report), base_url=TEMPLATE_DIR).write_pdf(
+        target, stylesheets=[stylesheet], font_config=font_config
+    )
+
+# --- reportlab ---
+def summary_rows(data, side):
+    """現況 / 評估表格內容，與 HTML 模板相同"""
+    header = ["項目 | Item", "數量 | Quantity", "百分比 | Percentage", f"成本 ({data['currency']}) | Cost ({data['currency']})"]
+    p = side[0] + "_"
+    rows = [
+        header,
+        ["總投入數量 | Total Input Quantity", data[p + "total_qty"], "-", data[p + "total_input_cost"]],
+        ["良品數量 | Good Product Quantity", data[p + "good_qty"], f"{data[p + 'good_rate']}%", "-"],
+        ["廢品數量 | Defective Quantity", data[p + "def_qty"], f"{data[p + 'def_rate']}%", "-"],
+        ["加工成本 | Processing Cost", "-", f"{data[p + 'proc_pct']}%", data[p + "proc_cost"]],
+        ["總成本 | Total Cost", "-", "-", data[p + "total_cost"]],
+        ["單顆成本 | Unit Cost", "-", "-", data[p + "unit_cost"]],
+    ]
+    if side == "current":
+        rows.append(["目前售價 | Current Selling Price", "-", "-", f"{data['c_price']} ({data['c_margin']}%)"])
+    else:
+        rows.append(["建議售價 (毛利潤20%) | Suggested Selling Price (20% Profit Margin)", "-", "-", data["e_suggest_price"]])
+    return rows
+
+@lru_cache(maxsize=None)
+def reportlab_styles():
+    """註冊中文字型並建立段落 / 表格樣式（每個程序只建立一次）"""
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.platypus import TableStyle
+
+    font_path = os.environ.get("COST_ANALYSIS_PDF_FONT")
+    if font_path:
+        font = "ReportCJK"
+        pdfmetrics.registerFont(TTFont(font, font_path))
+    else:
+        # Adobe 繁體中文 CID 字型，不需字型檔
+        font = "MSung-Light"
+        pdfmetrics.registerFont(UnicodeCIDFont(font))
+
+    return {
+        "title": ParagraphStyle("title", fontName=font, fontSize=16, leading=22, alignment=TA_CENTER, spaceAfter=10),
+        "heading": ParagraphStyle("heading", fontName=font, fontSize=11, leading=15, spaceBefore=8, spaceAfter=6),
+        "cell": ParagraphStyle("cell", fontName=font, fontSize=8, leading=10, alignment=TA_CENTER),
+        "footer": ParagraphStyle("footer", fontName=font, fontSize=8, leading=10, alignment=TA_CENTER,
+                                 textColor=colors.HexColor("#999999"), spaceBefore=12),
+        "table": TableStyle([
+            ("GRID", (0, 0), (-1, -1), 0.5, colors.HexColor("#cccccc")),
+            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#e0e0e0")),
+            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ]),
+        "highlight": colors.HexColor("#e3f2fd"),
+    }
+
+def render_reportlab(report, target):
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Table
+
+    styles = reportlab_styles()
+    display_data = build_display_data(report)
+
+    def table(rows, col_widths, highlight_row=None):
+        cells = [[Paragraph(escape_markup(value), styles["cell"]) for value in row] for row in rows]
+        t = Table(cells, colWidths=col_widths, repeatRows=1)
+        t.setStyle(styles["table"])
+        if highlight_row is not None:
+            t.setStyle([("BACKGROUND", (0, highlight_row), (-1, highlight_row), styles["highlight"])])
+        return t
+
+    doc = SimpleDocTemplate(
+        target, pagesize=landscape(A4),
+        leftMargin=12 * mm, rightMargin=12 * mm, topMargin=12 * mm, bottomMargin=12 * mm,
+        title=f"Cost Analysis {display_data['part_no']}",
+    )
+    half = (doc.width - 6 * mm) / 2
+    widths = [half * 0.4, half * 0.18, half * 0.18, half * 0.24]
+
+    # 現況 / 評估兩張表左右並排
+    sides = Table(
+        [[Paragraph("現況：成本分析 | Current Situation: Cost Analysis", styles["heading"]),
+          Paragraph("評估：報價 | Evaluation: Quotation", styles["heading"])],
+         [table(summary_rows(display_data, "current"), widths, highlight_row=6),
+          table(summary_rows(display_data, "eval"), widths, highlight_row=6)]],
+        colWidths=[half + 3 * mm, half + 3 * mm],
+    )
+    sides.setStyle([("VALIGN", (0, 0), (-1, -1), "TOP"), ("LEFTPADDING", (0, 0), (-1, -1), 0)])
+
+    currency = display_data["currency"]
+    process_rows = [[
+        "工序名稱 | Process Name",
+        f"現況 ({currency}) | Current Situation ({currency})",
+        f"評估 ({currency}) | Evaluation ({currency})",
+    ]] + [list(row) for row in display_data["process_rows"]]
+
+    doc.build([
+        Paragraph(escape_markup(f"成本分析 | Cost Analysis | {display_data['part_no']}"), styles["title"]),
+        sides,
+        Paragraph("工序比較 | Process Comparison", styles["heading"]),
+        table(process_rows, [doc.width * 0.5, doc.width * 0.25, doc.width * 0.25]),
+        Paragraph("Generated by 成本分析轉換工具", styles["footer"]),
+    ])
+
+def escape_markup(value):
+    # reportlab 的 Paragraph 會解析標記，需跳脫 & < >
+    return str(value).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+PDF_RENDERERS = {
+    "weasyprint": render_weasyprint,
+    "reportlab": render_reportlab,
+}
+
+@timed("pdf")
+def render_pdf(report, target=None, engine=None):
+    """
+    將報表（CostReport）轉為 PDF
+    target: 檔案路徑或可寫入的檔案物件（直接串流寫入）；為 None 時回傳 PDF bytes
+    """
+    engine = engine or default_pdf_engine()
+    if target is None:
+        buffer = BytesIO()
+        PDF_RENDERERS[engine](report, buffer)
+        return buffer.getvalue()
+    PDF_RENDERERS[engine](report, target)
+    return None
@@ -0,0 +1,288 @@
+"""
+匯率來源：本機版本化匯率表、可選的匯率 API 與程序內 TTL 快取
+
+查詢某幣別在某日的匯率（1 外幣 = ? 台幣）時依序嘗試：
+1. 匯率表（SQLite，COST_ANALYSIS_RATE_DB）中匯入的匯率：生效日期 <= 該日的最新一筆；
+   同一生效日期重新匯入不覆蓋舊資料，以最後寫入的版本為準（可追溯當時使用的匯率）
+2. 匯率 API（設定 COST_ANALYSIS_RATE_URL 且非離線模式時）：結果以該日為生效日期寫回匯率表，同一天不再連網
+3. 匯率表中較早的 API 查詢結果（離線或 API 失敗時）
+4. DEFAULT_RATES
+查詢結果在程序內快取 RATE_CACHE_TTL 秒；批次 / 命令列轉換每次執行只查詢一次，不需逐檔輸入匯率
+匯率表可由 CSV 匯入（欄位：currency,effective_date,rate[,source]），例: python -m cost_analysis rates import rates.csv
+"""
+import csv
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+
+from . import translate
+from .core import DEFAULT_RATES
+
+RATE_DB = os.environ.get(
+    "COST_ANALYSIS_RATE_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "rates.sqlite3"),
+)
+RATE_CACHE_TTL = float(os.environ.get("COST_ANALYSIS_RATE_TTL", 3600))
+
+# 匯率 API（格式同 frankfurter / exchangerate.host）：GET {url}?base=USD&symbols=TWD&date=2025-01-31
+# 回傳 {"rates": {"TWD": 32.5}}；未設定時不連網
+RATE_URL = os.environ.get("COST_ANALYSIS_RATE_URL", "")
+RATE_TIMEOUT = float(os.environ.get("COST_ANALYSIS_RATE_TIMEOUT", 5))
+
+# 台幣為基準幣別，API 使用 ISO 代碼 TWD
+BASE_CURRENCY = "NTD"
+ISO_CODES = {"NTD": "TWD"}
+
+# 匯率 API 查詢結果寫入匯率表時的來源
+FETCHED_SOURCE = "api"
+
+def to_date(value):
+    """date / ISO 字串 / None（今天）統一轉為 date"""
+    if value is None:
+        return date.today()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+class RateProvider:
+    """匯率來源介面：rate(幣別, 日期) 回傳 1 外幣 = ? 台幣，沒有資料回傳 None"""
+
+    def rate(self, currency_code, on_date):
+        raise NotImplementedError
+
+class DefaultRates(RateProvider):
+    """程式內建的預設匯率（不分日期）"""
+
+    def __init__(self, rates=DEFAULT_RATES):
+        self.rates = rates
+
+    def rate(self, currency_code, on_date):
+        return self.rates.get(currency_code)
+
+class RateTable(RateProvider):
+    """
+    SQLite 匯率表：每筆 (幣別, 生效日期, 匯率, 來源, 寫入時間)，只新增不覆蓋
+    - WAL 模式，多個程序可同時讀寫
+    - 每個執行緒各自持有連線
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rates ("
+                " currency TEXT NOT NULL,"
+                " effective_date TEXT NOT NULL,"
+                " rate REAL NOT NULL,"
+                " source TEXT NOT NULL DEFAULT '',"
+                " recorded_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS rates_lookup ON rates (currency, effective_date, recorded_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def lookup(self, currency_code, on_date, fetched=True, exact=False):
+        """
+        生效日期 <= on_date 的最新一筆匯率，沒有資料回傳 None
+        fetched=False 時不含匯率 API 的查詢結果；exact=True 時只找生效日期為 on_date 的資料
+        """
+        query = "SELECT rate FROM rates WHERE currency = ? AND effective_date " + ("= ?" if exact else "<= ?")
+        params = [currency_code, to_date(on_date).isoformat()]
+        if not fetched:
+            query += " AND source != ?"
+            params.append(FETCHED_SOURCE)
+        row = self._connect().execute(
+            query + " ORDER BY effective_date DESC, recorded_at DESC LIMIT 1", params
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def rate(self, currency_code, on_date):
+        return self.lookup(currency_code, on_date)
+
+    def add(self, rows, source=""):
+        """寫入匯率 [(幣別, 生效日期, 匯率), ...]，回傳筆數"""
+        now = time.time()
+        records = []
+        for currency_code, effective_date, rate in rows:
+            rate = float(rate)
+            if rate <= 0:
+                raise ValueError(f"{currency_code} {effective_date} 的匯率必須大於 0")
+            records.append((currency_code.strip().upper(), to_date(effective_date).isoformat(), rate, source, now))
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO rates (currency, effective_date, rate, source, recorded_at) VALUES (?, ?, ?, ?, ?)",
+                records,
+            )
+        return len(records)
+
+    def import_csv(self, path):
+        """由 CSV 匯入（欄位：currency,effective_date,rate[,source]），回傳筆數"""
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            rows = list(csv.DictReader(f))
+        count = 0
+        # 依來源分組寫入（未填來源時使用檔名）
+        for source in dict.fromkeys(row.get("source") or os.path.basename(path) for row in rows):
+            count += self.add(
+                [(row["currency"], row["effective_date"], row["rate"])
+                 for row in rows if (row.get("source") or os.path.basename(path)) == source],
+                source=source,
+            )
+        return count
+
+    def history(self, currency_code=None):
+        """[(幣別, 生效日期, 匯率, 來源, 寫入時間), ...]，依幣別與生效日期排序"""
+        query = "SELECT currency, effective_date, rate, source, recorded_at FROM rates"
+        params = ()
+        if currency_code:
+            query += " WHERE currency = ?"
+            params = (currency_code,)
+        return self._connect().execute(query + " ORDER BY currency, effective_date, recorded_at", params).fetchall()
+
+class ImportedRates(RateProvider):
+    """匯率表中匯入的匯率（不含匯率 API 的查詢結果）"""
+
+    def __init__(self, table):
+        self.table = table
+
+    def rate(self, currency_code, on_date):
+        return self.table.lookup(currency_code, on_date, fetched=False)
+
+class FetchedRates(RateProvider):
+    """
+    匯率 API：查詢結果寫回匯率表（生效日期為查詢日期），同一天直接由匯率表取得
+    離線模式或未設定網址時不連網；查詢失敗回傳 None
+    """
+
+    def __init__(self, table=None, url=None, timeout=None):
+        self.table = table
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self, currency_code, on_date):
+        """呼叫匯率 API，回傳匯率或 None"""
+        import requests
+
+        iso = ISO_CODES.get(currency_code, currency_code)
+        params = {"base": iso, "symbols": ISO_CODES[BASE_CURRENCY], "date": on_date.isoformat()}
+        try:
+            response = requests.get(
+                self.url or RATE_URL, params=params, timeout=RATE_TIMEOUT if self.timeout is None else self.timeout
+            )
+            rate = float(response.json()["rates"][ISO_CODES[BASE_CURRENCY]])
+        except Exception as e:
+            return None
+        return rate if rate > 0 else None
+
+    def rate(self, currency_code, on_date):
+        on_date = to_date(on_date)
+        if self.table is not None:
+            rate = self.table.lookup(currency_code, on_date, exact=True)
+            if rate is not None:
+                return rate
+        if translate.OFFLINE or not (self.url or RATE_URL):
+            return None
+        rate = self.fetch(currency_code, on_date)
+        if rate is not None and self.table is not None:
+            try:
+                self.table.add([(currency_code, on_date, rate)], source=FETCHED_SOURCE)
+            except sqlite3.Error:
+                pass
+        return rate
+
+class ChainedRates(RateProvider):
+    """依序嘗試多個來源，回傳第一個有資料的結果"""
+
+    def __init__(self, *providers):
+        self.providers = [provider for provider in providers if provider is not None]
+
+    def rate(self, currency_code, on_date):
+        for provider in self.providers:
+            try:
+                rate = provider.rate(currency_code, on_date)
+            except sqlite3.Error:
+                rate = None
+            if rate is not None:
+                return rate
+        return None
+
+class CachedRates(RateProvider):
+    """程序內 TTL 快取：(幣別, 日期) -> (匯率, 到期時間)"""
+
+    def __init__(self, provider, ttl=RATE_CACHE_TTL):
+        self.provider = provider
+        self.ttl = ttl
+        self._cache = {}
+
+    def rate(self, currency_code, on_date):
+        key = (currency_code, to_date(on_date))
+        cached = self._cache.get(key)
+        if cached is not None and cached[1] > time.time():
+            return cached[0]
+        rate = self.provider.rate(currency_code, key[1])
+        if rate is not None:
+            self._cache[key] = (rate, time.time() + self.ttl)
+        return rate
+
+    def clear(self):
+        self._cache.clear()
+
+_provider = None
+_provider_pid = None
+_provider_lock = threading.Lock()
+
+def get_rate_table():
+    """本程序的匯率表（無法開啟資料庫時回傳 None）"""
+    try:
+        return RateTable(RATE_DB)
+    except (sqlite3.Error, OSError):
+        return None
+
+def get_rate_provider():
+    """預設匯率來源（順序見模組說明），加上程序內快取，每個程序建立一次"""
+    global _provider, _provider_pid
+    # fork 出來的子程序不可沿用父程序的 SQLite 連線
+    if _provider_pid != os.getpid():
+        with _provider_lock:
+            if _provider_pid != os.getpid():
+                table = get_rate_table()
+                imported = ImportedRates(table) if table is not None else None
+                _provider = CachedRates(ChainedRates(imported, FetchedRates(table), table, DefaultRates()))
+                _provider_pid = os.getpid()
+    return _provider
+
+def get_rate(currency_code, on_date=None, provider=None):
+    """某幣別在某日（預設今天）的匯率，台幣固定為 1"""
+    if currency_code == BASE_CURRENCY:
+        return 1.0
+    rate = (provider or get_rate_provider()).rate(currency_code, to_date(on_date))
+    if rate is None:
+        raise KeyError(f"找不到 {currency_code} 的匯率")
+    return rate
+
+def resolve_rates(currencies, on_date=None, provider=None):
+    """{幣別: 匯率}，每個幣別依日期查詢一次"""
+    on_date = to_date(on_date)
+    return {currency_code: get_rate(currency_code, on_date, provider) for currency_code in currencies}
+
+def currency_rates(currency_code=None, rate=None, on_date=None, provider=None):
+    """所有預設幣別的匯率 {幣別: 匯率}；指定的幣別（及匯率）排在最前面"""
+    currencies = list(DEFAULT_RATES)
+    if currency_code:
+        currencies = [currency_code] + [code for code in currencies if code != currency_code]
+    # 已指定匯率的幣別不必查詢（離線時也不會因查不到而失敗）
+    explicit = {currency_code: rate} if currency_code and rate is not None else {}
+    looked_up = resolve_rates([code for code in currencies if code not in explicit], on_date, provider)
+    return {code: explicit[code] if code in explicit else looked_up[code] for code in currencies}
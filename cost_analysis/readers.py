@@ -0,0 +1,204 @@
+"""
+檔案讀取層：可切換的 Excel 讀取引擎
+
+- calamine：python-calamine（Rust 實作），最快，需安裝 python-calamine
+- openpyxl：read_only / data_only 串流讀取
+- pandas：原本的 pd.read_excel（完整讀取所有欄位，作為對照基準）
+
+calamine / openpyxl 只讀取擷取時會用到的前 MAX_COLUMNS 欄，並可在工序區塊結束後提前停止；
+儲存格轉換與 DataFrame 建立方式與 pd.read_excel 相同，解析結果一致
+CSV 以 iter_rows_csv 逐列串流讀取（同樣只保留前 MAX_COLUMNS 欄、可提前停止），記憶體用量與檔案大小無關；
+pandas 引擎仍以 pd.read_csv 完整讀取
+多工作表活頁簿以 SHEET_READERS 只開啟一次，依序讀取每個工作表
+預設引擎可用環境變數 COST_ANALYSIS_READER 指定
+"""
+import csv
+import os
+from io import BytesIO, TextIOWrapper
+
+import numpy as np
+import pandas as pd
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+
+# 標籤搜尋 26 欄 + 數值最多往右 4 欄
+MAX_COLUMNS = 30
+
+EXCEL_ENGINES = ("calamine", "openpyxl", "pandas")
+
+def has_calamine():
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def default_engine():
+    """預設讀取引擎：環境變數指定 > calamine（已安裝時）> openpyxl"""
+    engine = os.environ.get("COST_ANALYSIS_READER")
+    if engine in EXCEL_ENGINES:
+        return engine
+    return "calamine" if has_calamine() else "openpyxl"
+
+def sheet_rows_openpyxl(sheet, max_columns=MAX_COLUMNS):
+    """串流讀取 openpyxl 工作表（read_only），儲存格轉換方式同 pandas"""
+    from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+    sheet.reset_dimensions()
+    for row in sheet.iter_rows(max_col=max_columns):
+        converted = []
+        for cell in row:
+            value = cell.value
+            if value is None:
+                converted.append("")
+            elif cell.data_type == TYPE_ERROR:
+                converted.append(np.nan)
+            elif cell.data_type == TYPE_NUMERIC:
+                as_int = int(value)
+                converted.append(as_int if as_int == value else float(value))
+            else:
+                converted.append(value)
+        yield converted
+
+def open_openpyxl(data):
+    from openpyxl import load_workbook
+
+    return load_workbook(BytesIO(data), read_only=True, data_only=True, keep_links=False)
+
+def iter_rows_openpyxl(data, max_columns=MAX_COLUMNS):
+    """以 openpyxl 串流讀取第一個工作表"""
+    book = open_openpyxl(data)
+    try:
+        yield from sheet_rows_openpyxl(book.worksheets[0], max_columns)
+    finally:
+        book.close()
+
+def iter_sheets_openpyxl(data, max_columns=MAX_COLUMNS):
+    """以 openpyxl 開啟一次活頁簿，依序產生 (工作表名稱, 列資料)；每個工作表需讀完（或放棄）後再取下一個"""
+    book = open_openpyxl(data)
+    try:
+        for sheet in book.worksheets:
+            yield sheet.title, sheet_rows_openpyxl(sheet, max_columns)
+    finally:
+        book.close()
+
+def sheet_rows_calamine(sheet, max_columns=MAX_COLUMNS):
+    """讀取 python-calamine 工作表，儲存格轉換方式同 pandas"""
+    from datetime import date, timedelta
+
+    if sheet.start is None:
+        return
+    # iter_rows 從第 0 列開始，但欄位從資料起始欄開始，需補齊左側空白欄
+    left_pad = [""] * sheet.start[1]
+    for row in sheet.iter_rows():
+        converted = []
+        for value in (left_pad + row)[:max_columns]:
+            if isinstance(value, float):
+                as_int = int(value)
+                converted.append(as_int if as_int == value else value)
+            elif isinstance(value, date):
+                converted.append(pd.Timestamp(value))
+            elif isinstance(value, timedelta):
+                converted.append(pd.Timedelta(value))
+            else:
+                converted.append(value)
+        yield converted
+
+def iter_rows_calamine(data, max_columns=MAX_COLUMNS):
+    """以 python-calamine 讀取第一個工作表"""
+    from python_calamine import CalamineWorkbook
+
+    yield from sheet_rows_calamine(CalamineWorkbook.from_filelike(BytesIO(data)).get_sheet_by_index(0), max_columns)
+
+def iter_sheets_calamine(data, max_columns=MAX_COLUMNS):
+    """以 python-calamine 開啟一次活頁簿，依序產生 (工作表名稱, 列資料)"""
+    from python_calamine import CalamineWorkbook
+
+    book = CalamineWorkbook.from_filelike(BytesIO(data))
+    for name in book.sheet_names:
+        yield name, sheet_rows_calamine(book.get_sheet_by_name(name), max_columns)
+
+ROW_READERS = {
+    "calamine": iter_rows_calamine,
+    "openpyxl": iter_rows_openpyxl,
+}
+
+SHEET_READERS = {
+    "calamine": iter_sheets_calamine,
+    "openpyxl": iter_sheets_openpyxl,
+}
+
+def collect_rows(rows, stop=None):
+    """
+    收集列資料，直到 stop(資料列索引, 列) 回傳 True（第 0 列為標題列，不傳給 stop）
+    回傳 (已收集的列, 觸發停止的那一列)，讀完整個工作表時第二項為 None
+    """
+    collected = []
+    for row_number, row in enumerate(rows):
+        if stop is not None and row_number > 0 and stop(row_number - 1, row):
+            return collected, row
+        collected.append(row)
+    return collected, None
+
+def rows_to_frame(rows):
+    """將列資料轉為 DataFrame（第一列為標題），處理方式同 pd.read_excel"""
+    data = []
+    last_row_with_data = -1
+    for row_number, row in enumerate(rows):
+        row = list(row)
+        # 移除列尾空白儲存格
+        while row and row[-1] == "":
+            row.pop()
+        if row:
+            last_row_with_data = row_number
+        data.append(row)
+
+    # 移除尾端空白列
+    data = data[: last_row_with_data + 1]
+    if not data:
+        return pd.DataFrame()
+
+    # 補齊為相同寬度
+    max_width = max(len(row) for row in data)
+    data = [row + [""] * (max_width - len(row)) for row in data]
+
+    try:
+        return TextParser(data, header=0, skip_blank_lines=False).read()
+    except EmptyDataError:
+        return pd.DataFrame()
+
+def iter_rows_csv(source, max_columns=MAX_COLUMNS, encoding="utf-8-sig"):
+    """
+    逐列串流讀取 CSV（source 可為 bytes、路徑或二進位檔案物件），每列只保留前 max_columns 欄
+    儲存格為字串，型別由 rows_to_frame 推斷（同 pd.read_csv）；空白行略過（同 pd.read_csv 的 skip_blank_lines）
+    """
+    if isinstance(source, (str, os.PathLike)):
+        stream, owned = open(source, "rb"), True
+    else:
+        stream, owned = (BytesIO(source) if isinstance(source, bytes) else source), isinstance(source, bytes)
+    text = TextIOWrapper(stream, encoding=encoding, newline="")
+    try:
+        for row in csv.reader(text):
+            if row:
+                yield row[:max_columns]
+    finally:
+        # 呼叫端傳入的檔案物件不關閉
+        if owned:
+            text.close()
+        else:
+            text.detach()
+
+def read_csv(source):
+    """以 pd.read_csv 完整讀取（pandas 引擎，作為對照基準）"""
+    return pd.read_csv(BytesIO(source) if isinstance(source, bytes) else source)
+
+def read_excel(data, engine=None):
+    """完整讀取第一個工作表（不提前停止）"""
+    engine = engine or default_engine()
+    if engine == "pandas":
+        return pd.read_excel(BytesIO(data))
+    return rows_to_frame(ROW_READERS[engine](data))
+
+def read_excel_sheets(data):
+    """以 pd.read_excel 完整讀取所有工作表，回傳 [(工作表名稱, DataFrame), ...]"""
+    return list(pd.read_excel(BytesIO(data), sheet_name=None).items())
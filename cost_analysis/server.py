@@ -0,0 +1,368 @@
+"""
+HTTP 轉換服務（tornado）：供 ERP 等程式直接呼叫，不經過 Streamlit 介面
+
+    POST /convert              單一檔案轉換，等待完成後回傳報表
+                               表單欄位：file（xlsx / csv）、part_no、currency、rate（可省略，依 date 自動取得）、date、
+                               format=html（預設）/ json / pdf、sheet（多個成本分析表時指定工作表，預設第一個）
+    POST /jobs                 批次轉換（多個檔案或 zip），立即回傳 202 與工作代碼
+                               表單欄位：file（可多個）、currency（可多個或 ALL）、rate、date、combined、
+                               format=html / pdf / both、dataset
+    POST /compare              版本比較（同一料號的多個版本，第一個檔案為基準），等待完成後回傳比較報表
+                               表單欄位：file（可多個或 zip，依上傳順序）、currency、rate、date、format=html（預設）/ json
+    GET  /jobs/<id>            工作狀態與結果（JSON，含每份報表的數值）
+    GET  /jobs/<id>/zip        下載批次結果（zip）
+    GET  /metrics              量測結果（Prometheus 文字格式）
+    GET  /health               健康檢查
+
+轉換在 jobs 的背景執行緒池中執行（與 Streamlit 介面共用同樣的上限），
+工作已滿時回傳 503 與 Retry-After，呼叫端應稍後重試
+解壓縮、內容雜湊與打包 zip 在執行緒中執行，不阻塞 IOLoop；批次結果的 zip 先寫入暫存檔再分段傳送
+啟動：python -m cost_analysis serve --port 8600
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+
+import tornado.web
+from tornado.iostream import StreamClosedError
+
+from . import metrics
+from .batch import COMBINED_CURRENCY, build_zip, expand_uploads
+from .cache import content_key
+from .core import DEFAULT_RATES
+from .jobs import QueueFull, compare_versions, convert_batch, convert_file, pending_jobs, submit_job
+from .pdf import PdfEngineUnavailable, render_pdf
+from .rates import currency_rates, resolve_rates, to_date
+from .settings import MAX_UPLOAD_BYTES, SERVER_PORT
+
+# 保留最近的批次工作供查詢：超過筆數、完成超過 JOB_RESULT_TTL 秒或結果（HTML 與 PDF 檔）合計超過
+# COST_ANALYSIS_JOB_RESULT_MB 時淘汰最舊的已完成工作（PDF 暫存檔隨工作一併刪除，見 jobs.convert_batch）
+RECENT_JOBS = int(os.environ.get("COST_ANALYSIS_RECENT_JOBS", 256))
+JOB_RESULT_TTL = float(os.environ.get("COST_ANALYSIS_JOB_RESULT_TTL", 3600))
+JOB_RESULT_BYTES = int(os.environ.get("COST_ANALYSIS_JOB_RESULT_MB", 256)) * 1024 * 1024
+
+# 下載 zip 時每次傳送的大小
+ZIP_CHUNK = 256 * 1024
+
+# 工作已滿時建議的重試秒數
+RETRY_AFTER = 5
+
+# --format 與 batch 輸出格式的對應（同命令列）
+BATCH_FORMATS = {"html": ("html",), "pdf": ("pdf",), "both": ("html", "pdf")}
+
+class RequestError(ValueError):
+    """請求參數錯誤（回應 400）"""
+
+def result_bytes(results):
+    """批次結果的大小：HTML 字元數與 PDF 檔案（或 bytes）大小"""
+    size = 0
+    for result in results or ():
+        if result["html"] is not None:
+            size += len(result["html"])
+        if isinstance(result["pdf"], str):
+            size += os.path.getsize(result["pdf"]) if os.path.exists(result["pdf"]) else 0
+        elif result["pdf"] is not None:
+            size += len(result["pdf"])
+    return size
+
+class JobRegistry:
+    """依工作代碼保存最近的批次工作（已完成的工作依筆數、保存時間與結果大小淘汰，見 RECENT_JOBS）"""
+
+    def __init__(self, max_jobs=RECENT_JOBS, ttl=JOB_RESULT_TTL, max_bytes=JOB_RESULT_BYTES):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._jobs = OrderedDict()
+        self._sizes = {}  # 工作代碼 -> 結果大小（完成後計算一次）
+
+    def add(self, job):
+        self._jobs[job.id] = job
+        self._jobs.move_to_end(job.id)
+        self.prune()
+
+    def get(self, job_id):
+        self.prune()
+        return self._jobs.get(job_id)
+
+    def prune(self):
+        """淘汰過期的已完成工作，超過筆數或結果大小上限時再由最舊的已完成工作開始淘汰"""
+        now = time.monotonic()
+        finished = [job for job in self._jobs.values() if job.finished()]
+        for job in finished:
+            if job.id not in self._sizes:
+                self._sizes[job.id] = result_bytes(job.result)
+        total = sum(self._sizes.values())
+        for job in finished:
+            if now - job.finished_at > self.ttl or len(self._jobs) > self.max_jobs or total > self.max_bytes:
+                del self._jobs[job.id]
+                total -= self._sizes.pop(job.id)
+
+def upload_keys(entries):
+    """上傳檔案的內容雜湊（作為工作的識別）"""
+    return tuple(content_key(data, name) for name, data in entries)
+
+def parse_rates(currencies, rate, on_date):
+    """currency（可多個或 ALL）/ rate / date 參數轉為 {幣別: 匯率}"""
+    currencies = [code.strip().upper() for code in currencies if code.strip()]
+    if not currencies:
+        raise RequestError("缺少 currency")
+    unknown = [code for code in currencies if code not in DEFAULT_RATES and code != COMBINED_CURRENCY]
+    if unknown:
+        raise RequestError(f"不支援的幣別：{', '.join(unknown)}")
+    try:
+        on_date = to_date(on_date or None)
+    except ValueError:
+        raise RequestError(f"日期格式錯誤：{on_date}（YYYY-MM-DD）")
+    if rate:
+        # 指定匯率時不查詢匯率表 / API
+        if COMBINED_CURRENCY in currencies or len(set(currencies)) > 1:
+            raise RequestError("rate 只能用於單一幣別")
+        try:
+            rates = {currencies[0]: float(rate)}
+        except ValueError:
+            raise RequestError(f"匯率格式錯誤：{rate}")
+    else:
+        rates = currency_rates(on_date=on_date) if COMBINED_CURRENCY in currencies else resolve_rates(currencies, on_date)
+    if any(value <= 0 for value in rates.values()):
+        raise RequestError("匯率必須大於 0")
+    return rates
+
+def attachment(filename):
+    """Content-Disposition 標頭（料號可能含中文，以 RFC 5987 編碼）"""
+    return f"attachment; filename*=UTF-8''{quote(filename)}"
+
+def result_summary(result):
+    """批次結果轉為 JSON（不含 HTML / PDF 內容）"""
+    return {
+        "file": result["file"],
+        "sheet": result["sheet"],
+        "part_no": result["part_no"],
+        "currency": result["currency"],
+        "ok": result["ok"],
+        "error": result["error"],
+        "report": result["report"].to_dict() if result["report"] is not None else None,
+    }
+
+class BaseHandler(tornado.web.RequestHandler):
+    def write_json(self, data, status=200):
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.finish(json.dumps(data, ensure_ascii=False))
+
+    def write_error(self, status_code, **kwargs):
+        self.write_json({"error": self._reason}, status_code)
+
+    def fail(self, status, message, **extra):
+        self.write_json({"error": message, **extra}, status)
+
+    def queue_full(self, e):
+        self.set_header("Retry-After", str(RETRY_AFTER))
+        self.fail(503, str(e))
+
+    async def run_blocking(self, func, *args):
+        """在執行緒中執行會佔用 CPU 或等待 I/O 的工作，不阻塞 IOLoop"""
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def uploads(self):
+        """上傳的檔案（任何欄位名稱）展開為 (檔名, bytes) 列表，zip 會展開"""
+        files = [(f["filename"], f["body"]) for field in self.request.files.values() for f in field]
+        return await self.run_blocking(expand_uploads, files)
+
+    async def resolve_rates(self, currencies):
+        """依 currency / rate / date 參數取得匯率（可能查詢匯率表或匯率 API，在執行緒中執行）"""
+        return await self.run_blocking(parse_rates, currencies, self.get_argument("rate", ""), self.get_argument("date", ""))
+
+    async def wait_job(self, job):
+        await asyncio.wrap_future(job.future)
+
+class ConvertHandler(BaseHandler):
+    async def post(self):
+        try:
+            entries = await self.uploads()
+            if len(entries) != 1:
+                raise RequestError("請上傳一個 xlsx / csv 檔案（file 欄位）")
+            filename, data = entries[0]
+            currency_code = self.get_argument("currency", "").strip().upper()
+            if currency_code not in DEFAULT_RATES:
+                raise RequestError(f"不支援的幣別：{currency_code or '（未指定）'}")
+            rate = (await self.resolve_rates([currency_code]))[currency_code]
+            output = self.get_argument("format", "html")
+            if output not in ("html", "json", "pdf"):
+                raise RequestError(f"不支援的格式：{output}")
+        except RequestError as e:
+            self.fail(400, str(e))
+            return
+
+        part_no = self.get_argument("part_no", "").strip()
+        key = ("file", (await self.run_blocking(upload_keys, entries))[0], part_no, currency_code, rate)
+        try:
+            job = submit_job(key, convert_file, data, filename, part_no, currency_code, rate)
+        except QueueFull as e:
+            self.queue_full(e)
+            return
+        await self.wait_job(job)
+        if job.error:
+            self.fail(422, job.error, file=filename)
+            return
+
+        sheet = self.get_argument("sheet", "")
+        sheets = [result for result in job.result if not sheet or result[0]["sheet"] == sheet]
+        if not sheets:
+            self.fail(400, f"找不到成本分析工作表：{sheet}", sheets=[raw["sheet"] for raw, _, _ in job.result])
+            return
+        _, report, html = sheets[0]
+        if output == "json":
+            self.write_json(report.to_dict())
+        elif output == "pdf":
+            try:
+                pdf = await self.run_blocking(render_pdf, report)
+            except PdfEngineUnavailable as e:
+                self.fail(501, str(e))
+                return
+            self.set_header("Content-Type", "application/pdf")
+            self.set_header("Content-Disposition", attachment(f"{report.part_no}_{currency_code}.pdf"))
+            self.finish(pdf)
+        else:
+            self.set_header("Content-Type", "text/html; charset=utf-8")
+            self.finish(html)
+
+class CompareHandler(BaseHandler):
+    async def post(self):
+        try:
+            entries = await self.uploads()
+            if len(entries) < 2:
+                raise RequestError("請上傳至少兩個版本的 xlsx / csv 檔案（file 欄位）")
+            currency_code = self.get_argument("currency", "").strip().upper()
+            if currency_code not in DEFAULT_RATES:
+                raise RequestError(f"不支援的幣別：{currency_code or '（未指定）'}")
+            rate = (await self.resolve_rates([currency_code]))[currency_code]
+            output = self.get_argument("format", "html")
+            if output not in ("html", "json"):
+                raise RequestError(f"不支援的格式：{output}")
+        except RequestError as e:
+            self.fail(400, str(e))
+            return
+
+        key = ("compare", await self.run_blocking(upload_keys, entries), currency_code, rate)
+        try:
+            job = submit_job(key, compare_versions, entries, currency_code, rate)
+        except QueueFull as e:
+            self.queue_full(e)
+            return
+        await self.wait_job(job)
+        if job.error:
+            self.fail(422, job.error)
+            return
+
+        comparison, html = job.result
+        if output == "json":
+            self.write_json(comparison.to_dict())
+        else:
+            self.set_header("Content-Type", "text/html; charset=utf-8")
+            self.finish(html)
+
+class JobsHandler(BaseHandler):
+    async def post(self):
+        try:
+            entries = await self.uploads()
+            if not entries:
+                raise RequestError("找不到可轉換的 xlsx / csv 檔案")
+            rates = await self.resolve_rates(self.get_arguments("currency"))
+            formats = BATCH_FORMATS.get(self.get_argument("format", "html"))
+            if formats is None:
+                raise RequestError(f"不支援的格式：{self.get_argument('format')}")
+        except RequestError as e:
+            self.fail(400, str(e))
+            return
+
+        combined = self.get_argument("combined", "") in ("1", "true", "yes")
+        to_dataset = self.get_argument("dataset", "") in ("1", "true", "yes")
+        key = ("batch", await self.run_blocking(upload_keys, entries), tuple(rates.items()), formats, combined, to_dataset)
+        try:
+            job = submit_job(key, convert_batch, entries, rates, formats, combined, to_dataset)
+        except QueueFull as e:
+            self.queue_full(e)
+            return
+        self.application.settings["jobs"].add(job)
+        self.set_header("Location", f"/jobs/{job.id}")
+        self.write_json({"id": job.id, "files": len(entries), "rates": rates, "status": f"/jobs/{job.id}"}, 202)
+
+class JobHandler(BaseHandler):
+    def get(self, job_id):
+        job = self.application.settings["jobs"].get(job_id)
+        if job is None:
+            self.fail(404, "找不到工作")
+            return
+        status = {
+            "id": job.id,
+            "finished": job.finished(),
+            "stage": job.stage,
+            "done": job.done,
+            "total": job.total,
+            "error": job.error,
+        }
+        if job.finished() and not job.error:
+            status["results"] = [result_summary(result) for result in job.result]
+            status["zip"] = f"/jobs/{job.id}/zip"
+        self.write_json(status)
+
+class JobZipHandler(BaseHandler):
+    async def get(self, job_id):
+        job = self.application.settings["jobs"].get(job_id)
+        if job is None:
+            self.fail(404, "找不到工作")
+            return
+        if not job.finished():
+            self.fail(409, "工作尚未完成")
+            return
+        if job.error:
+            self.fail(422, job.error)
+            return
+        self.set_header("Content-Type", "application/zip")
+        self.set_header("Content-Disposition", attachment(f"Analysis_{job.id}.zip"))
+        with tempfile.TemporaryFile() as f:
+            await self.run_blocking(build_zip, job.result, f)
+            self.set_header("Content-Length", str(f.tell()))
+            f.seek(0)
+            while chunk := f.read(ZIP_CHUNK):
+                self.write(chunk)
+                try:
+                    await self.flush()
+                except StreamClosedError:  # 用戶端已中斷下載
+                    return
+        self.finish()
+
+class MetricsHandler(BaseHandler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.finish(metrics.render())
+
+class HealthHandler(BaseHandler):
+    def get(self):
+        self.write_json({"status": "ok", "pending_jobs": pending_jobs()})
+
+def make_app(**settings):
+    return tornado.web.Application(
+        [
+            (r"/convert", ConvertHandler),
+            (r"/compare", CompareHandler),
+            (r"/jobs", JobsHandler),
+            (r"/jobs/([0-9a-f]{32})", JobHandler),
+            (r"/jobs/([0-9a-f]{32})/zip", JobZipHandler),
+            (r"/metrics", MetricsHandler),
+            (r"/health", HealthHandler),
+        ],
+        jobs=JobRegistry(),
+        **settings,
+    )
+
+async def serve(port=SERVER_PORT, host="0.0.0.0"):
+    """啟動服務並持續執行"""
+    # 請求內容上限與緩衝區上限一致（緩衝區預設 100 MB，較大的上傳會直接斷線）
+    make_app().listen(port, host, max_body_size=MAX_UPLOAD_BYTES, max_buffer_size=MAX_UPLOAD_BYTES)
+    print(f"🚀 轉換服務已啟動：http://{host}:{port}")
+    await asyncio.Event().wait()
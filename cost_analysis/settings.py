@@ -0,0 +1,13 @@
+"""
+HTTP 服務與多程序部署的預設值（環境變數），不引入 tornado / Streamlit，
+命令列顯示預設值時只需載入本模組（convert 等子命令不依賴 tornado）
+"""
+import os
+
+# HTTP 轉換服務（見 server.py）
+SERVER_PORT = int(os.environ.get("COST_ANALYSIS_SERVER_PORT", 8600))
+MAX_UPLOAD_BYTES = int(os.environ.get("COST_ANALYSIS_MAX_UPLOAD_MB", 200)) * 1024 * 1024
+
+# 多程序部署（見 cluster.py）
+APP_WORKERS = int(os.environ.get("COST_ANALYSIS_APP_WORKERS", 2))
+WORKER_PORT = int(os.environ.get("COST_ANALYSIS_WORKER_PORT", 8511))
@@ -0,0 +1,458 @@
+"""
+製程名稱翻譯：預設字典、自動翻譯（MyMemory API）與持久化翻譯快取
+
+翻譯結果存放在 SQLite 檔案中，多個伺服器程序共用、重啟後仍保留：
+- 成功的翻譯保留 TRANSLATION_TTL 秒
+- 翻譯失敗（回傳原文）只保留 NEGATIVE_TTL 秒，之後會重新嘗試
+- 離線模式（COST_ANALYSIS_OFFLINE=1）完全不連網，只使用字典與快取
+- 整份報表的未知名稱會去除重複後平行查詢，總耗時以最慢的單一查詢為上限
+- 名稱正規化為純函式，以 LRU 快取結果（各料號的工序名稱大量重複）
+- 不在字典中的名稱先以別名檔與近似比對在本機解析（matcher.py），分數低於門檻才呼叫翻譯 API
+"""
+import csv
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
+
+from .matcher import ProcessMatcher
+from .metrics import count, observe
+
+# 預設製程中英對照表（也作為翻譯快取的離線種子資料）
+PROCESS_TRANSLATIONS = {
+    "校車": "Calibration",
+    "車床": "Lathe",
+    "手工清洗": "Remove oil by hydrocarbon",
+    "清洗": "Remove oil by hydrocarbon",
+    "去油": "Remove oil by hydrocarbon",
+    "自動清洗": "Remove oil by hydrocarbon",
+    "修內徑加工": "Inner Diameter Processing",
+    "包裝": "Packing",
+    "熱處理": "Heat Treatment",
+    "風切防鏽": "Anti-Rust",
+    "清點數量": "Counting",
+    "高週波": "High Frequency",
+    "染黑": "Black Oxide",
+    "巡牙": "Thread Inspection",
+    "研磨": "Grinding",
+    "拋光": "Polishing",
+    "陽極": "Anodizing",
+    "電鍍": "Plating",
+    "噴砂": "Sandblasting",
+    "刻字": "Laser Marking",
+    "CNC加工": "CNC Machining",
+    "CNC車床": "CNC Lathe",
+    "CNC銑床": "CNC Milling",
+    "CNC放電": "CNC EDM",
+    "CNC線切割": "CNC Wire Cutting",
+    "CNC磨床": "CNC Grinding",
+    "CNC火花機": "CNC Spark Machine",
+    }
+
+# 翻譯快取設定（可用環境變數覆寫）
+TRANSLATION_DB = os.environ.get(
+    "COST_ANALYSIS_TRANSLATION_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "translations.sqlite3"),
+)
+TRANSLATION_TTL = float(os.environ.get("COST_ANALYSIS_TRANSLATION_TTL", 90 * 24 * 3600))
+NEGATIVE_TTL = float(os.environ.get("COST_ANALYSIS_NEGATIVE_TTL", 3600))
+OFFLINE = os.environ.get("COST_ANALYSIS_OFFLINE", "").lower() in ("1", "true", "yes")
+
+# 翻譯 API 設定：單次查詢逾時、同時查詢數上限、整份報表的翻譯時限（秒）
+TRANSLATE_URL = os.environ.get("COST_ANALYSIS_TRANSLATE_URL", "https://api.mymemory.translated.net/get")
+TRANSLATE_TIMEOUT = float(os.environ.get("COST_ANALYSIS_TRANSLATE_TIMEOUT", 5))
+TRANSLATE_WORKERS = int(os.environ.get("COST_ANALYSIS_TRANSLATE_WORKERS", 8))
+TRANSLATE_DEADLINE = float(os.environ.get("COST_ANALYSIS_TRANSLATE_DEADLINE", 6))
+
+# 工序名稱正規化：排除詞（依序移除，重疊時如「委外包裝」先移除「外包」）、數字後綴與空格（預先編譯）
+EXCLUDED_WORDS = ["廠內", "廠外", "託外", "外包", "委外"]
+NUMBER_SUFFIX = re.compile(r"\d+$")
+SPACES = str.maketrans("", "", " 　")
+PROCESS_NAME_CACHE_SIZE = int(os.environ.get("COST_ANALYSIS_PROCESS_NAME_CACHE_SIZE", 4096))
+
+# 使用者維護的別名檔（CSV：name,english），與預設字典一起建立近似比對索引；
+# 近似比對分數 >= FUZZY_THRESHOLD 時直接使用，不呼叫翻譯 API
+PROCESS_ALIASES = os.environ.get(
+    "COST_ANALYSIS_PROCESS_ALIASES",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "process_aliases.csv"),
+)
+FUZZY_THRESHOLD = float(os.environ.get("COST_ANALYSIS_FUZZY_THRESHOLD", 0.75))
+
+# 程序內翻譯快取（避免重複查詢）：原文 -> (譯文, 到期時間)
+translation_cache = {}
+
+class TranslationStore:
+    """
+    SQLite 翻譯快取
+    - WAL 模式，多個程序可同時讀寫
+    - 每個執行緒各自持有連線（Streamlit 每個 session 在不同執行緒執行）
+    - 種子資料（預設字典）不會過期
+    """
+
+    def __init__(self, path, ttl=TRANSLATION_TTL, negative_ttl=NEGATIVE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " text TEXT PRIMARY KEY,"
+                " translated TEXT NOT NULL,"
+                " ok INTEGER NOT NULL,"
+                " expires_at REAL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def seed(self, mapping):
+        """寫入種子字典（不會過期，會覆蓋同名的快取結果）"""
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO translations (text, translated, ok, expires_at) VALUES (?, ?, 1, NULL)",
+                list(mapping.items()),
+            )
+
+    def get(self, text):
+        """回傳 (譯文, 到期時間)，不存在或已過期回傳 None"""
+        row = self._connect().execute(
+            "SELECT translated, expires_at FROM translations WHERE text = ?", (text,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return row[0], row[1]
+
+    def set(self, text, translated, ok):
+        """寫入翻譯結果，失敗結果使用較短的到期時間，回傳到期時間"""
+        expires_at = time.time() + (self.ttl if ok else self.negative_ttl)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO translations (text, translated, ok, expires_at) VALUES (?, ?, ?, ?)",
+                (text, translated, int(ok), expires_at),
+            )
+        return expires_at
+
+    def purge_expired(self):
+        """刪除已過期的快取"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM translations WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """取得本程序的翻譯快取（無法開啟資料庫時回傳 None，僅使用記憶體快取）"""
+    global _store, _store_pid
+    # fork 出來的子程序不可沿用父程序的 SQLite 連線
+    if _store_pid != os.getpid():
+        with _store_lock:
+            if _store_pid != os.getpid():
+                try:
+                    _store = TranslationStore(TRANSLATION_DB)
+                    _store.seed(PROCESS_TRANSLATIONS)
+                    _store.purge_expired()
+                except (sqlite3.Error, OSError):
+                    _store = None
+                _store_pid = os.getpid()
+    return _store
+
+def set_offline(offline=True):
+    """切換離線模式（不呼叫翻譯 API），同時設定環境變數讓批次子程序沿用"""
+    global OFFLINE
+    OFFLINE = offline
+    os.environ["COST_ANALYSIS_OFFLINE"] = "1" if offline else "0"
+
+@lru_cache(maxsize=PROCESS_NAME_CACHE_SIZE)
+def normalize_process_name(name):
+    """移除排除詞、數字後綴與空格，回傳用於查字典 / 翻譯的名稱"""
+    # 依序移除排除詞（與逐一 replace 的結果相同，結果由 lru_cache 保存）
+    for word in EXCLUDED_WORDS:
+        name = name.replace(word, "")
+    # 移除數字後綴(如 風切防鏽3 -> 風切防鏽)
+    clean_name = NUMBER_SUFFIX.sub("", name).strip()
+    # 移除所有空格
+    return clean_name.translate(SPACES)
+
+def normalize_process_names(names):
+    """一次正規化一整列名稱（Series 或列表），重複名稱只計算一次；非字串為 NaN，回傳 Series"""
+    import pandas as pd
+
+    names = names if isinstance(names, pd.Series) else pd.Series(list(names), dtype=object)
+    return names.map({name: normalize_process_name(name) for name in names.unique() if isinstance(name, str)})
+
+def load_aliases(path=None):
+    """讀取別名檔，回傳 {正規化名稱: English}；檔案不存在回傳空 dict"""
+    path = path or PROCESS_ALIASES
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return {
+            normalize_process_name(row["name"]): row["english"].strip()
+            for row in csv.DictReader(f)
+            if (row.get("name") or "").strip() and (row.get("english") or "").strip()
+        }
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+def get_matcher():
+    """預設字典與別名檔的近似比對索引（每個程序建立一次）"""
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                matcher = ProcessMatcher(PROCESS_TRANSLATIONS)
+                matcher.add(load_aliases())
+                _matcher = matcher
+    return _matcher
+
+@lru_cache(maxsize=PROCESS_NAME_CACHE_SIZE)
+def local_translation(clean_name):
+    """以別名 / 近似比對在本機取得英文名稱，分數低於 FUZZY_THRESHOLD 回傳 None"""
+    match = get_matcher().match(clean_name, FUZZY_THRESHOLD)
+    return None if match is None else match.english
+
+def reset_caches():
+    """清空本程序的翻譯結果與近似比對快取，下次查詢時重新開啟 TRANSLATION_DB（測試與基準測試隔離用）"""
+    global _store_pid
+    translation_cache.clear()
+    local_translation.cache_clear()
+    with _store_lock:
+        _store_pid = None
+
+def needs_translation(clean_name):
+    """名稱是否需要自動翻譯（不符合特殊規則、不在預設字典中，也無法在本機比對）"""
+    return "校車" not in clean_name and clean_name not in PROCESS_TRANSLATIONS and local_translation(clean_name) is None
+
+def clean_process_name(name, translations=None):
+    """
+    產生「中文 | English」工序名稱
+    translations: translate_many 預先查好的譯文，有提供時不會再連網翻譯
+    """
+    if not isinstance(name, str): return "-"
+    clean_name = normalize_process_name(name)
+    
+    # 特殊匹配：包含「校車」的都識別為 Calibration
+    if "校車" in clean_name:
+        eng_name = "Calibration"
+        clean_name = clean_name  # 保留原始名稱如「校車A」
+    # 先查預設字典
+    elif clean_name in PROCESS_TRANSLATIONS:
+        eng_name = PROCESS_TRANSLATIONS[clean_name]
+    # 再查別名檔 / 近似比對（本機）
+    elif local_translation(clean_name) is not None:
+        eng_name = local_translation(clean_name)
+    elif translations is not None:
+        eng_name = translations.get(clean_name, clean_name)
+    else:
+        # 如果都找不到，自動翻譯
+        eng_name = auto_translate(clean_name)
+    
+    # 如果是清洗類工序，統一改成「碳氫去油處理」
+    if eng_name == "Remove oil by hydrocarbon" or clean_name in ["手工清洗", "清洗", "去油", "自動清洗"]:
+        clean_name = "碳氫去油處理"
+        eng_name = "Remove oil by hydrocarbon"
+    
+    return f"{clean_name} | {eng_name}"
+
+def clean_process_names(names, translations=None):
+    """一次產生一整列「中文 | English」工序名稱（Series 或列表），重複名稱只處理一次，回傳 Series"""
+    import pandas as pd
+
+    names = names if isinstance(names, pd.Series) else pd.Series(list(names), dtype=object)
+    labels = {name: clean_process_name(name, translations) for name in names.unique() if isinstance(name, str)}
+    return names.map(labels).fillna("-")
+
+_session = None
+_session_pid = None
+
+def get_session():
+    """取得共用的 HTTP session（連線池大小與同時翻譯數相同）"""
+    global _session, _session_pid
+    if _session_pid != os.getpid():
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=TRANSLATE_WORKERS)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _session, _session_pid = session, os.getpid()
+    return _session
+
+def lookup_cached(text):
+    """查詢程序內與持久化快取，沒有結果回傳 None"""
+    cached = translation_cache.get(text)
+    if cached is not None and (cached[1] is None or cached[1] > time.time()):
+        count("cost_analysis_translation_cache_total", result="hit")
+        return cached[0]
+    
+    # 檢查持久化快取（其他程序或上次執行的結果）
+    store = get_store()
+    if store is not None:
+        try:
+            cached = store.get(text)
+        except sqlite3.Error:
+            cached = None
+        if cached is not None:
+            translation_cache[text] = cached
+            count("cost_analysis_translation_cache_total", result="hit")
+            return cached[0]
+    count("cost_analysis_translation_cache_total", result="miss")
+    return None
+
+def fetch_translation(text):
+    """呼叫翻譯 API 並寫入快取，失敗時回傳原文（失敗結果只短暫快取）"""
+    import requests
+
+    translated = text
+    ok = False
+    outcome = "failed"
+    start = time.perf_counter()
+    try:
+        # 使用 MyMemory 免費翻譯 API（無需認證）
+        params = {
+            "q": text,
+            "langpair": "zh-CN|en"
+        }
+        response = get_session().get(TRANSLATE_URL, params=params, timeout=TRANSLATE_TIMEOUT)
+        result = response.json()
+        
+        if result.get("responseStatus") == 200:
+            result_text = result.get("responseData", {}).get("translatedText", text)
+            # 避免重複翻譯標記
+            if result_text != "[object Object]" and result_text != text:
+                translated = result_text
+                ok = True
+                outcome = "ok"
+    except requests.Timeout:
+        outcome = "timeout"
+    except Exception as e:
+        pass
+    observe("cost_analysis_stage_seconds", time.perf_counter() - start, stage="translate_api")
+    count("cost_analysis_translation_requests_total", result=outcome)
+    
+    expires_at = time.time() + (TRANSLATION_TTL if ok else NEGATIVE_TTL)
+    store = get_store()
+    if store is not None:
+        try:
+            expires_at = store.set(text, translated, ok)
+        except sqlite3.Error:
+            pass
+    translation_cache[text] = (translated, expires_at)
+    return translated
+
+def auto_translate(text):
+    """自動翻譯中文為英文（使用免費 API，結果存入持久化快取）"""
+    if not text or not isinstance(text, str):
+        return text
+    
+    cached = lookup_cached(text)
+    if cached is not None:
+        return cached
+    
+    # 離線模式：不連網，直接回傳原文（不寫入快取，恢復連線後會再翻譯）
+    if OFFLINE:
+        return text
+    
+    return fetch_translation(text)
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+# 查詢中的名稱：原文 -> Future（同時有多份報表需要同一名稱時只查詢一次）
+_inflight = {}
+# 每個查詢中 Future 的等待者數：最後一個等待者逾時離開時才取消
+_waiters = {}
+# 可重入：Future 已完成或在持有鎖時取消，完成回呼 _forget_inflight 會在同一執行緒中立即執行
+_inflight_lock = threading.RLock()
+
+def get_executor():
+    """本程序共用的翻譯執行緒池（同時查詢數上限為 TRANSLATE_WORKERS，每個程序建立一次）"""
+    global _executor, _executor_pid
+    if _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=TRANSLATE_WORKERS, thread_name_prefix="cost-analysis-translate")
+                _executor_pid = os.getpid()
+    return _executor
+
+def submit_translation(text):
+    """在共用執行緒池中查詢名稱，同一名稱已在查詢中時沿用同一個 Future；用完需呼叫 release_translation"""
+    with _inflight_lock:
+        future = _inflight.get(text)
+        if future is None:
+            future = get_executor().submit(fetch_translation, text)
+            _inflight[text] = future
+            future.add_done_callback(lambda done, text=text: _forget_inflight(text, done))
+        _waiters[future] = _waiters.get(future, 0) + 1
+    return future
+
+def release_translation(future):
+    """等待者不再需要結果；沒有其他等待者且查詢尚未開始時取消（已開始的在背景完成後仍寫入快取）"""
+    with _inflight_lock:
+        waiters = _waiters.pop(future, 1) - 1
+        if waiters > 0:
+            _waiters[future] = waiters
+            return
+        # 在鎖內取消：其他報表不會在取消前加入等待；取消成功時完成回呼隨即移出 _inflight
+        future.cancel()
+
+def _forget_inflight(text, future):
+    with _inflight_lock:
+        if _inflight.get(text) is future:
+            del _inflight[text]
+
+def translate_many(texts, deadline=None):
+    """
+    同時翻譯多個名稱（自動去除重複），回傳 {原文: 譯文}
+    - 已快取的直接使用，其餘在共用執行緒池中平行查詢（同時最多 TRANSLATE_WORKERS 個連線）
+    - 超過 deadline 秒仍未完成的名稱回傳原文；已開始的查詢在背景完成後仍會寫入快取，
+      尚未開始且沒有其他報表在等待的取消
+    """
+    translations = {}
+    pending = []
+    for text in dict.fromkeys(texts):
+        if not text or not isinstance(text, str):
+            continue
+        cached = lookup_cached(text)
+        if cached is not None:
+            translations[text] = cached
+        else:
+            pending.append(text)
+    
+    if not pending:
+        return translations
+    if OFFLINE:
+        translations.update((text, text) for text in pending)
+        return translations
+    
+    futures = {submit_translation(text): text for text in pending}
+    done, _ = wait(futures, timeout=TRANSLATE_DEADLINE if deadline is None else deadline)
+    # 逾時只停止等待；同一 Future 可能還有其他報表在等，由最後一個等待者決定是否取消
+    for future in futures:
+        release_translation(future)
+    missed = 0
+    for future, text in futures.items():
+        if future in done and not future.cancelled():
+            translations[text] = future.result()
+        else:
+            translations[text] = text
+            missed += 1
+    if missed:
+        count("cost_analysis_translation_deadline_total", missed)
+    return translations
@@ -7,6 +7,8 @@
 APP_DIR="/opt/cost-analysis"  # 修改為實際路徑
 SESSION_NAME="cost-analysis"
 PORT="8501"
+# Streamlit 程序數：大於 1 時以多程序模式執行（python -m cost_analysis cluster，共用快取、自動重啟）
+WORKERS="${COST_ANALYSIS_APP_WORKERS:-1}"
 
 echo "🚀 啟動成本分析系統伺服器版本..."
 echo "📍 應用目錄: $APP_DIR"
@@ -25,7 +27,12 @@ echo "⏳ 建立新 session..."
 tmux new-session -d -s $SESSION_NAME -c "$APP_DIR"
 
 # 在 session 中執行啟動命令
-tmux send-keys -t $SESSION_NAME "source venv/bin/activate && streamlit run app.py --server.address 0.0.0.0 --server.port $PORT" Enter
+if [ "$WORKERS" -gt 1 ]; then
+    echo "🧩 多程序模式: $WORKERS 個 Streamlit 程序"
+    tmux send-keys -t $SESSION_NAME "source venv/bin/activate && python -m cost_analysis cluster --workers $WORKERS --host 0.0.0.0 --port $PORT" Enter
+else
+    tmux send-keys -t $SESSION_NAME "source venv/bin/activate && streamlit run app.py --server.address 0.0.0.0 --server.port $PORT" Enter
+fi
 
 echo ""
 echo "======================================"
@@ -33,6 +40,9 @@ echo "✅ 伺服器已啟動！"
 echo "======================================"
 echo ""
 echo "🌐 訪問地址: http://伺服器IP:$PORT"
+if [ "$WORKERS" -gt 1 ]; then
+    echo "❤️  健康檢查: http://伺服器IP:$PORT/health"
+fi
 echo ""
 echo "📊 查看運行狀態:"
 echo "   tmux attach-session -t $SESSION_NAME"
@@ -13,12 +13,19 @@ REM 檢查 Python
 python --version >nul 2>&1
 if errorlevel 1 (
     echo ❌ 錯誤: 未找到 Python
-    echo 請先安裝 Python 3.8 或更新版本
+    echo 請先安裝 Python 3.11 或更新版本
     pause
     exit /b 1
 )
 
 for /f "tokens=2" %%i in ('python --version 2^>^&1') do set PYTHON_VERSION=%%i
+REM requirements.txt 中的 numpy 2.4 需要 Python 3.11 以上
+python -c "import sys; sys.exit(sys.version_info < (3, 11))"
+if errorlevel 1 (
+    echo ❌ 錯誤: Python %PYTHON_VERSION% 版本過舊，請安裝 Python 3.11 或更新版本
+    pause
+    exit /b 1
+)
 echo ✅ Python 版本: %PYTHON_VERSION%
 
 REM 建立虛擬環境
@@ -14,11 +14,16 @@ echo "======================================"
 # 檢查 Python
 if ! command -v python3 &> /dev/null; then
     echo "❌ 錯誤: 未找到 Python 3"
-    echo "請先安裝 Python 3.8 或更新版本"
+    echo "請先安裝 Python 3.11 或更新版本"
     exit 1
 fi
 
 PYTHON_VERSION=$(python3 --version | awk '{print $2}')
+# requirements.txt 中的 numpy 2.4 需要 Python 3.11 以上
+if ! python3 -c 'import sys; sys.exit(sys.version_info < (3, 11))'; then
+    echo "❌ 錯誤: Python $PYTHON_VERSION 版本過舊，請安裝 Python 3.11 或更新版本"
+    exit 1
+fi
 echo "✅ Python 版本: $PYTHON_VERSION"
 
 # 建立虛擬環境
@@ -51,6 +56,13 @@ echo "按 Ctrl+C 停止應用"
 echo "======================================"
 echo ""
 
-streamlit run app.py \
-    --logger.level=info \
-    --client.toolbarMode=viewer
+# COST_ANALYSIS_APP_WORKERS 大於 1 時以多程序模式執行（見 cost_analysis/cluster.py）
+if [ "${COST_ANALYSIS_APP_WORKERS:-1}" -gt 1 ]; then
+    python -m cost_analysis cluster --workers "$COST_ANALYSIS_APP_WORKERS" -- \
+        --logger.level=info \
+        --client.toolbarMode=viewer
+else
+    streamlit run app.py \
+        --logger.level=info \
+        --client.toolbarMode=viewer
+fi
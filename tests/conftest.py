@@ -0,0 +1,18 @@
+import pytest
+
+from cost_analysis import translate
+from stubs import StubTranslator
+
+@pytest.fixture
+def stub_translator(tmp_path, monkeypatch):
+    """翻譯 API 指向本機 stub，翻譯快取改用暫存資料庫"""
+    stub = StubTranslator()
+    monkeypatch.setattr(translate, "TRANSLATE_URL", stub.url)
+    monkeypatch.setattr(translate, "TRANSLATION_DB", str(tmp_path / "translations.sqlite3"))
+    monkeypatch.setattr(translate, "OFFLINE", False)
+    translate.reset_caches()
+    yield stub
+    stub.close()
+    # 還原設定後再清空，之後的測試不會沿用暫存資料庫或本測試的快取結果
+    monkeypatch.undo()
+    translate.reset_caches()
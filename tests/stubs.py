@@ -0,0 +1,49 @@
+"""
+本機模擬的翻譯 API（回應格式同 MyMemory），測試（conftest.stub_translator）與基準測試（benchmarks/fixtures.py）共用
+不修改 cost_analysis 的設定，由使用端將 translate.TRANSLATE_URL 指向 stub.url
+"""
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+class StubTranslator:
+    """本機翻譯 API（回應格式同 MyMemory）：譯文為 EN:原文，可設定延遲與失敗"""
+
+    def __init__(self):
+        self.requests = Counter()
+        self.delay = 0.0
+        self.fail = False
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                text = parse_qs(urlparse(self.path).query)["q"][0]
+                with stub._lock:
+                    stub.requests[text] += 1
+                time.sleep(stub.delay)
+                if stub.fail:
+                    body = {"responseStatus": 403, "responseData": {"translatedText": ""}}
+                else:
+                    body = {"responseStatus": 200, "responseData": {"translatedText": f"EN:{text}"}}
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}/get"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
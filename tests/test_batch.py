@@ -0,0 +1,23 @@
+import glob
+import os
+
+import pytest
+
+from cost_analysis import translate
+from cost_analysis.batch import convert_currencies, dataset_reports
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RATES = {"USD": 30.0, "EUR": 35.0, "JPY": 0.2}
+
+@pytest.mark.parametrize("combined", [False, True])
+def test_dataset_gets_one_report_per_sheet(monkeypatch, combined):
+    monkeypatch.setattr(translate, "OFFLINE", True)
+    results = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "*.xlsx"))):
+        with open(path, "rb") as f:
+            results += convert_currencies(os.path.basename(path), f.read(), RATES, combined=combined)
+    reports, sources = dataset_reports(results, RATES)
+    sheets = {(result["file"], result["sheet"]) for result in results if result["ok"]}
+    assert len(reports) == len(sheets)
+    assert sorted(sources) == sorted(file for file, _ in sheets)
+    assert all(report.currency == "USD" for report in reports)
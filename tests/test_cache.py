@@ -0,0 +1,81 @@
+import csv
+import glob
+import io
+import os
+import time
+
+from cost_analysis import translate
+from cost_analysis.cache import ResultCache, ResultStore, content_key
+from cost_analysis.core import PROCESS_NAME_COLUMNS, ProcessBlockEnd, is_process_name, parse_workbook
+from cost_analysis.readers import iter_rows_openpyxl
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UNKNOWN_NAME = "奇特未知工序甲"
+
+def unknown_process_csv():
+    """範例檔轉為 CSV，第一個工序改為字典與近似比對都沒有的名稱"""
+    with open(sorted(glob.glob(os.path.join(ROOT, "*.xlsx")))[0], "rb") as f:
+        rows = [list(row) for row in iter_rows_openpyxl(f.read(), max_columns=None)]
+    block_end = ProcessBlockEnd()
+    for i, row in enumerate(rows[1:]):
+        block_end(i, row)
+        if block_end.start is not None:
+            break
+    for row in rows[block_end.start + 1:]:
+        col_idx = next((col for col in PROCESS_NAME_COLUMNS if col < len(row) and is_process_name(row[col])), None)
+        if col_idx is not None:
+            row[col_idx] = UNKNOWN_NAME
+            break
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([["" if value != value else value for value in row] for row in rows])
+    return buffer.getvalue().encode("utf-8")
+
+def process_names(raws):
+    return [name for raw in raws for name, _, _ in raw["processes"]]
+
+def test_cached_parse_retranslates_deadline_fallbacks(stub_translator, monkeypatch):
+    monkeypatch.setattr(translate, "TRANSLATE_DEADLINE", 0.2)
+    stub_translator.delay = 0.5
+    data = unknown_process_csv()
+    cache = ResultCache(shared=False)
+
+    first = parse_workbook(data, "unknown.csv", cache=cache)
+    assert f"{UNKNOWN_NAME} | {UNKNOWN_NAME}" in process_names(first)
+
+    # 逾時的查詢在背景完成後，快取命中的解析結果也要使用新的譯文
+    end = time.monotonic() + 5
+    while translate._inflight and time.monotonic() < end:
+        time.sleep(0.02)
+    second = parse_workbook(data, "unknown.csv", cache=cache)
+    assert cache.hits == 1
+    assert f"{UNKNOWN_NAME} | EN:{UNKNOWN_NAME}" in process_names(second)
+    assert process_names(second) == process_names(parse_workbook(data, "unknown.csv", cache=None))
+
+def test_sources_are_hashed_and_parsed_without_loading(tmp_path, monkeypatch):
+    monkeypatch.setattr(translate, "OFFLINE", True)
+    data = unknown_process_csv()
+    path = tmp_path / "unknown.csv"
+    path.write_bytes(data)
+    stream = io.BytesIO(data)
+    stream.seek(3)
+
+    key = content_key(data, "unknown.csv")
+    assert content_key(str(path), "unknown.csv") == key
+    assert content_key(stream, "unknown.csv") == key
+    assert stream.tell() == 3
+
+    expected = process_names(parse_workbook(data, "unknown.csv", cache=None))
+    assert process_names(parse_workbook(str(path), "unknown.csv", cache=None)) == expected
+    assert process_names(parse_workbook(io.BytesIO(data), "unknown.csv", cache=None)) == expected
+
+def test_store_is_purged_while_writing(tmp_path, monkeypatch):
+    store = ResultStore(str(tmp_path / "results.sqlite3"), ttl=60, max_entries=3, purge_every=2)
+    store.put("expired", [])
+    monkeypatch.setattr(time, "time", lambda real=time.time: real() + 120)
+    for i in range(9):
+        store.put(f"key{i}", [i])
+    # 長時間執行的程序持續寫入時，過期與超過上限的結果也會被刪除
+    rows = [key for key, in store._connect().execute("SELECT key FROM results")]
+    assert "expired" not in rows
+    assert len(rows) <= 3 + store.purge_every
+    assert store.get("key8") == [8]
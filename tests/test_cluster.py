@@ -0,0 +1,93 @@
+import asyncio
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tornado.testing import AsyncHTTPTestCase
+
+from cost_analysis import cluster
+from cost_analysis.cluster import Cluster, make_app
+
+class RunningProcess:
+    """代替 worker 的 Streamlit 程序（一直在執行）"""
+
+    returncode = None
+    pid = 0
+
+    def poll(self):
+        return None
+
+class SilentWorker:
+    """接受連線但從不回應的 worker"""
+
+    def __init__(self):
+        self.socket = socket.socket()
+        self.socket.bind(("127.0.0.1", 0))
+        self.socket.listen()
+        self.port = self.socket.getsockname()[1]
+
+    def close(self):
+        self.socket.close()
+
+class HealthyWorker:
+    """/_stcore/health 回應 200 的 worker"""
+
+    def __init__(self):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"ok")
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_port
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def stub_cluster(*stubs):
+    """worker 指向 stub 伺服器的 Cluster（不啟動 Streamlit），各 worker 先視為健康"""
+    stub = Cluster(len(stubs))
+    for worker, server in zip(stub.workers, stubs):
+        worker.port = server.port
+        worker.process = RunningProcess()
+        worker.healthy = True
+    return stub
+
+def test_check_marks_hung_worker_unhealthy_and_checks_the_rest(monkeypatch):
+    monkeypatch.setattr(cluster, "HEALTH_INTERVAL", 0.3)
+    silent, healthy = SilentWorker(), HealthyWorker()
+    try:
+        stub = stub_cluster(silent, healthy)
+        stub.workers[1].healthy = False
+        # 逾時不可中斷檢查：後面的 worker 仍要檢查
+        asyncio.run(stub.check())
+        assert [worker.healthy for worker in stub.workers] == [False, True]
+    finally:
+        silent.close()
+        healthy.close()
+
+class ProxyTimeoutTest(AsyncHTTPTestCase):
+    def setUp(self):
+        self.silent = SilentWorker()
+        self._timeout, cluster.REQUEST_TIMEOUT = cluster.REQUEST_TIMEOUT, 0.3
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        cluster.REQUEST_TIMEOUT = self._timeout
+        self.silent.close()
+
+    def get_app(self):
+        return make_app(stub_cluster(self.silent))
+
+    def test_hung_worker_returns_502(self):
+        response = self.fetch("/")
+        assert response.code == 502
@@ -0,0 +1,50 @@
+import glob
+import json
+import os
+import re
+
+from cost_analysis import translate
+from cost_analysis.core import INDEX_LABELS, LayoutCache, build_report, frame_from_rows, generate_html, generate_multi_html, sheet_values
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WIDTH = 26
+
+def label_row(label, value):
+    row = [""] * WIDTH
+    row[0], row[1], row[13], row[14] = label, str(value), label, str(value * 2)
+    return row
+
+def sheet_rows(header_labels, trailing_labels=()):
+    """表頭區的標籤、工序區塊、空白列（工序區塊結束），之後再接 trailing_labels"""
+    rows = [["料號"] + [""] * (WIDTH - 1)]
+    rows += [label_row(label, 10 + i) for i, label in enumerate(header_labels)]
+    rows.append(["製程"] + [""] * (WIDTH - 1))
+    rows += [["", f"工序{i}"] + [""] * (WIDTH - 2) for i in range(3)]
+    rows += [[""] * WIDTH for _ in range(25)]
+    rows += [label_row(label, 100 + i) for i, label in enumerate(trailing_labels)]
+    return rows
+
+def stream(rows):
+    yield from rows
+
+def test_stops_after_process_block_when_labels_complete():
+    df = frame_from_rows(stream(sheet_rows(INDEX_LABELS, trailing_labels=["備註"])))
+    assert "備註" not in df.iloc[:, 0].tolist()
+
+def test_reads_remaining_rows_when_label_missing(monkeypatch):
+    monkeypatch.setattr("cost_analysis.core.layout_cache", LayoutCache())
+    df = frame_from_rows(stream(sheet_rows(INDEX_LABELS[:-1], trailing_labels=[INDEX_LABELS[-1]])))
+    values, _ = sheet_values(df)
+    assert values["e_suggest_price"] == 200.0
+
+def test_download_name_is_escaped_in_script(monkeypatch):
+    monkeypatch.setattr(translate, "OFFLINE", True)
+    path = sorted(glob.glob(os.path.join(ROOT, "*.xlsx")))[0]
+    part_no = "</script><script>alert('x')</script>"
+    with open(path, "rb") as f:
+        _, report = build_report(f.read(), path, part_no, "TWD", 1.0, cache=None)
+    for html in (generate_html(report), generate_multi_html([report])):
+        download = re.search(r"a\.download = (.*);\n", html).group(1)
+        assert "</script" not in download
+        assert json.loads(download) == f"Analysis_{part_no}.html"
@@ -0,0 +1,28 @@
+import pytest
+
+from cost_analysis.matcher import ProcessMatcher
+from cost_analysis.translate import FUZZY_THRESHOLD, PROCESS_TRANSLATIONS
+
+@pytest.fixture(scope="module")
+def matcher():
+    return ProcessMatcher(PROCESS_TRANSLATIONS)
+
+@pytest.mark.parametrize("name, english", [
+    ("CNC車床加工", "CNC Lathe"),
+    ("熱處理(外)", "Heat Treatment"),
+    ("電鍍處理", "Plating"),
+    ("CNC線切", "CNC Wire Cutting"),
+    ("CNC銑床A", "CNC Milling"),
+])
+def test_close_names_match(matcher, name, english):
+    assert matcher.match(name, FUZZY_THRESHOLD).english == english
+
+@pytest.mark.parametrize("name", [
+    "手工清洗檢查",  # 含「手工清洗」，但多出的「檢查」是另一個工序
+    "清洗檢查",
+    "CNC車床檢查",
+    "熱處理檢驗",
+    "研磨拋光",
+])
+def test_near_misses_do_not_match(matcher, name):
+    assert matcher.match(name, FUZZY_THRESHOLD) is None
@@ -0,0 +1,21 @@
+import socket
+
+from cost_analysis import metrics
+
+def test_start_server_logs_when_port_is_taken(monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "_server", None)
+    monkeypatch.setattr(metrics, "_server_failed", False)
+    taken = socket.socket()
+    taken.bind(("127.0.0.1", 0))
+    taken.listen()
+    try:
+        port = taken.getsockname()[1]
+        # 連接埠已被使用（例如另一個 worker）時不拋出例外，頁面照常執行
+        assert metrics.start_server(port, "127.0.0.1") is None
+        assert "無法啟動量測服務" in caplog.text
+        # 之後每次重新執行都不再重試
+        caplog.clear()
+        assert metrics.start_server(port, "127.0.0.1") is None
+        assert not caplog.text
+    finally:
+        taken.close()
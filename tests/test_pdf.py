@@ -0,0 +1,65 @@
+import glob
+import os
+import zipfile
+
+import pytest
+
+from cost_analysis import translate
+from cost_analysis.batch import build_zip, convert_currencies
+from cost_analysis.core import build_report
+from cost_analysis import pdf as pdf_module
+from cost_analysis.pdf import PdfEngineUnavailable, check_pdf_engine, has_reportlab, has_weasyprint, render_pdf
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE = sorted(glob.glob(os.path.join(ROOT, "*.xlsx")))[0]
+
+@pytest.fixture
+def offline(monkeypatch):
+    monkeypatch.setattr(translate, "OFFLINE", True)
+
+@pytest.fixture
+def report(offline):
+    with open(SAMPLE, "rb") as f:
+        return build_report(f.read(), SAMPLE, "", "USD", 30.0, cache=None)[1]
+
+def test_check_pdf_engine_rejects_unloadable_engine(monkeypatch):
+    # 環境變數指定的引擎無法載入時，在產生 PDF 前就拋出例外
+    monkeypatch.setenv("COST_ANALYSIS_PDF_ENGINE", "reportlab")
+    monkeypatch.setattr(pdf_module, "has_reportlab", lambda: False)
+    with pytest.raises(PdfEngineUnavailable):
+        check_pdf_engine()
+    monkeypatch.setattr(pdf_module, "has_reportlab", lambda: True)
+    assert check_pdf_engine() == "reportlab"
+
+@pytest.mark.skipif(not has_weasyprint(), reason="weasyprint（含 Pango）未安裝")
+def test_weasyprint_smoke(report, tmp_path):
+    pdf = render_pdf(report, engine="weasyprint")
+    assert pdf.startswith(b"%PDF")
+
+    # 串流寫入檔案與回傳 bytes 的內容一致（只比較頁數，產生時間不同）
+    path = tmp_path / "report.pdf"
+    render_pdf(report, str(path), engine="weasyprint")
+    assert path.read_bytes().count(b"/Type /Page") == pdf.count(b"/Type /Page")
+
+@pytest.mark.skipif(not has_reportlab(), reason="reportlab 未安裝")
+def test_reportlab_smoke(report):
+    assert render_pdf(report, engine="reportlab").startswith(b"%PDF")
+
+@pytest.mark.skipif(not (has_weasyprint() or has_reportlab()), reason="沒有可用的 PDF 引擎")
+def test_batch_pdfs_are_written_to_files(offline, tmp_path):
+    pdf_dir = tmp_path / "pdf"
+    pdf_dir.mkdir()
+    with open(SAMPLE, "rb") as f:
+        results = convert_currencies(os.path.basename(SAMPLE), f.read(), {"USD": 30.0, "EUR": 35.0},
+                                     formats=("html", "pdf"), pdf_dir=str(pdf_dir))
+    assert all(result["ok"] for result in results)
+    paths = [result["pdf"] for result in results]
+    assert sorted(paths) == sorted(str(path) for path in pdf_dir.iterdir())
+
+    target = tmp_path / "reports.zip"
+    build_zip(results, str(target))
+    with zipfile.ZipFile(target) as archive:
+        for result in results:
+            name = f"{result['part_no']}_{result['currency']}.pdf"
+            with open(result["pdf"], "rb") as f:
+                assert archive.read(name) == f.read()
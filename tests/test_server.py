@@ -0,0 +1,103 @@
+import glob
+import io
+import json
+import os
+import time
+import uuid
+import zipfile
+
+from tornado.testing import AsyncHTTPTestCase
+
+from cost_analysis import rates, translate
+from cost_analysis.server import JobRegistry, make_app, parse_rates
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class FinishedJob:
+    def __init__(self, html_size, age=0.0):
+        self.id = uuid.uuid4().hex
+        self.finished_at = time.monotonic() - age
+        self.result = [{"html": "x" * html_size, "pdf": None}]
+
+    def finished(self):
+        return True
+
+def test_registry_evicts_expired_and_oversized_jobs():
+    registry = JobRegistry(max_jobs=10, ttl=60, max_bytes=250)
+    expired = FinishedJob(10, age=120)
+    registry.add(expired)
+    assert registry.get(expired.id) is None
+
+    jobs = [FinishedJob(100) for _ in range(3)]
+    for job in jobs:
+        registry.add(job)
+    # 超過 250 bytes 時由最舊的開始淘汰
+    assert registry.get(jobs[0].id) is None
+    assert registry.get(jobs[1].id) is jobs[1] and registry.get(jobs[2].id) is jobs[2]
+
+class NoUsdRates(rates.DefaultRates):
+    """沒有 USD 匯率的來源：查詢 USD 即失敗（如離線主機）"""
+
+    def rate(self, currency_code, on_date):
+        assert currency_code != "USD", "已指定匯率的幣別不應查詢"
+        return super().rate(currency_code, on_date)
+
+def test_explicit_rate_skips_lookup(monkeypatch):
+    monkeypatch.setattr(rates, "get_rate_provider", NoUsdRates)
+    assert parse_rates(["usd"], "31.5", None) == {"USD": 31.5}
+    # 所有幣別時只略過指定匯率的幣別，其他幣別仍依匯率來源取得
+    all_rates = rates.currency_rates("USD", 31.5)
+    assert list(all_rates)[0] == "USD" and all_rates["USD"] == 31.5
+    assert all_rates["EUR"] == rates.DEFAULT_RATES["EUR"]
+
+def multipart(fields, files):
+    """multipart/form-data 請求內容，回傳 (body, content_type)"""
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields:
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, filename, data in files:
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                   f"Content-Type: application/octet-stream\r\n\r\n".encode())
+        body.write(data + b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return body.getvalue(), f"multipart/form-data; boundary={boundary}"
+
+class BatchJobTest(AsyncHTTPTestCase):
+    def get_app(self):
+        return make_app()
+
+    def setUp(self):
+        super().setUp()
+        self._offline, translate.OFFLINE = translate.OFFLINE, True
+
+    def tearDown(self):
+        translate.OFFLINE = self._offline
+        super().tearDown()
+
+    def test_batch_job_zip(self):
+        paths = sorted(glob.glob(os.path.join(ROOT, "*.xlsx")))
+        files = []
+        for path in paths:
+            with open(path, "rb") as f:
+                files.append(("file", os.path.basename(path), f.read()))
+        body, content_type = multipart([("currency", "USD"), ("rate", "30"), ("format", "both")], files)
+        response = self.fetch("/jobs", method="POST", body=body, headers={"Content-Type": content_type})
+        assert response.code == 202
+        job_id = json.loads(response.body)["id"]
+
+        end = time.monotonic() + 60
+        while time.monotonic() < end:
+            status = json.loads(self.fetch(f"/jobs/{job_id}").body)
+            if status["finished"]:
+                break
+            time.sleep(0.1)
+        assert status["error"] is None
+        assert all(result["ok"] for result in status["results"])
+
+        response = self.fetch(f"/jobs/{job_id}/zip")
+        assert response.code == 200
+        with zipfile.ZipFile(io.BytesIO(response.body)) as archive:
+            names = archive.namelist()
+        assert len([name for name in names if name.endswith(".pdf")]) == len(paths)
+        assert len([name for name in names if name.endswith(".html")]) == len(paths)
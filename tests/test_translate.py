@@ -0,0 +1,140 @@
+import threading
+import time
+from concurrent.futures import wait
+
+import pytest
+
+from cost_analysis import translate
+from cost_analysis.translate import lookup_cached, normalize_process_name, translate_many
+
+def wait_cached(text, timeout=5):
+    """等待背景查詢完成並寫入快取"""
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        cached = translate.translation_cache.get(text)
+        if cached is not None:
+            return cached[0]
+        time.sleep(0.02)
+    return None
+
+@pytest.mark.parametrize("name, expected", [
+    ("委外包裝", "委裝"),  # 「外包」先於「委外」移除，與舊版逐一 replace 相同
+    ("委外包裝2", "委裝"),
+    ("廠廠內內", "廠內"),
+    ("熱處理(委外)", "熱處理()"),
+    ("風切防鏽 3", "風切防鏽"),
+])
+def test_normalize_matches_sequential_replace(name, expected):
+    assert normalize_process_name(name) == expected
+
+def test_parallel_lookups(stub_translator):
+    stub_translator.delay = 0.3
+    names = ["測試工序甲", "測試工序乙", "測試工序丙", "測試工序丁"]
+    start = time.monotonic()
+    translations = translate_many(names, deadline=5)
+    elapsed = time.monotonic() - start
+    assert translations == {name: f"EN:{name}" for name in names}
+    # 以最慢的單一查詢為上限，而不是逐一查詢的總和
+    assert elapsed < 0.3 * len(names) * 0.6
+
+def test_duplicate_names_are_looked_up_once(stub_translator):
+    translations = translate_many(["測試重複", "測試重複", "測試其他", "測試重複"], deadline=5)
+    assert translations == {"測試重複": "EN:測試重複", "測試其他": "EN:測試其他"}
+    assert stub_translator.requests["測試重複"] == 1
+
+    # 已快取的名稱不再連網
+    assert translate_many(["測試重複"], deadline=5) == {"測試重複": "EN:測試重複"}
+    assert stub_translator.requests["測試重複"] == 1
+
+def test_deadline_falls_back_to_original(stub_translator):
+    stub_translator.delay = 1.0
+    start = time.monotonic()
+    translations = translate_many(["測試逾時"], deadline=0.2)
+    assert time.monotonic() - start < 0.8
+    assert translations == {"測試逾時": "測試逾時"}
+
+    # 逾時的查詢在背景完成後寫入快取，下一份報表可直接使用
+    assert wait_cached("測試逾時") == "EN:測試逾時"
+    assert translate_many(["測試逾時"], deadline=0.2) == {"測試逾時": "EN:測試逾時"}
+    assert stub_translator.requests["測試逾時"] == 1
+
+def test_failures_are_negatively_cached(stub_translator, monkeypatch):
+    stub_translator.fail = True
+    assert translate_many(["測試失敗"], deadline=5) == {"測試失敗": "測試失敗"}
+    assert stub_translator.requests["測試失敗"] == 1
+
+    # 失敗結果在 NEGATIVE_TTL 內直接使用原文，不重複呼叫 API
+    assert translate_many(["測試失敗"], deadline=5) == {"測試失敗": "測試失敗"}
+    assert stub_translator.requests["測試失敗"] == 1
+    stored = translate.get_store().get("測試失敗")
+    assert stored[0] == "測試失敗"
+    assert stored[1] <= time.time() + translate.NEGATIVE_TTL
+
+    # 過期後重新嘗試
+    stub_translator.fail = False
+    translate.translation_cache.clear()
+    monkeypatch.setattr(time, "time", lambda real=time.time: real() + translate.NEGATIVE_TTL + 1)
+    assert lookup_cached("測試失敗") is None
+    assert translate_many(["測試失敗"], deadline=5) == {"測試失敗": "EN:測試失敗"}
+    assert stub_translator.requests["測試失敗"] == 2
+
+def test_offline_does_not_call_api(stub_translator, monkeypatch):
+    monkeypatch.setattr(translate, "OFFLINE", True)
+    assert translate_many(["測試離線"], deadline=5) == {"測試離線": "測試離線"}
+    assert not stub_translator.requests
+
+def test_deadline_misses_share_one_bounded_pool(stub_translator):
+    stub_translator.delay = 0.2
+    for i in range(20):
+        translate_many([f"測試執行緒{i}"], deadline=0.01)
+    # 逾時的查詢不會每次留下新的執行緒池
+    workers = [thread for thread in threading.enumerate() if thread.name.startswith("cost-analysis-translate")]
+    assert len(workers) <= translate.TRANSLATE_WORKERS
+    # 等背景查詢結束（尚未開始的已取消），避免寫入下一個測試的快取
+    end = time.monotonic() + 5
+    while translate._inflight and time.monotonic() < end:
+        time.sleep(0.02)
+    assert not translate._inflight
+
+def test_deadline_does_not_cancel_shared_lookup(stub_translator):
+    stub_translator.delay = 0.3
+    # 佔滿執行緒池，讓共用的查詢排隊尚未開始
+    blockers = [translate.submit_translation(f"測試佔用{i}") for i in range(translate.TRANSLATE_WORKERS)]
+    results = {}
+    waiter = threading.Thread(target=lambda: results.update(translate_many(["測試共用"], deadline=5)))
+    waiter.start()
+    end = time.monotonic() + 5
+    while "測試共用" not in translate._inflight and time.monotonic() < end:
+        time.sleep(0.01)
+
+    # 時限較短的報表先逾時離開，不可取消另一份報表仍在等待的查詢
+    assert translate_many(["測試共用"], deadline=0.05) == {"測試共用": "測試共用"}
+    waiter.join()
+    assert results == {"測試共用": "EN:測試共用"}
+    assert stub_translator.requests["測試共用"] == 1
+    for future in blockers:
+        translate.release_translation(future)
+    wait(blockers)
+
+def test_released_queued_lookup_is_cancelled_and_forgotten(stub_translator):
+    stub_translator.delay = 0.3
+    blockers = [translate.submit_translation(f"測試佔用{i}") for i in range(translate.TRANSLATE_WORKERS)]
+    future = translate.submit_translation("測試取消")
+    translate.release_translation(future)
+    # 取消與移出同時完成，之後的報表會重新查詢而不是加入已取消的 Future
+    assert future.cancelled()
+    assert "測試取消" not in translate._inflight and future not in translate._waiters
+    retry = translate.submit_translation("測試取消")
+    assert retry is not future and not retry.cancelled()
+    for pending in [*blockers, retry]:
+        translate.release_translation(pending)
+    wait(blockers)
+
+def test_store_purges_expired_entries_on_open(stub_translator):
+    store = translate.TranslationStore(translate.TRANSLATION_DB, negative_ttl=-1)
+    store.set("測試過期", "測試過期", ok=False)
+    # 開啟共用快取時刪除已過期的結果（含失敗結果）
+    count = translate.get_store()._connect().execute(
+        "SELECT COUNT(*) FROM translations WHERE text = ?", ("測試過期",)
+    ).fetchone()[0]
+    assert count == 0